@@ -0,0 +1,286 @@
+"""
+Pipelined batch driver for Assignment 3: Metro Map Planning
+
+Like batch_runner.py, runs every .city under a directory and prints one
+results table, but the stages of different cities overlap instead of each
+city going through all of them before the next one starts:
+
+    prepare (parse, precheck, route, encode)  -> queue -> solve -> queue -> finish (decode, check, write)
+
+prepare and finish run in a process pool; minisat runs as an asyncio
+subprocess (asyncio.create_subprocess_exec), so while city i is being solved
+the pool is already encoding city i+1 and checking city i-1. The queues
+between stages hold at most --queue-size cities, so a fast stage waits for a
+slow one instead of piling up encoded CNFs on disk.
+
+pysat solves in-process and has no I/O to overlap; shipping the clauses
+between processes costs more than it saves, so with that backend each city
+is solved in the prepare worker right after encoding.
+
+Timings are per stage as in batch_runner; 'total' is their sum (time spent
+waiting in a queue is not counted). The summary line gives the wall-clock
+time of the whole batch.
+
+Usage:
+    python3 async_pipeline.py <directory> [--workers 4] [--solvers 4] [--queue-size 2]
+                              [--timeout 60] [--backend auto] [--no-route]
+                              [--write metromap,...] [--format text|csv|json]
+                              [--output results.csv]
+
+Exit codes:
+ - 0 : every city is VALID or UNSAT.
+ - 1 : at least one city is INVALID, timed out or failed.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_runner import FIELDS, InstanceTimeout, find_cities, instance_alarm, write_results
+from city_parser import parse_city
+from decoder import decode_solution, write_metromap
+from encoder import write_cnf
+from format_checker import analyze_constraints
+from pipeline import encode_quietly, parse_artifacts, render_png, timed
+from precheck import find_infeasibility
+from sat_solver import read_minisat_output, resolve_backend, solve_with_pysat, write_minisat_output
+
+
+def new_job(index, base, backend, timeout, route, write, tmp):
+    """State of one city as it moves through the stages."""
+    return {
+        'base': base, 'backend': backend, 'timeout': timeout, 'route': route, 'write': write,
+        'cnf_path': base + '.satinput' if 'satinput' in write else os.path.join(tmp, '%d.satinput' % index),
+        'out_path': base + '.satoutput' if 'satoutput' in write else os.path.join(tmp, '%d.satoutput' % index),
+        'timings': {}, 'spec': None, 'status': None, 'detail': None, 'num_vars': None,
+        'num_clauses': None, 'moves': None, 'solved': None, 'model': None,
+    }
+
+
+def prepare_job(job):
+    """Pool stage: parse, precheck, route and encode (and solve, with pysat); never raises."""
+    timings = job['timings']
+    try:
+        with instance_alarm(job['timeout']):
+            with timed(timings, 'parse'):
+                spec = job['spec'] = parse_city(job['base'] + '.city')
+            with timed(timings, 'precheck'):
+                reason = find_infeasibility(spec)
+            if reason is not None:
+                job.update(status='UNSAT', detail="precheck: " + reason)
+                return job
+            if job['route']:
+                from router import route_all
+                with timed(timings, 'route'):
+                    job['moves'] = route_all(spec)
+                if job['moves'] is not None:
+                    job['detail'] = "routed without SAT"
+                    return job
+            with timed(timings, 'encode'):
+                num_vars, clauses, _ = encode_quietly(spec)
+            job.update(num_vars=num_vars, num_clauses=len(clauses))
+            if job['backend'] == 'minisat' or 'satinput' in job['write']:
+                with timed(timings, 'write'):
+                    write_cnf(job['cnf_path'], num_vars, clauses)
+            if job['backend'] == 'pysat':
+                with timed(timings, 'solve'):
+                    result = solve_with_pysat(num_vars, clauses, job['timeout'])
+                if result.status == 'TIMEOUT':
+                    job.update(status='TIMEOUT', detail="solver timed out after %.1fs" % result.seconds)
+                job['solved'], job['model'] = result.status, result.model
+    except InstanceTimeout:
+        job.update(status='TIMEOUT', detail="instance timed out after %gs" % job['timeout'])
+    except Exception as e:
+        job.update(status='ERROR', detail=str(e))
+    return job
+
+
+async def solve_job(job):
+    """Solve stage: runs minisat as an asyncio subprocess; never raises."""
+    if job['status'] is not None or job['num_vars'] is None or job['solved'] is not None:
+        return job
+    start = time.perf_counter()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'minisat', job['cnf_path'], job['out_path'],
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        try:
+            await asyncio.wait_for(proc.wait(), job['timeout'])
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            job.update(status='TIMEOUT', detail="solver timed out after %gs" % job['timeout'])
+    except Exception as e:
+        job.update(status='ERROR', detail="solver: %s" % e)
+    job['timings']['solve'] = time.perf_counter() - start
+    return job
+
+
+def finish_job(job):
+    """Pool stage: decode, check and write artifacts; returns the results row and never raises."""
+    timings = job['timings']
+    spec, write = job['spec'], job['write']
+    try:
+        if job['status'] is None and job['moves'] is None:
+            with timed(timings, 'decode'):
+                if job['backend'] == 'minisat':
+                    job['solved'], job['model'] = read_minisat_output(job['out_path'])
+                if job['solved'] == 'UNSAT':
+                    job.update(status='UNSAT', detail="solver")
+                else:
+                    job['moves'] = decode_solution(spec, [v for v in job['model'] if v > 0])
+                    job['detail'] = "solver"
+        if job['status'] is None and job['moves'] is not None:
+            with timed(timings, 'check'):
+                report = analyze_constraints(spec, job['moves'])
+            if report['final_valid']:
+                job['status'] = 'VALID'
+            else:
+                job.update(status='INVALID', detail="format_checker rejected the map")
+
+        if job['status'] in ('VALID', 'INVALID', 'UNSAT'):
+            base = job['base']
+            files = [name for name in ('satinput', 'satoutput', 'metromap') if name in write]
+            with timed(timings, 'write') if files else contextlib.nullcontext():
+                if job['num_vars'] is None and job['status'] == 'UNSAT':
+                    # decided by the precheck: write the trivially UNSAT files run.sh would
+                    if 'satinput' in write:
+                        write_cnf(job['cnf_path'], 1, [(1,), (-1,)])
+                    if 'satoutput' in write:
+                        write_minisat_output(job['out_path'], 'UNSAT', [])
+                elif job['backend'] == 'pysat' and 'satoutput' in write and job['solved']:
+                    write_minisat_output(job['out_path'], job['solved'], job['model'])
+                if 'metromap' in write:
+                    write_metromap(base + ".metromap",
+                                   "UNSAT" if job['status'] == 'UNSAT' else job['moves'])
+            if 'png' in write:
+                assignments = [v for v in job['model'] or [] if v > 0]
+                with timed(timings, 'render'):
+                    render_png(base, spec, assignments, job['moves'])
+    except Exception as e:
+        job.update(status='ERROR', detail=str(e))
+    finally:
+        for name, path in (('satinput', job['cnf_path']), ('satoutput', job['out_path'])):
+            if name not in write:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    row = dict.fromkeys(FIELDS)
+    row.update(basename=job['base'], status=job['status'], detail=job['detail'],
+               variables=job['num_vars'], clauses=job['num_clauses'])
+    for stage, seconds in timings.items():
+        row[stage] = round(seconds, 6)
+    row['total'] = round(sum(timings.values()), 6)
+    return row
+
+
+async def run_stage(handle, inbox, outbox, consumers, downstream):
+    """
+    Runs `consumers` copies of handle(job) over inbox, putting the results in
+    outbox; None in the inbox stops one copy. When all copies have stopped,
+    one None per downstream consumer is put in the outbox.
+    """
+    async def consume():
+        while True:
+            job = await inbox.get()
+            if job is None:
+                return
+            await outbox.put(await handle(job))
+
+    await asyncio.gather(*(consume() for _ in range(consumers)))
+    for _ in range(downstream):
+        await outbox.put(None)
+
+
+async def run_batch(bases, workers, solvers, queue_size, backend, timeout, route, write, tmp):
+    """Runs every basename through the staged pipeline; returns the rows in input order."""
+    loop = asyncio.get_running_loop()
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Up to `workers` cities are prepared at once; the solve queue bounds what waits after that
+        inbox = asyncio.Queue()
+        to_solve = asyncio.Queue(maxsize=queue_size)
+        to_finish = asyncio.Queue(maxsize=queue_size)
+        done = asyncio.Queue()
+        for index, base in enumerate(bases):
+            inbox.put_nowait(new_job(index, base, backend, timeout, route, write, tmp))
+        for _ in range(workers):
+            inbox.put_nowait(None)
+
+        async def prepare(job):
+            return await loop.run_in_executor(pool, prepare_job, job)
+
+        async def finish(job):
+            return await loop.run_in_executor(pool, finish_job, job)
+
+        async def collect():
+            while True:
+                row = await done.get()
+                if row is None:
+                    return
+                rows[row['basename']] = row
+
+        await asyncio.gather(
+            run_stage(prepare, inbox, to_solve, workers, solvers),
+            run_stage(solve_job, to_solve, to_finish, solvers, workers),
+            run_stage(finish, to_finish, done, workers, 1),
+            collect())
+    return [rows[base] for base in bases]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every .city under a directory with overlapping stages.")
+    parser.add_argument("root", help="Directory tree with .city files, e.g. Assets/.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the encode and decode/check stages.")
+    parser.add_argument("--solvers", type=int, help="Concurrent solver runs (default: --workers).")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="Cities that may wait between two stages.")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Seconds for encoding and for solving each instance (0 = no limit).")
+    parser.add_argument("--backend", default="auto", help="minisat, pysat or auto.")
+    parser.add_argument("--no-route", dest="route", action="store_false",
+                        help="Skip the heuristic router and always encode and solve.")
+    parser.add_argument("--write", type=parse_artifacts, default=[],
+                        help="Artifacts to write next to each city (default: none).")
+    parser.add_argument("--format", choices=["text", "csv", "json"], default="text",
+                        help="Results format.")
+    parser.add_argument("--output", help="Results file (default: stdout).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print("No such directory: %r" % args.root, file=sys.stderr)
+        sys.exit(1)
+    try:
+        backend = resolve_backend(args.backend)
+    except ValueError as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='async_pipeline_') as tmp:
+        rows = asyncio.run(run_batch(find_cities(args.root), args.workers, args.solvers or args.workers,
+                                     args.queue_size, backend, args.timeout or None, args.route,
+                                     args.write, tmp))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_results(rows, args.format, f)
+    else:
+        write_results(rows, args.format, sys.stdout)
+
+    counts = {}
+    for row in rows:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    print("[AsyncPipeline] %d cities in %.2fs: %s" % (
+        len(rows), time.perf_counter() - start,
+        ', '.join('%s=%d' % kv for kv in sorted(counts.items()))), file=sys.stderr)
+    sys.exit(0 if all(row['status'] in ('VALID', 'UNSAT') for row in rows) else 1)
+
+
+if __name__ == '__main__':
+    main()
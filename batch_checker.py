@@ -0,0 +1,201 @@
+"""
+Batch format checker for Assignment 3: Metro Map Planning
+
+Validates every <basename>.metromap that has a matching <basename>.city under a
+directory tree (or inside a .zip container) in one process, and writes a single
+JSON or CSV report. The constraints are the same as format_checker.py, but each
+map is checked with NumPy: all lines' paths are rebuilt at once from cumulative
+sums of direction vectors, and C1/C4 come from one occupancy grid (bincount of
+visited cells).
+
+Parsed cities are kept in city_parser's on-disk spec cache (.metro_cache/specs),
+so re-checking a tree does not parse its cities again; --no-spec-cache turns
+this off.
+
+Usage:
+    python3 batch_checker.py <directory|archive.zip> [--format json|csv] [--output report.json]
+                             [--no-spec-cache]
+
+Exit codes:
+ - 0 : every metromap is UNSAT or VALID.
+ - 1 : at least one metromap is INVALID or could not be parsed.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+
+from city_parser import SpecCache, parse_city
+from format_checker import parse_metromap
+
+# Move letter -> (dx, dy), indexed by byte value
+STEP_X = np.zeros(256, dtype=np.int64)
+STEP_Y = np.zeros(256, dtype=np.int64)
+for _letter, (_dx, _dy) in {'L': (-1, 0), 'R': (1, 0), 'U': (0, -1), 'D': (0, 1)}.items():
+    STEP_X[ord(_letter)] = _dx
+    STEP_Y[ord(_letter)] = _dy
+
+FIELDS = ['basename', 'status', 'c1', 'c2', 'c3', 'c4',
+          'overlapping_cells', 'bad_lines', 'over_turn_lines', 'missed_popular', 'error']
+
+
+def check_metromap(spec, metro_moves):
+    """
+    Vectorized C1-C4 check of one SAT metromap. Returns a report row (dict)
+    with the same verdicts as format_checker.analyze_constraints.
+    """
+    N, M, K = spec.N, spec.M, spec.K
+    row = dict.fromkeys(FIELDS)
+    row.update(overlapping_cells=0, bad_lines=0, over_turn_lines=0, missed_popular=0)
+    if len(metro_moves) != K:
+        row.update(status='INVALID', c1=False, c2=False, c3=False, c4=spec.scenario != 2,
+                   bad_lines=K, error='metromap lines (%d) != K (%d)' % (len(metro_moves), K))
+        return row
+    if K == 0:
+        row.update(status='VALID', c1=True, c2=True, c3=True, c4=not spec.popular)
+        row['missed_popular'] = len(spec.popular)
+        if spec.popular:
+            row['status'] = 'INVALID'
+        return row
+
+    # Per line a run of cells: the start, then one cell per move
+    moves = np.frombuffer(''.join(''.join(m) for m in metro_moves).encode('ascii'), dtype=np.uint8)
+    n_moves = np.array([len(m) for m in metro_moves], dtype=np.int64)
+    lengths = n_moves + 1
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    line_of = np.repeat(np.arange(K), lengths)
+    local = np.arange(lengths.sum()) - offsets[line_of]
+
+    starts = np.array(spec.starts, dtype=np.int64).reshape(K, 2)
+    ends = np.array(spec.ends, dtype=np.int64).reshape(K, 2)
+    step_x = np.zeros(lengths.sum(), dtype=np.int64)
+    step_y = np.zeros(lengths.sum(), dtype=np.int64)
+    is_move = local > 0
+    step_x[is_move] = STEP_X[moves]
+    step_y[is_move] = STEP_Y[moves]
+    step_x[offsets] = starts[:, 0]
+    step_y[offsets] = starts[:, 1]
+    # Cumulative sums restart at every line: subtract what the previous lines added
+    cx = np.cumsum(step_x)
+    cy = np.cumsum(step_y)
+    base_x = np.concatenate(([0], cx[offsets[1:] - 1]))
+    base_y = np.concatenate(([0], cy[offsets[1:] - 1]))
+    xs = cx - base_x[line_of]
+    ys = cy - base_y[line_of]
+
+    # C2: a line stops at its first out-of-bounds cell; it must finish on its end
+    outside = (xs < 0) | (xs >= N) | (ys < 0) | (ys >= M)
+    first_out = np.full(K, np.iinfo(np.int64).max)
+    np.minimum.at(first_out, line_of[outside], local[outside])
+    inside = local < first_out[line_of]
+    last = offsets + lengths - 1
+    ends_ok = (first_out > n_moves) & (xs[last] == ends[:, 0]) & (ys[last] == ends[:, 1])
+
+    # C3: a turn is a move differing from the previous move of the same line
+    move_line = line_of[is_move]
+    move_local = local[is_move]
+    turn = np.zeros(len(moves), dtype=bool)
+    turn[1:] = (moves[1:] != moves[:-1]) & (move_line[1:] == move_line[:-1])
+    turn &= move_local < first_out[move_line]
+    turns = np.bincount(move_line[turn], minlength=K)
+
+    # C1 / C4: occupancy grid over every cell actually visited
+    cells = xs[inside] * M + ys[inside]
+    occupancy = np.bincount(cells, minlength=N * M)
+    overlapping = int(np.count_nonzero(occupancy > 1))
+    missed = 0
+    if spec.scenario == 2 and spec.popular:
+        popular = np.array(spec.popular, dtype=np.int64).reshape(-1, 2)
+        missed = int(np.count_nonzero(occupancy[popular[:, 0] * M + popular[:, 1]] == 0))
+
+    row.update(c1=overlapping == 0, c2=bool(ends_ok.all()), c3=bool((turns <= spec.J).all()),
+               c4=missed == 0, overlapping_cells=overlapping,
+               bad_lines=int(K - np.count_nonzero(ends_ok)),
+               over_turn_lines=int(np.count_nonzero(turns > spec.J)), missed_popular=missed)
+    valid = row['c1'] and row['c2'] and row['c3'] and row['c4']
+    row['status'] = 'VALID' if valid else 'INVALID'
+    return row
+
+
+def find_basenames(root):
+    """Basenames under `root` that have both a .city and a .metromap file."""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        names = set(filenames)
+        for name in sorted(names):
+            if name.endswith('.metromap') and name[:-9] + '.city' in names:
+                found.append(os.path.join(dirpath, name[:-9]))
+    return sorted(found)
+
+
+def check_basename(base, label=None, cache=None):
+    """Checks <base>.city / <base>.metromap; never raises, errors go in the row."""
+    row = dict.fromkeys(FIELDS)
+    try:
+        spec = parse_city(base + '.city', cache)
+        state, metro_moves = parse_metromap(base + '.metromap')
+        if state == 'UNSAT':
+            row['status'] = 'UNSAT'
+        else:
+            row = check_metromap(spec, metro_moves)
+    except Exception as e:
+        row['status'] = 'ERROR'
+        row['error'] = str(e)
+    row['basename'] = label or base
+    return row
+
+
+def check_tree(root, cache=None):
+    """Report rows for every metromap under a directory or inside a .zip container."""
+    if zipfile.is_zipfile(root):
+        with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(root) as archive:
+            archive.extractall(tmp)
+            return [check_basename(base, os.path.relpath(base, tmp), cache) for base in find_basenames(tmp)]
+    return [check_basename(base, cache=cache) for base in find_basenames(root)]
+
+
+def write_report(rows, fmt, out):
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, out, indent=1)
+        out.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate every metromap under a directory or .zip.")
+    parser.add_argument("root", help="Directory tree or .zip container with .city/.metromap pairs.")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Report format.")
+    parser.add_argument("--output", help="Report file (default: stdout).")
+    parser.add_argument("--no-spec-cache", action="store_true",
+                        help="Parse every city instead of using the parsed-spec cache.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.root):
+        print("No such file or directory: %r" % args.root, file=sys.stderr)
+        sys.exit(1)
+
+    rows = check_tree(args.root, None if args.no_spec_cache else SpecCache())
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_report(rows, args.format, f)
+    else:
+        write_report(rows, args.format, sys.stdout)
+
+    counts = {}
+    for row in rows:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    print("[BatchChecker] %d metromaps: %s" % (
+        len(rows), ', '.join('%s=%d' % kv for kv in sorted(counts.items()))), file=sys.stderr)
+    sys.exit(0 if all(row['status'] in ('VALID', 'UNSAT') for row in rows) else 1)
+
+
+if __name__ == '__main__':
+    main()
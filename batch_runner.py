@@ -0,0 +1,182 @@
+"""
+Parallel batch runner for Assignment 3: Metro Map Planning
+
+Runs the pipeline (pipeline.run_pipeline: precheck, encode, solve, decode,
+check) on every .city under a directory, e.g. Assets/, across a process pool,
+and aggregates one results table: status, variable and clause counts and the
+time spent in every stage.
+
+Every instance gets --timeout seconds of wall-clock time. The solver is given
+the same budget, and a SIGALRM timer in the worker stops the Python stages
+(encoding can take longer than solving on big cities). Without SIGALRM
+(Windows) only the solver is limited.
+
+Cities are parsed through city_parser's on-disk spec cache (.metro_cache/specs),
+so repeated batches skip parsing; --no-spec-cache turns this off.
+
+Usage:
+    python3 batch_runner.py <directory> [--workers 4] [--timeout 60] [--backend auto]
+                            [--no-route] [--write metromap,...] [--format text|csv|json]
+                            [--output results.csv] [--no-spec-cache]
+
+Exit codes:
+ - 0 : every city is VALID or UNSAT.
+ - 1 : at least one city is INVALID, timed out or failed.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from city_parser import SpecCache, parse_city
+from pipeline import parse_artifacts, run_pipeline, timed
+
+STAGES = ['parse', 'precheck', 'route', 'encode', 'solve', 'decode', 'check', 'write', 'render']
+FIELDS = ['basename', 'status', 'variables', 'clauses'] + STAGES + ['total', 'detail']
+
+
+class InstanceTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise InstanceTimeout()
+
+
+@contextlib.contextmanager
+def instance_alarm(timeout):
+    """Raises InstanceTimeout inside the block after `timeout` seconds (no-op without SIGALRM)."""
+    use_alarm = timeout is not None and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def find_cities(root):
+    """Basenames of every .city file under `root`."""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith('.city'):
+                found.append(os.path.join(dirpath, name[:-5]))
+    return sorted(found)
+
+
+def run_one(task):
+    """Runs the pipeline on one basename; never raises, errors go in the row."""
+    base, backend, timeout, route, write, spec_cache = task
+    row = dict.fromkeys(FIELDS)
+    row['basename'] = base
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with instance_alarm(timeout):
+            with timed(timings, 'parse'):
+                spec = parse_city(base + '.city', spec_cache and SpecCache(spec_cache))
+            result = run_pipeline(spec, base, write, backend, timeout, route, timings=timings)
+        row['status'] = result.status
+        row['variables'] = result.num_vars
+        row['clauses'] = result.num_clauses
+        row['detail'] = result.detail
+    except InstanceTimeout:
+        row['status'] = 'TIMEOUT'
+        row['detail'] = "instance timed out after %gs" % timeout
+    except Exception as e:
+        row['status'] = 'ERROR'
+        row['detail'] = str(e)
+    for stage, seconds in timings.items():
+        row[stage] = round(seconds, 6)
+    row['total'] = round(time.perf_counter() - start, 6)
+    return row
+
+
+def write_table(rows, out):
+    """Plain-text table with one row per city; empty cells for stages that did not run."""
+    columns = [f for f in FIELDS if f in ('basename', 'status', 'variables', 'clauses', 'total')
+               or any(row[f] is not None for row in rows)]
+
+    def cell(row, field):
+        value = row[field]
+        if value is None:
+            return '-' if field != 'detail' else ''
+        return '%.3f' % value if isinstance(value, float) else str(value)
+
+    table = [columns] + [[cell(row, f) for f in columns] for row in rows]
+    widths = [max(len(r[i]) for r in table) for i in range(len(columns))]
+    for r in table:
+        out.write('  '.join(v.ljust(w) if i in (0, 1) or columns[i] == 'detail' else v.rjust(w)
+                            for i, (v, w) in enumerate(zip(r, widths))).rstrip() + '\n')
+
+
+def write_results(rows, fmt, out):
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    elif fmt == 'json':
+        json.dump(rows, out, indent=1)
+        out.write('\n')
+    else:
+        write_table(rows, out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline on every .city under a directory.")
+    parser.add_argument("root", help="Directory tree with .city files, e.g. Assets/.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Wall-clock seconds per instance (0 = no limit).")
+    parser.add_argument("--backend", default="auto", help="minisat, pysat or auto.")
+    parser.add_argument("--no-route", dest="route", action="store_false",
+                        help="Skip the heuristic router and always encode and solve.")
+    parser.add_argument("--write", type=parse_artifacts, default=[],
+                        help="Artifacts to write next to each city (default: none).")
+    parser.add_argument("--format", choices=["text", "csv", "json"], default="text",
+                        help="Results format.")
+    parser.add_argument("--output", help="Results file (default: stdout).")
+    parser.add_argument("--no-spec-cache", action="store_true",
+                        help="Parse every city instead of using the parsed-spec cache.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print("No such directory: %r" % args.root, file=sys.stderr)
+        sys.exit(1)
+
+    timeout = args.timeout or None
+    spec_cache = None if args.no_spec_cache else SpecCache().directory
+    tasks = [(base, args.backend, timeout, args.route, args.write, spec_cache)
+             for base in find_cities(args.root)]
+    start = time.perf_counter()
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks))) as pool:
+            rows = list(pool.map(run_one, tasks))
+    else:
+        rows = [run_one(task) for task in tasks]
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_results(rows, args.format, f)
+    else:
+        write_results(rows, args.format, sys.stdout)
+
+    counts = {}
+    for row in rows:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    print("[BatchRunner] %d cities in %.2fs: %s" % (
+        len(rows), time.perf_counter() - start,
+        ', '.join('%s=%d' % kv for kv in sorted(counts.items()))), file=sys.stderr)
+    sys.exit(0 if all(row['status'] in ('VALID', 'UNSAT') for row in rows) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Benchmark suite for Assignment 3: Metro Map Planning
+
+Micro-benchmarks (on one city, --city):
+    micro/parse_city            city_parser.parse_city
+    micro/encode/<section>      every encoder section (encoder.CLAUSE_SECTIONS,
+                                plus the variable mapping, turn and popular-cell constraints)
+    micro/encode_to_sat         the whole encoder
+    micro/write_cnf             DIMACS output
+    micro/parse_sat_output      reading a minisat result
+    micro/decode                decoder.decode_solution
+    micro/check                 format_checker.analyze_constraints
+Macro-benchmarks (--assets, every .city under it):
+    macro/<basename>            pipeline.run_pipeline end to end (no router)
+
+Each benchmark is run --repeat times and the minimum and median are recorded.
+`run --save` stores the results as a baseline; `compare` runs the suite again
+(or loads --results) and flags every benchmark whose minimum grew by more than
+--threshold (relative) and --min-delta (absolute seconds) over the baseline.
+compare runs with the baseline's settings (city, assets, repeats, backend,
+timeout) and refuses options or a results file that contradict them.
+Baselines are machine dependent: save one per machine before comparing.
+
+Usage:
+    python3 benchmark.py run [--repeat 5] [--save benchmark_baseline.json] [--output results.json]
+    python3 benchmark.py compare [--baseline benchmark_baseline.json] [--results results.json]
+                                 [--threshold 0.25] [--min-delta 0.005]
+
+Exit codes:
+ - 0 : run finished / no regressions.
+ - 1 : compare found at least one regression or a changed verdict.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from city_parser import parse_city
+from decoder import decode_solution, parse_sat_output
+from encoder import (CLAUSE_SECTIONS, direction_variables, encode_to_sat, popular_clauses,
+                     turn_clauses, write_cnf)
+from format_checker import analyze_constraints
+from pipeline import run_pipeline
+from sat_solver import resolve_backend, solve_cnf, write_minisat_output
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_CITY = os.path.join("Assets", "1_8", "25_25_3")
+# Settings of a run; compare takes them from the baseline unless given
+RUN_DEFAULTS = {'city': DEFAULT_CITY, 'assets': "Assets", 'repeat': 5, 'macro_repeat': 3,
+                'backend': "auto", 'timeout': 60.0}
+
+
+def measure(fn, repeat):
+    """
+    Runs fn() `repeat` times; returns {'min', 'median', 'repeat'} in seconds.
+    As in timeit, the garbage collector is off while timing.
+    """
+    times = []
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+def micro_benchmarks(base, repeat, backend):
+    """Yields (name, result) for the micro-benchmarks on <base>.city."""
+    city_file = base + ".city"
+    spec = parse_city(city_file)
+    yield 'micro/parse_city', measure(lambda: parse_city(city_file), repeat)
+
+    yield 'micro/encode/variables', measure(lambda: direction_variables(spec), repeat)
+    var_id, next_var = direction_variables(spec)
+    yield 'micro/encode/turns', measure(
+        lambda: turn_clauses(spec, dict(var_id), next_var, set()), repeat)
+    next_var = turn_clauses(spec, var_id, next_var, set())
+    for name, section in CLAUSE_SECTIONS:
+        yield 'micro/encode/' + name, measure(lambda: section(spec, var_id, set()), repeat)
+    if spec.scenario == 2:
+        yield 'micro/encode/popular', measure(
+            lambda: popular_clauses(spec, var_id, next_var, set()), repeat)
+    yield 'micro/encode_to_sat', measure(lambda: encode_to_sat(spec), repeat)
+
+    num_vars, clauses = encode_to_sat(spec)
+    result = solve_cnf(num_vars, clauses, backend=backend)
+    with tempfile.TemporaryDirectory() as tmp:
+        cnf_path = os.path.join(tmp, 'bench.satinput')
+        yield 'micro/write_cnf', measure(lambda: write_cnf(cnf_path, num_vars, clauses), repeat)
+        if result.status != 'SAT':
+            return
+        out_path = os.path.join(tmp, 'bench.satoutput')
+        write_minisat_output(out_path, result.status, result.model)
+        yield 'micro/parse_sat_output', measure(lambda: parse_sat_output(out_path, spec), repeat)
+
+    assignment = [v for v in result.model if v > 0]
+    yield 'micro/decode', measure(lambda: decode_solution(spec, assignment), repeat)
+    moves = decode_solution(spec, assignment)
+    yield 'micro/check', measure(lambda: analyze_constraints(spec, moves), repeat)
+
+
+def macro_benchmarks(root, repeat, backend, timeout):
+    """Yields (name, result) for the end-to-end runs; results also record the verdict."""
+    for dirpath, _, filenames in sorted(os.walk(root)):
+        for name in sorted(filenames):
+            if not name.endswith('.city'):
+                continue
+            base = os.path.join(dirpath, name[:-5])
+            spec = parse_city(base + '.city')
+            statuses = []
+            result = measure(lambda: statuses.append(
+                run_pipeline(spec, backend=backend, timeout=timeout, route=False).status), repeat)
+            result['status'] = statuses[-1]
+            yield 'macro/' + base.replace(os.sep, '/'), result
+
+
+def run_suite(args):
+    results = {}
+    # The encoder reports progress on stdout; only the benchmark lines are shown
+    with open(os.devnull, 'w') as devnull:
+        suites = [micro_benchmarks(args.city, args.repeat, args.backend)]
+        if args.assets:
+            suites.append(macro_benchmarks(args.assets, args.macro_repeat, args.backend, args.timeout))
+        for suite in suites:
+            while True:
+                with contextlib.redirect_stdout(devnull):
+                    item = next(suite, None)
+                if item is None:
+                    break
+                name, result = item
+                results[name] = result
+                extra = " (%s)" % result['status'] if 'status' in result else ""
+                print(f"[Benchmark] {name:<40} min {result['min']:9.6f}s  "
+                      f"median {result['median']:9.6f}s{extra}")
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'settings': {'city': args.city, 'assets': args.assets, 'repeat': args.repeat,
+                     'macro_repeat': args.macro_repeat, 'backend': resolve_backend(args.backend),
+                     'timeout': args.timeout},
+        'benchmarks': results,
+    }
+
+
+def save_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def compare(baseline, current, threshold, min_delta):
+    """Returns a list of (name, old, new, ratio, flag) rows; flag is '' when fine."""
+    rows = []
+    old_results = baseline['benchmarks']
+    new_results = current['benchmarks']
+    for name in sorted(set(old_results) | set(new_results)):
+        old = old_results.get(name)
+        new = new_results.get(name)
+        if old is None or new is None:
+            rows.append((name, old and old['min'], new and new['min'], None,
+                         'new' if old is None else 'missing'))
+            continue
+        ratio = new['min'] / old['min'] if old['min'] > 0 else float('inf')
+        flag = ''
+        if old.get('status') != new.get('status'):
+            flag = 'VERDICT %s->%s' % (old.get('status'), new.get('status'))
+        elif new['min'] > old['min'] * (1 + threshold) and new['min'] - old['min'] > min_delta:
+            flag = 'REGRESSION'
+        rows.append((name, old['min'], new['min'], ratio, flag))
+    return rows
+
+
+def add_run_arguments(parser, defaults=RUN_DEFAULTS):
+    defaults = defaults or {}
+    parser.add_argument("--city", default=defaults.get('city'), help="City basename for the micro-benchmarks.")
+    parser.add_argument("--assets", default=defaults.get('assets'),
+                        help="Directory of cities for the macro-benchmarks ('' to skip).")
+    parser.add_argument("--repeat", type=int, default=defaults.get('repeat'), help="Runs per micro-benchmark.")
+    parser.add_argument("--macro-repeat", type=int, default=defaults.get('macro_repeat'),
+                        help="Runs per macro-benchmark.")
+    parser.add_argument("--backend", default=defaults.get('backend'), help="minisat, pysat or auto.")
+    parser.add_argument("--timeout", type=float, default=defaults.get('timeout'),
+                        help="Solver timeout per city.")
+
+
+def settings_conflicts(baseline, settings):
+    """Names of the run settings in which `settings` differ from the baseline's."""
+    recorded = baseline.get('settings', {})
+    conflicts = []
+    for name, value in settings.items():
+        if value is None or name not in recorded:
+            continue
+        if name == 'backend':
+            value, expected = resolve_backend(value), resolve_backend(recorded[name])
+        else:
+            expected = recorded[name]
+        if value != expected:
+            conflicts.append("%s: %r (baseline: %r)" % (name, value, recorded[name]))
+    return conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks with stored baselines and regression gates.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the suite.")
+    add_run_arguments(run_parser)
+    run_parser.add_argument("--save", nargs='?', const=DEFAULT_BASELINE,
+                            help="Store the results as the baseline (default: %s)." % DEFAULT_BASELINE)
+    run_parser.add_argument("--output", help="Also write the results to this file.")
+    compare_parser = commands.add_parser("compare", help="Compare against a baseline.")
+    add_run_arguments(compare_parser, defaults=None)
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file.")
+    compare_parser.add_argument("--results", help="Compare this results file instead of running the suite.")
+    compare_parser.add_argument("--threshold", type=float, default=0.25,
+                                help="Allowed relative slowdown (0.25 = 25%%).")
+    compare_parser.add_argument("--min-delta", type=float, default=0.005,
+                                help="Ignore slowdowns smaller than this many seconds.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_suite(args)
+        for path in filter(None, (args.save, args.output)):
+            save_json(path, results)
+            print(f"[Benchmark] Wrote {path}")
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print("Cannot read baseline %r: %s" % (args.baseline, e), file=sys.stderr)
+        sys.exit(1)
+    given = {name: getattr(args, name) for name in RUN_DEFAULTS}
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+        given = dict(current.get('settings', {}), **{k: v for k, v in given.items() if v is not None})
+    conflicts = settings_conflicts(baseline, given)
+    if conflicts:
+        print("Settings differ from the baseline's, the timings would not be comparable:\n  "
+              + "\n  ".join(conflicts), file=sys.stderr)
+        sys.exit(1)
+    if not args.results:
+        recorded = baseline.get('settings', {})
+        for name, default in RUN_DEFAULTS.items():
+            if getattr(args, name) is None:
+                setattr(args, name, recorded.get(name, default))
+        current = run_suite(args)
+
+    rows = compare(baseline, current, args.threshold, args.min_delta)
+    failed = 0
+    for name, old, new, ratio, flag in rows:
+        old_text = "%.4fs" % old if old is not None else "-"
+        new_text = "%.4fs" % new if new is not None else "-"
+        ratio_text = "%.2fx" % ratio if ratio is not None else "-"
+        print(f"[Benchmark] {name:<40} {old_text:>10} -> {new_text:>10} {ratio_text:>7}  {flag}")
+        if flag == 'REGRESSION' or flag.startswith('VERDICT'):
+            failed += 1
+    print(f"[Benchmark] {failed} regression(s) over a threshold of {args.threshold:.0%}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Shared .city parser for Assignment 3: Metro Map Planning
+
+One parser for every tool (it used to be copy-pasted into encoder.py,
+decoder.py, format_checker.py, visualize3.py and trial_decoder.py). The file
+is read with one bulk read, blank lines are dropped in one pass and every
+record line is split once; start/end uniqueness is checked with set
+operations. Accepted input and error messages are the same as before.
+
+SpecCache is a small on-disk cache of parsed specs for the batch tools. A file
+is looked up by (path, mtime, size) without reading it; on a miss it is read
+and looked up by the sha256 of its content (so copies, checkouts and touched
+files still hit), and only parsed if that misses too. Entries are JSON and
+are checked against the spec's shape when loaded; anything else in the cache
+directory counts as a miss.
+
+    spec = parse_city("Assets/1_1/3_3_1.city")
+    spec = parse_city("Assets/1_1/3_3_1.city", cache=SpecCache())
+"""
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+MetroSpec = namedtuple(
+    'MetroSpec', ['scenario', 'N', 'M', 'K', 'J', 'P', 'starts', 'ends', 'popular']
+)
+
+
+def parse_city_text(text, path='<string>'):
+    """Parses the contents of a .city file into a MetroSpec."""
+    if not text:
+        raise ValueError("Empty city file: %s" % path)
+    lines = [ln for ln in text.split('\n') if ln.strip()]
+    if not lines:
+        raise ValueError("City file contains only whitespace")
+    first = lines[0].strip()
+    if first not in ('1', '2'):
+        raise ValueError(
+            "First non-empty line must be '1' or '2' (scenario); got: %r" % first)
+    scenario = int(first)
+    if len(lines) < 2:
+        raise ValueError("Missing second line with grid params (N M K J [P])")
+    params = lines[1].split()
+    if scenario == 1:
+        if len(params) != 4:
+            raise ValueError(
+                "Scenario 1 expects 4 ints on second line: N M K J")
+        N, M, K, J = map(int, params)
+        P = 0
+    else:
+        if len(params) != 5:
+            raise ValueError(
+                "Scenario 2 expects 5 ints on second line: N M K J P")
+        N, M, K, J, P = map(int, params)
+    if N <= 0 or M <= 0 or K < 0 or J < 0 or P < 0:
+        raise ValueError("Invalid numeric values in header")
+
+    starts = []
+    ends = []
+    for lineno in range(K):
+        if 2 + lineno >= len(lines):
+            raise ValueError(
+                "Expected %d metro lines but file ended early" % K)
+        toks = lines[2 + lineno].split()
+        if len(toks) != 4:
+            raise ValueError(
+                "Metro line %d: expected 4 integers (sx sy ex ey)" % lineno)
+        sx, sy, ex, ey = map(int, toks)
+        if not (0 <= sx < N and 0 <= ex < N and 0 <= sy < M and 0 <= ey < M):
+            raise ValueError("Metro %d coordinates out of bounds: %r" %
+                             (lineno, (sx, sy, ex, ey)))
+        starts.append((sx, sy))
+        ends.append((ex, ey))
+
+    popular = []
+    if scenario == 2:
+        if len(lines) < 3 + K:
+            raise ValueError("Scenario 2: missing line with popular cells")
+        toks = lines[2 + K].split()
+        if len(toks) != 2 * P:
+            raise ValueError(
+                "Scenario 2: expected %d tokens for %d popular cells, got %d" % (2 * P, P, len(toks)))
+        coords = list(map(int, toks))
+        popular = list(zip(coords[0::2], coords[1::2]))
+        for pidx, (x, y) in enumerate(popular):
+            if not (0 <= x < N and 0 <= y < M):
+                raise ValueError(
+                    "Popular cell %d out of bounds: (%d,%d)" % (pidx, x, y))
+
+    start_set = set(starts)
+    end_set = set(ends)
+    if len(start_set) != len(starts):
+        raise ValueError("Duplicate start locations in city file")
+    if len(end_set) != len(ends):
+        raise ValueError("Duplicate end locations in city file")
+    if start_set & end_set:
+        raise ValueError(
+            "Some start equals some end location (all starts & ends must be unique)")
+    return MetroSpec(scenario=scenario, N=N, M=M, K=K, J=J, P=P, starts=starts, ends=ends, popular=popular)
+
+
+def parse_city(path, cache=None):
+    """Parses a .city file; with a SpecCache, parsed specs are reused across runs."""
+    if cache is not None:
+        return cache.get(path)
+    try:
+        with open(path, 'r') as f:
+            text = f.read()
+    except Exception as e:
+        raise ValueError("Failed reading city file %r: %s" % (path, e))
+    return parse_city_text(text, path)
+
+
+def is_digest(value):
+    return (isinstance(value, str) and len(value) == 64
+            and all(c in '0123456789abcdef' for c in value))
+
+
+def spec_from_json(entry):
+    """
+    The MetroSpec of a SpecCache entry ([scenario, N, M, K, J, P, starts,
+    ends, popular] as JSON lists), or None if it does not have that shape.
+    """
+    def is_int(v):
+        return type(v) is int
+
+    def cells(value, count, N, M):
+        if not isinstance(value, list) or len(value) != count:
+            return None
+        out = []
+        for cell in value:
+            if not (isinstance(cell, list) and len(cell) == 2 and all(map(is_int, cell))
+                    and 0 <= cell[0] < N and 0 <= cell[1] < M):
+                return None
+            out.append(tuple(cell))
+        return out
+
+    if not isinstance(entry, list) or len(entry) != 9 or not all(map(is_int, entry[:6])):
+        return None
+    scenario, N, M, K, J, P = entry[:6]
+    if scenario not in (1, 2) or N <= 0 or M <= 0 or K < 0 or J < 0 or P < 0:
+        return None
+    starts = cells(entry[6], K, N, M)
+    ends = cells(entry[7], K, N, M)
+    popular = cells(entry[8], P if scenario == 2 else 0, N, M)
+    if starts is None or ends is None or popular is None:
+        return None
+    return MetroSpec(scenario, N, M, K, J, P, starts, ends, popular)
+
+
+class SpecCache:
+    """On-disk cache of parsed specs keyed by (path, mtime, size) and by content hash."""
+
+    def __init__(self, directory=os.path.join('.metro_cache', 'specs'), max_entries=100000,
+                 max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):  # missing or half-written entry: parse again
+            return None
+
+    def _store(self, key, entry):
+        path = self._path(key)
+        tmp = path + '.tmp%d' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmp, path)
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def get(self, path):
+        """Returns the MetroSpec of `path`, parsing it only if it is not cached."""
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise ValueError("Failed reading city file %r: %s" % (path, e))
+        stat_key = hashlib.sha256(('%s|%d|%d' % (os.path.realpath(path), st.st_mtime_ns, st.st_size))
+                                  .encode()).hexdigest()
+        digest = self._load(stat_key)
+        if is_digest(digest):
+            spec = spec_from_json(self._load(digest))
+            if spec is not None:
+                return spec
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            raise ValueError("Failed reading city file %r: %s" % (path, e))
+        digest = hashlib.sha256(data).hexdigest()
+        spec = spec_from_json(self._load(digest))
+        if spec is None:
+            spec = parse_city_text(data.decode(), path)
+            self._store(digest, list(spec))
+        self._store(stat_key, digest)
+        return spec
+
+    def evict(self):
+        """Drops entries older than max_age, then least recently written ones above max_entries."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if now - mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((mtime, path))
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,100 +1,22 @@
 from __future__ import print_function
+import re
 import sys
-from collections import namedtuple
 
-MetroSpec = namedtuple(
-    'MetroSpec', ['scenario', 'N', 'M', 'K', 'J', 'P', 'starts', 'ends', 'popular']
-)
+from city_parser import MetroSpec, parse_city
 
+# Positive literals of a space-prefixed DIMACS model line
+POSITIVE_LITERAL = re.compile(r' (\d+)')
 
-def parse_city(path):
-    try:
-        with open(path, 'r') as f:
-            raw = [ln.rstrip('\n') for ln in f.readlines()]
-    except Exception as e:
-        raise ValueError("Failed reading city file %r: %s" % (path, e))
-
-    if not raw:
-        raise ValueError("Empty city file: %s" % path)
-    i = 0
-    while i < len(raw) and raw[i].strip() == '':
-        i += 1
-    if i >= len(raw):
-        raise ValueError("City file contains only whitespace")
-    first = raw[i].strip()
-    if first not in ('1', '2'):
-        raise ValueError(
-            "First non-empty line must be '1' or '2' (scenario); got: %r" % first)
-    scenario = int(first)
-    i += 1
-    while i < len(raw) and raw[i].strip() == '':
-        i += 1
-    if i >= len(raw):
-        raise ValueError("Missing second line with grid params (N M K J [P])")
-    params = raw[i].split()
-    i += 1
-    if scenario == 1:
-        if len(params) != 4:
-            raise ValueError(
-                "Scenario 1 expects 4 ints on second line: N M K J")
-        N, M, K, J = map(int, params)
-        P = 0
-    else:
-        if len(params) != 5:
-            raise ValueError(
-                "Scenario 2 expects 5 ints on second line: N M K J P")
-        N, M, K, J, P = map(int, params)
-    if N <= 0 or M <= 0 or K < 0 or J < 0 or P < 0:
-        raise ValueError("Invalid numeric values in header")
-    starts = []
-    ends = []
-    for lineno in range(K):
-        while i < len(raw) and raw[i].strip() == '':
-            i += 1
-        if i >= len(raw):
-            raise ValueError(
-                "Expected %d metro lines but file ended early" % K)
-        toks = raw[i].split()
-        i += 1
-        if len(toks) != 4:
-            raise ValueError(
-                "Metro line %d: expected 4 integers (sx sy ex ey)" % lineno)
-        sx, sy, ex, ey = map(int, toks)
-        if not (0 <= sx < N and 0 <= ex < N and 0 <= sy < M and 0 <= ey < M):
-            raise ValueError("Metro %d coordinates out of bounds: %r" %
-                             (lineno, (sx, sy, ex, ey)))
-        starts.append((sx, sy))
-        ends.append((ex, ey))
-    popular = []
-    if scenario == 2:
-        while i < len(raw) and raw[i].strip() == '':
-            i += 1
-        if i >= len(raw):
-            raise ValueError("Scenario 2: missing line with popular cells")
-        toks = raw[i].split()
-        i += 1
-        if len(toks) != 2 * P:
-            raise ValueError(
-                "Scenario 2: expected %d tokens for %d popular cells, got %d" % (2 * P, P, len(toks)))
-        coords = list(map(int, toks))
-        for pidx in range(P):
-            x = coords[2 * pidx]
-            y = coords[2 * pidx + 1]
-            if not (0 <= x < N and 0 <= y < M):
-                raise ValueError(
-                    "Popular cell %d out of bounds: (%d,%d)" % (pidx, x, y))
-            popular.append((x, y))
-    if len(set(starts)) != len(starts):
-        raise ValueError("Duplicate start locations in city file")
-    if len(set(ends)) != len(ends):
-        raise ValueError("Duplicate end locations in city file")
-    if set(starts).intersection(set(ends)):
-        raise ValueError(
-            "Some start equals some end location (all starts & ends must be unique)")
-    return MetroSpec(scenario=scenario, N=N, M=M, K=K, J=J, P=P, starts=starts, ends=ends, popular=popular)
+# Direction order of the encoder's variables: id = k*N*M*4 + (x*M + y)*4 + d + 1
+DIRECTIONS = "LRUD"
+DIR_STEP = ((-1, 0), (1, 0), (0, -1), (0, 1))
 
 
 def parse_sat_output(path, spec):
+    """
+    Reads a minisat result file. Returns ("UNSAT", []) or ("SAT", assignment)
+    where assignment holds the true direction variables (ids <= K*N*M*4).
+    """
     try:
         with open(path, 'r') as f:
             lines = [ln.strip() for ln in f if ln.strip()]
@@ -109,95 +31,74 @@ def parse_sat_output(path, spec):
     elif lines[0].startswith("SAT"):
         assignment = []
         if len(lines) > 1:
-            assignment = [int(x) for x in lines[1].split() if x[0] != '-' and x != '0' and int(x) <= spec.K * spec.N * spec.M * 4]
+            limit = spec.K * spec.N * spec.M * 4
+            # The regex scan runs in C and only the true literals become ints
+            assignment = [v for v in map(int, POSITIVE_LITERAL.findall(' ' + lines[1]))
+                          if 0 < v <= limit]
         return "SAT", assignment
     else:
         raise ValueError("Invalid SAT output format")
 
 
 def decode_solution(spec, assignment):
-    # Map: (dx, dy) -> direction letter
-    DIRS = {
-        (1, 0): 'R',
-        (-1, 0): 'L',
-        (0, 1): 'D',
-        (0, -1): 'U'
-    }
-
-    next_dir = {
-        "R": (1, 0),
-        "L": (-1, 0),
-        "U": (0, -1),
-        "D": (0, 1)
-    }
+    """
+    Turns the true direction variables into one list of moves per line.
+
+    Variable ids are inverted arithmetically into a cell -> direction dict per
+    line, built only from the positive literals, then each line is traced from
+    its start. Cost is O(len(assignment)) plus the path lengths, independent
+    of the grid size. Raises ValueError if a line runs into a cell without a
+    direction, leaves the grid, or loops without reaching its end.
+    """
     K = spec.K
     N = spec.N
     M = spec.M
-    metro_rail_direction = ["L", "R", "U", "D"]
-
-    # 1) Mapping Variables
-    var_id = {}
-    var_id_counter = 1
-    for k in range(K):
-        for x in range(N):
-            for y in range(M):
-                for cell_direction in metro_rail_direction:
-                    var_id[var_id_counter] = (k, x, y, cell_direction)
-                    var_id_counter += 1
-
-    assignment_tuples = [var_id[val] for val in assignment]
-    # print(assignment_tuples)
-    line_assignments = {}
-
-    for line, v1, v2, v3 in assignment_tuples:
-        if line not in line_assignments:
-            line_assignments[line] = []
-        line_assignments[line].append((v1, v2, v3))
-    # print(line_assignments)
-
+    per_line = N * M * 4
+
+    # 1) Cell index -> index into DIRECTIONS, per line
+    grids = [{} for _ in range(K)]
+    for v in assignment:
+        if not 0 < v <= K * per_line:
+            continue
+        k, rest = divmod(v - 1, per_line)
+        cell, d = divmod(rest, 4)
+        grids[k][cell] = d
+
+    # 2) Trace each line from its start
     all_paths = []
-
-    for line, points in line_assignments.items():
-        # Build a quick lookup: (x,y) -> label
-        # print(points)
-        point_map = {(x, y): label for x, y, label in points}
-        start = spec.starts[line]
-        end = spec.ends[line]
-        # print(point_map)
-        point_map[end] = ""
-
-        current = start
-        visited = set([current])
+    for k in range(K):
+        grid = grids[k]
+        x, y = spec.starts[k]
+        end = spec.ends[k]
         directions = []
-
-        # Walk until we reach the end or no move is possible
-        i = 0
-        while (i < len(point_map)):
-            # print(current)
-            if current == end:
-                # print("Broken at ",current,end)
-                break
-
-            x, y = current
-            # print(point_map[current],"  ",next_dir[point_map[current]])
-            nx, ny = next_dir[point_map[current]]
-            directions.append(point_map[current])
-
-            current = (x + nx, y + ny)
-            i += 1
-
+        while (x, y) != end:
+            d = grid.get(x * M + y)
+            if d is None:
+                raise ValueError("Line %d: no direction at (%d,%d) before reaching end %r"
+                                 % (k, x, y, end))
+            if len(directions) >= len(grid):
+                raise ValueError("Line %d: path loops without reaching end %r" % (k, end))
+            directions.append(DIRECTIONS[d])
+            dx, dy = DIR_STEP[d]
+            x += dx
+            y += dy
+            if not (0 <= x < N and 0 <= y < M):
+                raise ValueError("Line %d: path leaves the grid at (%d,%d)" % (k, x, y))
         all_paths.append(directions)
 
     return all_paths
 
 
+def format_metromap(metromap_lines):
+    """Text of a .metromap file: "0" for UNSAT, else one move line per metro."""
+    if metromap_lines == "UNSAT":
+        return "0\n"
+    return "".join(" ".join(line) + " 0\n" for line in metromap_lines)
+
+
 def write_metromap(filename, metromap_lines):
     with open(filename, "w") as f:
-        if metromap_lines == "UNSAT":
-            f.write("0\n")
-        else:
-            for line in metromap_lines:
-                f.write(" ".join(line) + " 0\n")
+        f.write(format_metromap(metromap_lines))
 
 
 def main():
@@ -227,7 +128,11 @@ def main():
         print("[Decoder] UNSAT → wrote '0' in metromap.")
         sys.exit(0)
 
-    metromap = decode_solution(spec, assignment)
+    try:
+        metromap = decode_solution(spec, assignment)
+    except ValueError as e:
+        print("Decoding error:", e, file=sys.stderr)
+        sys.exit(1)
     write_metromap(map_file, metromap)
     print(f"[Decoder] Wrote metromap to {map_file}")
 
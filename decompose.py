@@ -0,0 +1,258 @@
+"""
+Decomposition into independent sub-problems for Assignment 3: Metro Map Planning
+
+A line with at most J turns can only use the cells precheck.coverable_cells
+gives for it (its region). Two lines whose regions do not intersect can never
+touch, so the interaction graph has an edge between lines whose regions
+intersect, and each connected component is an independent city:
+
+ - it is cropped to the bounding box of its lines' regions and keeps the
+   popular cells inside them (a popular cell is only coverable by lines whose
+   regions contain it, and those are all in one component),
+ - every line is restricted to its own region with unit clauses, so the
+   merged paths of different components cannot overlap and no path runs
+   through another component's endpoints,
+ - components are encoded and solved in parallel, smallest first; the city
+   is UNSAT as soon as one component is (the workers still solving others
+   are killed, with any minisat they started), else the per-component metromaps are merged and the whole
+   map is checked with format_checker.analyze_constraints.
+
+No solution is lost: every path with at most J turns that avoids the other
+lines' endpoints stays inside its line's region. The 'solve' timing covers
+encoding and solving the components.
+
+Usage:
+    python3 decompose.py <basename> [--workers 4] [--backend auto] [--timeout SECONDS]
+                         [--write metromap|none]
+
+Exit codes:
+ - 0 : a valid metromap was found, or the city is UNSAT.
+ - 1 : parse error, decode error or an invalid metromap.
+ - 2 : a component timed out.
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from city_parser import MetroSpec, parse_city
+from decoder import decode_solution, write_metromap
+from encoder import metro_rail_direction
+from format_checker import analyze_constraints
+from memory_guard import VarMap
+from pipeline import PipelineResult, encode_quietly, timed
+from precheck import coverable_cells, endpoint_cells, find_infeasibility, turn_distances
+from sat_solver import solve_cnf
+
+
+def line_regions(spec):
+    """The set of cells each line can use with at most J turns."""
+    owner = endpoint_cells(spec)
+    regions = []
+    for k in range(spec.K):
+        fwd = turn_distances(spec.N, spec.M, spec.J, owner, k, spec.starts[k], spec.ends[k])
+        bwd = turn_distances(spec.N, spec.M, spec.J, owner, k, spec.ends[k], spec.starts[k])
+        regions.append(coverable_cells(spec, k, fwd, bwd))
+    return regions
+
+
+def interaction_components(regions):
+    """Connected components (sorted lists of lines) of the region-intersection graph."""
+    parent = list(range(len(regions)))
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    first_line = {}
+    for k, region in enumerate(regions):
+        for cell in region:
+            other = first_line.setdefault(cell, k)
+            if other != k:
+                parent[find(k)] = find(other)
+    components = {}
+    for k in range(len(regions)):
+        components.setdefault(find(k), []).append(k)
+    return sorted(components.values())
+
+
+def component_spec(spec, lines, regions):
+    """
+    The sub-city of `lines`, cropped to the bounding box of their regions.
+    Returns (sub_spec, allowed) where allowed[i] is the cell set of sub-line i
+    in cropped coordinates.
+    """
+    cells = set().union(*(regions[k] for k in lines))
+    x0 = min(x for x, _ in cells)
+    y0 = min(y for _, y in cells)
+    N = max(x for x, _ in cells) - x0 + 1
+    M = max(y for _, y in cells) - y0 + 1
+    endpoints = set(spec.starts) | set(spec.ends)
+    popular = [(x - x0, y - y0) for (x, y) in spec.popular
+               if (x, y) in cells and (x, y) not in endpoints]
+    sub = MetroSpec(scenario=spec.scenario, N=N, M=M, K=len(lines), J=spec.J, P=len(popular),
+                    starts=[(spec.starts[k][0] - x0, spec.starts[k][1] - y0) for k in lines],
+                    ends=[(spec.ends[k][0] - x0, spec.ends[k][1] - y0) for k in lines],
+                    popular=popular)
+    allowed = [{(x - x0, y - y0) for (x, y) in regions[k]} for k in lines]
+    return sub, allowed
+
+
+def solve_component(task):
+    """Encodes and solves one component; returns (status, moves, num_vars, num_clauses, detail)."""
+    sub, allowed, backend, timeout, cnf_base = task
+    num_vars, clauses, _ = encode_quietly(sub)
+    var_id = VarMap(sub)
+    for i, cells in enumerate(allowed):
+        for x in range(sub.N):
+            for y in range(sub.M):
+                if (x, y) not in cells:
+                    for d in metro_rail_direction:
+                        clauses.add((-var_id[(i, x, y, d)],))
+    result = solve_cnf(num_vars, clauses, backend, timeout, cnf_base + ".satinput", cnf_base + ".satoutput")
+    if result.status != 'SAT':
+        return result.status, None, num_vars, len(clauses), None
+    try:
+        moves = decode_solution(sub, [v for v in result.model if v > 0])
+    except ValueError as e:
+        return 'ERROR', None, num_vars, len(clauses), "decode: %s" % e
+    return 'SAT', moves, num_vars, len(clauses), None
+
+
+def own_process_group():
+    """Pool initializer: the worker leads a process group, which the minisat runs it starts join."""
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+
+def kill_process_groups(pids):
+    """Kills whatever is left in the workers' process groups (minisat runs)."""
+    if not hasattr(os, 'killpg'):
+        return
+    for pid in pids:
+        with contextlib.suppress(OSError):
+            os.killpg(pid, signal.SIGKILL)
+
+
+def solve_indexed(item):
+    """Pool side of solve_component for imap_unordered: (index, task) -> (index, result)."""
+    index, task = item
+    return index, solve_component(task)
+
+
+def solve_decomposed(spec, backend='auto', timeout=None, workers=None, timings=None):
+    """
+    Solves `spec` one interaction component at a time, in parallel, and
+    returns a PipelineResult for the merged map. num_vars and num_clauses are
+    summed over the components; detail names the component count.
+    """
+    timings = {} if timings is None else timings
+    with timed(timings, 'precheck'):
+        reason = find_infeasibility(spec)
+    if reason is not None:
+        return PipelineResult('UNSAT', None, None, None, timings, "precheck: " + reason)
+    with timed(timings, 'decompose'):
+        regions = line_regions(spec)
+        components = interaction_components(regions)
+    # Component CNFs live here, so files of a killed minisat run are removed too
+    tmp = tempfile.TemporaryDirectory(prefix='decompose_')
+    tasks = [component_spec(spec, lines, regions)
+             + (backend, timeout, os.path.join(tmp.name, "component%d" % index))
+             for index, lines in enumerate(components)]
+    sizes = "+".join(str(len(lines)) for lines in components)
+    print(f"[Decompose] {len(components)} component(s) of {sizes} line(s)")
+
+    moves = [None] * spec.K
+    num_vars = num_clauses = 0
+    with tmp, timed(timings, 'solve'):
+        # Smallest components first: they finish (or come back UNSAT) soonest
+        order = sorted(range(len(tasks)), key=lambda index: (len(components[index]), index))
+        if len(tasks) == 1 or workers == 1:
+            results = ((index, solve_component(tasks[index])) for index in order)
+            pool = None
+        else:
+            before = set(multiprocessing.active_children())
+            pool = multiprocessing.Pool(min(workers or os.cpu_count() or 1, len(tasks)),
+                                        initializer=own_process_group)
+            worker_pids = [p.pid for p in multiprocessing.active_children() if p not in before]
+            results = pool.imap_unordered(solve_indexed, [(index, tasks[index]) for index in order])
+        try:
+            for index, (status, sub_moves, sub_vars, sub_clauses, detail) in results:
+                num_vars += sub_vars
+                num_clauses += sub_clauses
+                lines = components[index]
+                if status != 'SAT':
+                    detail = detail or "component %d (lines %s) is %s" % (
+                        index, ",".join(map(str, lines)), status)
+                    return PipelineResult('ERROR' if status == 'ERROR' else status, None,
+                                          num_vars, num_clauses, timings, detail)
+                for k, line_moves in zip(lines, sub_moves):
+                    moves[k] = line_moves
+        finally:
+            if pool is not None:
+                # Kills the components still being solved after an early UNSAT/TIMEOUT;
+                # SIGTERM reaches only the workers, not the minisat they started
+                pool.terminate()
+                pool.join()
+                kill_process_groups(worker_pids)
+
+    with timed(timings, 'check'):
+        report = analyze_constraints(spec, moves)
+    status = 'VALID' if report['final_valid'] else 'INVALID'
+    detail = "%d component(s)" % len(components)
+    if status == 'INVALID':
+        detail += ", format_checker rejected the merged map"
+    return PipelineResult(status, moves, num_vars, num_clauses, timings, detail)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a city one independent group of lines at a time.")
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Components solved at once.")
+    parser.add_argument("--backend", default="auto", help="minisat, pysat or auto.")
+    parser.add_argument("--timeout", type=float, help="Solver timeout per component in seconds.")
+    parser.add_argument("--write", choices=["metromap", "none"], default="metromap",
+                        help="Write <basename>.metromap (default) or nothing.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+
+    timings = {}
+    try:
+        with timed(timings, 'parse'):
+            spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        result = solve_decomposed(spec, args.backend, args.timeout, args.workers, timings)
+    except (RuntimeError, ValueError) as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(1)
+    if args.write == "metromap" and result.status in ('VALID', 'INVALID', 'UNSAT'):
+        with timed(timings, 'write'):
+            write_metromap(base + ".metromap", "UNSAT" if result.status == 'UNSAT' else result.moves)
+
+    size = ""
+    if result.num_vars is not None:
+        size = f" (variables: {result.num_vars}, clauses: {result.num_clauses})"
+    print(f"[Decompose] {base}: {result.status} - {result.detail}{size}")
+    for stage, seconds in timings.items():
+        print(f"[Decompose]   {stage:<9} {seconds:8.3f}s")
+    print(f"[Decompose]   {'total':<9} {time.perf_counter() - start + timings['parse']:8.3f}s")
+    sys.exit({'VALID': 0, 'UNSAT': 0, 'TIMEOUT': 2}.get(result.status, 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,9 @@
 import sys
-from collections import namedtuple
-
-MetroSpec = namedtuple(
-    'MetroSpec', ['scenario', 'N', 'M', 'K', 'J', 'P', 'starts', 'ends', 'popular']
-)
-
-
-def parse_city(path):
-    try:
-        with open(path, 'r') as f:
-            raw = [ln.rstrip('\n') for ln in f.readlines()]
-    except Exception as e:
-        raise ValueError("Failed reading city file %r: %s" % (path, e))
-    if not raw:
-        raise ValueError("Empty city file: %s" % path)
-    i = 0
-    while i < len(raw) and raw[i].strip() == '':
-        i += 1
-    if i >= len(raw):
-        raise ValueError("City file contains only whitespace")
-    first = raw[i].strip()
-    if first not in ('1', '2'):
-        raise ValueError(
-            "First non-empty line must be '1' or '2' (scenario); got: %r" % first)
-    scenario = int(first)
-    i += 1
-    while i < len(raw) and raw[i].strip() == '':
-        i += 1
-    if i >= len(raw):
-        raise ValueError("Missing second line with grid params (N M K J [P])")
-    params = raw[i].split()
-    i += 1
-    if scenario == 1:
-        if len(params) != 4:
-            raise ValueError(
-                "Scenario 1 expects 4 ints on second line: N M K J")
-        N, M, K, J = map(int, params)
-        P = 0
-    else:
-        if len(params) != 5:
-            raise ValueError(
-                "Scenario 2 expects 5 ints on second line: N M K J P")
-        N, M, K, J, P = map(int, params)
-    if N <= 0 or M <= 0 or K < 0 or J < 0 or P < 0:
-        raise ValueError("Invalid numeric values in header")
-    starts = []
-    ends = []
-    for lineno in range(K):
-        while i < len(raw) and raw[i].strip() == '':
-            i += 1
-        if i >= len(raw):
-            raise ValueError(
-                "Expected %d metro lines but file ended early" % K)
-        toks = raw[i].split()
-        i += 1
-        if len(toks) != 4:
-            raise ValueError(
-                "Metro line %d: expected 4 integers (sx sy ex ey)" % lineno)
-        sx, sy, ex, ey = map(int, toks)
-        if not (0 <= sx < N and 0 <= ex < N and 0 <= sy < M and 0 <= ey < M):
-            raise ValueError("Metro %d coordinates out of bounds: %r" %
-                             (lineno, (sx, sy, ex, ey)))
-        starts.append((sx, sy))
-        ends.append((ex, ey))
-    popular = []
-    if scenario == 2:
-        while i < len(raw) and raw[i].strip() == '':
-            i += 1
-        if i >= len(raw):
-            raise ValueError("Scenario 2: missing line with popular cells")
-        toks = raw[i].split()
-        i += 1
-        if len(toks) != 2 * P:
-            raise ValueError(
-                "Scenario 2: expected %d tokens for %d popular cells, got %d" % (2 * P, P, len(toks)))
-        coords = list(map(int, toks))
-        for pidx in range(P):
-            x = coords[2 * pidx]
-            y = coords[2 * pidx + 1]
-            if not (0 <= x < N and 0 <= y < M):
-                raise ValueError(
-                    "Popular cell %d out of bounds: (%d,%d)" % (pidx, x, y))
-            popular.append((x, y))
-    if len(set(starts)) != len(starts):
-        raise ValueError("Duplicate start locations in city file")
-    if len(set(ends)) != len(ends):
-        raise ValueError("Duplicate end locations in city file")
-    if set(starts).intersection(set(ends)):
-        raise ValueError(
-            "Some start equals some end location (all starts & ends must be unique)")
-    return MetroSpec(scenario=scenario, N=N, M=M, K=K, J=J, P=P, starts=starts, ends=ends, popular=popular)
 
+from city_parser import MetroSpec, parse_city
+from memory_guard import (CLAUSE_BYTES, MB, DiskClauseSink, PhaseTracker, VarMap,
+                          estimate_bytes, estimate_clauses)
+from precheck import find_infeasibility
 
 '''
 Helper Functions
@@ -120,23 +33,28 @@ def exactly_one(variables_for_cell):
     return clauses
 
 def at_most_J_turns(vars_list, J):
+    """
+    Sequential counter: aux(i, j) is true when at least j + 1 of the first
+    i + 1 variables are, and aux(i, J) is forbidden, so at most J are true.
+    Returns (clauses, largest variable id used).
+    """
     clauses = set()
     n = len(vars_list)
     if n <= J:
-        return clauses
+        return clauses, max(vars_list)
     if J == 0:
         for v in vars_list:
             clauses.add((-v,))
-        return clauses
+        return clauses, max(vars_list)
     aux = {}
     base_aux = max(vars_list) + 1
     for i in range(n):
-        for j in range(J):
+        for j in range(J + 1):
             aux[(i, j)] = base_aux
             base_aux += 1
     for i in range(n):
         v = vars_list[i]
-        for j in range(J):
+        for j in range(J + 1):
             if i == 0 and j == 0:
                 clauses.add((-v, aux[(i, j)]))
             elif i == 0:
@@ -148,70 +66,113 @@ def at_most_J_turns(vars_list, J):
                 clauses.add((-v, -aux[(i - 1, j - 1)], aux[(i, j)]))
                 clauses.add((-aux[(i - 1, j)], aux[(i, j)]))
     for i in range(n):
-        clauses.add((-aux[(i, J - 1)],))
+        clauses.add((-aux[(i, J)],))
     return clauses, base_aux - 1
 
 
-def encode_to_sat(spec):
-    clauses = set()
-    K = spec.K
-    N = spec.N
-    M = spec.M
-    J = spec.J
-    metro_rail_direction = ["L", "R", "U", "D"]
-
-    # 1) Mapping Variables
-    '''
+def counter_literals(vars_list, J, true_vars):
+    """
+    The at_most_J_turns counter variables of vars_list that unit propagation
+    sets true when exactly the variables in `true_vars` are true (same
+    numbering as at_most_J_turns).
+    """
+    n = len(vars_list)
+    if n <= J or J == 0:
+        return []
+    base_aux = max(vars_list) + 1
+    literals = []
+    seen = 0
+    for i, v in enumerate(vars_list):
+        if v in true_vars:
+            seen += 1
+        literals.extend(base_aux + i * (J + 1) + j for j in range(min(seen, J + 1)))
+    return literals
+
+
+# Bumped whenever a change to the encoding can change a verdict, so verdicts
+# cached under an older encoding (solution_cache.py) are not served again.
+# 2: at_most_J_turns allows J turns (it used to allow only J - 1)
+ENCODING_VERSION = 2
+
+# Direction variables come in this order for every (line, cell)
+metro_rail_direction = ["L", "R", "U", "D"]
+opposites = {
+    "L": "R",
+    "R": "L",
+    "U": "D",
+    "D": "U"
+}
+neighbors = {
+    "L": (-1, 0),
+    "R": (1, 0),
+    "U": (0, -1),
+    "D": (0, 1)
+}
+
+
+def direction_variables(spec):
+    """
+    1) Mapping Variables
     Number of variable generated : K * N * M * 4
-    '''
+    Returns (var_id, next free variable id).
+    """
     var_id = {}
     var_id_counter = 1
-    for k in range(K):
-        for x in range(N):
-            for y in range(M):
+    for k in range(spec.K):
+        for x in range(spec.N):
+            for y in range(spec.M):
                 for cell_direction in metro_rail_direction:
                     var_id[(k, x, y, cell_direction)] = var_id_counter
                     var_id_counter += 1
-
     print("Variable Generated")
-    for k in range(K):
+    return var_id, var_id_counter
+
+
+def turn_clauses(spec, var_id, var_id_counter, clauses):
+    """
+    1b) One turn variable per (line, cell) and at most J of them true per line.
+    Returns the next free variable id.
+    """
+    for k in range(spec.K):
         turns_list = []
-        for x in range(N):
-            for y in range(M):
+        for x in range(spec.N):
+            for y in range(spec.M):
                 var_id[(k, x, y)] = var_id_counter
                 turns_list.append(var_id_counter)
                 var_id_counter += 1
-        turn_clauses, new_max_var = at_most_J_turns(turns_list, J)
-        clauses |= turn_clauses
+        line_clauses, new_max_var = at_most_J_turns(turns_list, spec.J)
+        clauses |= line_clauses
         var_id_counter = max(var_id_counter, new_max_var + 1)
 
     print("At most turns clauses Added")
+    return var_id_counter
+
 
-    # 2) At most one rail direction per cell
-    '''
+def one_direction_clauses(spec, var_id, clauses):
+    """
+    2) At most one rail direction per cell
     Number of Clauses generated : 6 * K * N * M
     6 per cell.
-    '''
-    for k in range(K):
-        for x in range(N):
-            for y in range(M):
+    """
+    for k in range(spec.K):
+        for x in range(spec.N):
+            for y in range(spec.M):
                 possible_direction_for_this_cell = []
                 for cell_direction in metro_rail_direction:
                     possible_direction_for_this_cell.append(var_id[(k, x, y, cell_direction)])
-                clauses_for_this_cell = at_most_one(possible_direction_for_this_cell)
-                clauses = clauses | clauses_for_this_cell
+                clauses |= at_most_one(possible_direction_for_this_cell)
     print("At most one rail per cell clauses Added")
-    # print(len(clauses))
 
-    # 3) Every edge cannot have one direction
-    '''
+
+def border_clauses(spec, var_id, clauses):
+    """
+    3) Every edge cannot have one direction
     Number of Clauses generated : ((2 * 4) + (N - 2) * 2 + (M - 2) * 2) * K
     1) every corner cannot have 2 directions
     2) every edge cannot have 1 directions
-    '''
-    # old_clauses=clauses
-    # clauses=set()
-    for k in range(K):
+    """
+    N, M = spec.N, spec.M
+    for k in range(spec.K):
         for x in range(N):
             for y in range(M):
                 if x == 0:  # Left Column
@@ -222,74 +183,50 @@ def encode_to_sat(spec):
                     clauses.add((-var_id[(k, x, y, "U")]))
                 if y == M - 1:  # Bottom Row
                     clauses.add((-var_id[(k, x, y, "D")]))
-    # print(len(clauses),"\n",clauses)
     print("Edge/corner clauses added")
 
-    # 4) Giving Start a valid direction and End no direction
-    '''
-    K * 4 <= Number of Clauses generated  <= K * 2 * 4 
+
+def valid_start_directions(spec, k):
+    """Directions out of line k's start that stay on the grid."""
+    sx, sy = spec.starts[k]
+    valid = []
+    for cell_direction in metro_rail_direction:
+        (dx, dy) = neighbors[cell_direction]
+        nx, ny = sx + dx, sy + dy
+        if 0 <= nx < spec.N and 0 <= ny < spec.M:
+            valid.append(cell_direction)
+    return valid
+
+
+def endpoint_clauses(spec, var_id, clauses):
+    """
+    4) Giving Start a valid direction and End no direction
+    K * 4 <= Number of Clauses generated  <= K * 2 * 4
     1) minimum is when all endpoints are on corners
     2) maximum is when all endpoints are internal
-    '''
-    start_points = []
-    end_points = []
-    valid_starting_direction = []
-    opposites = {
-        "L": "R",
-        "R": "L",
-        "U": "D",
-        "D": "U"
-    }
-    neighbors = {
-        "L": (-1, 0),
-        "R": (1, 0),
-        "U": (0, -1),
-        "D": (0, 1)
-    }
-    # old_clauses=clauses
-    # clauses=set()
-
-    for k in range(K):
+    """
+    for k in range(spec.K):
         sx, sy = spec.starts[k]
         ex, ey = spec.ends[k]
-        start_points.append((sx, sy))
-        end_points.append((ex, ey))
-        kth_starting_valid_directions = []
-        variable_for_cell = []
         clauses.add((-var_id[(k, sx, sy)], ))
         # Giving Start point a valid direction
-        for cell_direction in metro_rail_direction:
-            v = var_id[(k, sx, sy, cell_direction)]
-            (dx, dy) = neighbors[cell_direction]
-            nx, ny = sx + dx, sy + dy
-            # print(f"{cell_direction} -> ({dx}, {dy}) new cell -> ({nx}, {ny})")
-            # OUT OF BOUNDS
-            if not (0 <= nx < N and 0 <= ny < M):
-                continue
-            variable_for_cell.append(v)
-            kth_starting_valid_directions.append(cell_direction)
-        # print(f"For starting point ({sx, sy}) its clauses are : ", exactly_one(variable_for_cell))
-        clauses = clauses | exactly_one(variable_for_cell)
-        valid_starting_direction.append(kth_starting_valid_directions)
+        variable_for_cell = [var_id[(k, sx, sy, d)] for d in valid_start_directions(spec, k)]
+        clauses |= exactly_one(variable_for_cell)
 
         # Giving Ending Point no Direction
         clauses.add((-var_id[(k, ex, ey)],))
         for cell_direction in metro_rail_direction:
             v = var_id[(k, ex, ey, cell_direction)]
             clauses.add((-v, ))
-
-    # print(len(clauses),"\n",clauses)
-    # clauses=clauses | old_clauses
-
-    # print(valid_starting_direction)
     print("Gave start and end their respective direction")
 
-    # 5) Make sure Start has valid neighbors
-    for k in range(K):
+
+def start_neighbor_clauses(spec, var_id, clauses):
+    """5) Make sure Start has valid neighbors"""
+    for k in range(spec.K):
         sx, sy = spec.starts[k]
         ex, ey = spec.ends[k]
-        kth_starting_valid_directions = valid_starting_direction[k]
-        for starting_direction in kth_starting_valid_directions:
+        for starting_direction in valid_start_directions(spec, k):
             v = var_id[(k, sx, sy, starting_direction)]
             (dx, dy) = neighbors[starting_direction]
             nx, ny = sx + dx, sy + dy
@@ -298,56 +235,51 @@ def encode_to_sat(spec):
             local = []
             for cell_direction in metro_rail_direction:
                 if cell_direction != opposites[starting_direction]:
-                    # print(f"For ({sx}, {sy}) and its direction {starting_direction} neighbor has direction option {cell_direction}")
                     local.append(var_id[k, nx, ny, cell_direction])
             clauses.add(tuple([-v] + local))
     print("Added clause to give start its neighbor")
-    # print(len(clauses))
 
-    # 6) Incoming Edge to an End
-    # old_clauses=clauses
-    # clauses=set()
 
-    for k in range(K):
+def end_incoming_clauses(spec, var_id, clauses):
+    """6) Incoming Edge to an End"""
+    for k in range(spec.K):
         ex, ey = spec.ends[k]
         variable_for_cell = []
         for neighbor in neighbors:
             (dx, dy) = neighbors[neighbor]
             nx, ny = ex + dx, ey + dy
-            if not (0 <= nx < N and 0 <= ny < M):
+            if not (0 <= nx < spec.N and 0 <= ny < spec.M):
                 continue
-            # print(f"For ({ex, ey}) neighbor on {nx, ny} is {opposites[neighbor]}")
             variable_for_cell.append((var_id[(k, nx, ny, opposites[neighbor])]))
-        # print(f"For End ({ex, ey}) its clauses are : ", exactly_one(variable_for_cell))
-        clauses = clauses | exactly_one(variable_for_cell)
-    # print(end_points, start_points)
+        clauses |= exactly_one(variable_for_cell)
     print("Added clause to give end an incoming edge")
-    # print(len(clauses),"\n",clauses)
-    # clauses=clauses | old_clauses
 
-    # 6.5) start's valid neighbors should'nt point towards it
-    for k in range(K):
+
+def start_incoming_clauses(spec, var_id, clauses):
+    """6.5) start's valid neighbors should'nt point towards it"""
+    for k in range(spec.K):
         sx, sy = spec.starts[k]
-        variable_for_cell = []
         for neighbor in neighbors:
             (dx, dy) = neighbors[neighbor]
             nx, ny = sx + dx, sy + dy
-            if not (0 <= nx < N and 0 <= ny < M):
+            if not (0 <= nx < spec.N and 0 <= ny < spec.M):
                 continue
-            # print(f"For ({ex, ey}) neighbor on {nx, ny} is {opposites[neighbor]}")
-            variable_for_cell.append((-var_id[(k, nx, ny, opposites[neighbor])]))
-        # print(f"For End ({ex, ey}) its clauses are : ", exactly_one(variable_for_cell))
-        clauses = clauses | set(tuple([var]) for var in variable_for_cell)
+            clauses.add((-var_id[(k, nx, ny, opposites[neighbor])],))
+
 
+def continuity_clauses(spec, var_id, clauses):
+    """
+    7) If an edge is pointing towards an empty neighbor then it must be END otherwise it has to connect
+    Also marks a turn at the next cell when its direction differs, and lets at
+    most one neighbor point into a cell.
+    """
     print("Starting to add directions")
-    # print("start conditions:\n",set([tuple([var]) for var in variable_for_cell]))
-    # 7) If an edge is pointing towards an empty neighbor then it must be END otherwise it has to connect
-    # old_clauses=clauses
-    # clauses=set()
-    for k in range(K):
+    start_points = set(spec.starts)
+    end_points = set(spec.ends)
+    for k in range(spec.K):
         print("Calculating for metro ", k+1)
-        for x in range(N):
-            for y in range(M):
+        for x in range(spec.N):
+            for y in range(spec.M):
                 if (x, y) in end_points:
                     continue
 
@@ -356,9 +288,7 @@ def encode_to_sat(spec):
                     (dx, dy) = neighbors[cell_direction]
                     nx, ny = x + dx, y + dy
                     # OUT OF BOUNDS
-                    # if (nx,ny) in start_points + end_points: continue
                     if not (0 <= nx < spec.N and 0 <= ny < spec.M):
-                        # clauses.add(tuple([-var_id[(k,x,y,cell_direction)]]))
                         continue
 
                     if (nx, ny) != spec.starts[k] and (nx, ny) != spec.ends[k]:
@@ -369,17 +299,13 @@ def encode_to_sat(spec):
                                     next_cell_possible_turns.append(-var_id[(k, nx, ny, next_cell_direction)])
                                 local.append(var_id[(k, nx, ny, next_cell_direction)])
                         clauses.add(tuple([-var_id[(k, x, y, cell_direction)]] + local))
-                        print(tuple([-var_id[(k, x, y, cell_direction)]] + local))
                         for next_cell_possible_turn in next_cell_possible_turns:
                             clauses.add(
                                 tuple([-var_id[(k, x, y, cell_direction)]] + [next_cell_possible_turn] + [var_id[k, nx, ny]])
                             )
-                            print(tuple([-var_id[(k, x, y, cell_direction)]] + [next_cell_possible_turn] + [var_id[k, nx, ny]]))
-                        # print(var_id[(k, x, y, cell_direction)], next_cell_possible_turns)
                         vars = []
                         for d in metro_rail_direction:
                             if d == cell_direction:
-                                # print("direction ",d)
                                 continue
 
                             tx, ty = neighbors[d]
@@ -387,66 +313,173 @@ def encode_to_sat(spec):
                             ty += y
                             if (0 <= tx < spec.N and 0 <= ty < spec.M):
                                 vars.append(var_id[(k, tx, ty, opposites[d])])
-                                
-                        
-                        if(x,y) not in start_points and (x,y) not in end_points:
-                            print(var_id[(k,x,y,cell_direction)],vars)
-                            clauses = clauses | at_most_one(vars)
-    print("Ending adding directions")
 
-    # print("Debug :",len(clauses), "\n_________\n",clauses )
-    # clauses=clauses|old_clauses
+                        if (x, y) not in start_points:
+                            clauses |= at_most_one(vars)
+    print("Ending adding directions")
 
-    def valid_coordinates(x, y):
-        if (0 <= x < spec.N and 0 <= y < spec.M):
-            return True
-        return False
 
-    # temp=[]
-    for k in range(K):
+def foreign_end_clauses(spec, var_id, clauses):
+    """7.5) No other line may run through (or point out of) a line's end"""
+    for k in range(spec.K):
         (ex, ey) = spec.ends[k]
         n = []
         for side in neighbors:
             dx, dy = neighbors[side]
-            if valid_coordinates(ex + dx, ey + dy):
+            if 0 <= ex + dx < spec.N and 0 <= ey + dy < spec.M:
                 n.append(side)
-        for k1 in range(K):
+        for k1 in range(spec.K):
             if k1 == k: continue
 
             for val in metro_rail_direction:
                 clauses.add((-var_id[(k1, ex, ey, val)]))
             for side in n:
-                dx, dy = neighbors[side]
-                # temp.append((-var_id[(k1,ex+dx,ey+dy,opposites[side])]))
                 clauses.add((-var_id[(k1, ex, ey, opposites[side])]))
 
-        # print(n)
-        # print(temp)
 
-    # 8) No Metro lines must overlap
-    for x in range(spec.N):
-        for y in range(spec.M):
-            clauses_for_this_cell = []
-            for k in range(spec.K):
-                for cell_direction in metro_rail_direction:
-                    clauses_for_this_cell.append(var_id[(k, x, y, cell_direction)])
-            clauses = clauses | at_most_one(clauses_for_this_cell)
-    # print(len(clauses))
+def overlap_clauses(spec, var_id, clauses, cells=None):
+    """8) No Metro lines must overlap (only in `cells` when given)"""
+    if cells is None:
+        cells = ((x, y) for x in range(spec.N) for y in range(spec.M))
+    for (x, y) in cells:
+        clauses_for_this_cell = []
+        for k in range(spec.K):
+            for cell_direction in metro_rail_direction:
+                clauses_for_this_cell.append(var_id[(k, x, y, cell_direction)])
+        clauses |= at_most_one(clauses_for_this_cell)
 
-    
-    # 9) P!!
-    if(spec.scenario==2):    
-        l=[]
-        for (px,py) in spec.popular:
-            for k in range(K):
-                for direction in metro_rail_direction:
-                    l.append(var_id[(k,px,py,direction)])
-            clauses|= exactly_one(l)
+
+def popular_clauses(spec, var_id, var_id_counter, clauses, cells=None):
+    """
+    9) Every popular cell (of `cells` when given) is visited by at least one line
+    Each popular cell p gets an occupancy variable o_p <-> OR of the K*4
+    direction variables at p, numbered from var_id_counter in spec.popular
+    order, and the unit clause (o_p). Cells that are a start or an end are
+    always visited and get nothing. P * (K*4 + 2) clauses at most.
+    Returns the next free variable id.
+
+    Nothing ties the directions at p to a line's path, so a detached cycle
+    (or a chain ending in a path next to its start or end) can satisfy o_p;
+    pipeline.run_pipeline and lazy_solver.solve_lazy block such models and
+    re-solve.
+    """
+    if spec.scenario != 2:
+        return var_id_counter
+    endpoints = set(spec.starts) | set(spec.ends)
+    for (px, py) in dict.fromkeys(spec.popular if cells is None else cells):
+        if (px, py) in endpoints:
+            continue
+        occupied = var_id_counter
+        var_id_counter += 1
+        lits = [var_id[(k, px, py, d)] for k in range(spec.K) for d in metro_rail_direction]
+        clauses.add((-occupied, *lits))
+        for v in lits:
+            clauses.add((-v, occupied))
+        clauses.add((occupied,))
+    print("Popular cells covered")
+    return var_id_counter
+
+
+# Clause sections after the variables and turn constraints, in encoding order.
+# Each one adds its clauses to the `clauses` set in place; popular_clauses
+# comes last and, like turn_clauses, takes and returns the variable counter.
+CLAUSE_SECTIONS = [
+    ('one_direction', one_direction_clauses),
+    ('border', border_clauses),
+    ('endpoints', endpoint_clauses),
+    ('start_neighbor', start_neighbor_clauses),
+    ('end_incoming', end_incoming_clauses),
+    ('start_incoming', start_incoming_clauses),
+    ('continuity', continuity_clauses),
+    ('foreign_end', foreign_end_clauses),
+    ('overlap', overlap_clauses),
+]
+
+
+def encode_to_sat(spec, return_var_id=False):
+    """
+    Returns (num_vars, clauses), plus the variable map when return_var_id is
+    set (direction ids under (k, x, y, d), turn ids under (k, x, y)).
+    """
+    clauses = set()
+    var_id, var_id_counter = direction_variables(spec)
+    var_id_counter = turn_clauses(spec, var_id, var_id_counter, clauses)
+    for _, section in CLAUSE_SECTIONS:
+        section(spec, var_id, clauses)
+    var_id_counter = popular_clauses(spec, var_id, var_id_counter, clauses)
 
     num_vars = var_id_counter - 1
+    if return_var_id:
+        return num_vars, clauses, var_id
     return num_vars, clauses
 
 
+def encode_with_memory_guard(spec, memory_limit_mb, spill_dir=None, return_var_id=False):
+    """
+    encode_to_sat under a ceiling on traced Python memory (in MB). If the
+    projected footprint is over the ceiling, before or after any section,
+    variable ids become arithmetic (VarMap) and clauses are streamed to a
+    DiskClauseSink in spill_dir instead of a set. Returns (num_vars, clauses,
+    tracker) where tracker.phases holds the time, peak memory and clause
+    count so far per phase (memory_limit_mb=float('inf') never spills),
+    plus the variable map (a dict or a VarMap) when return_var_id is set;
+    call clauses.close() on a DiskClauseSink once it has been written out.
+    """
+    limit = memory_limit_mb * MB
+    tracker = PhaseTracker()
+    low_memory = estimate_bytes(spec) > limit
+    if low_memory:
+        print(f"[Encoder] Projected {estimate_bytes(spec) / MB:.0f} MB > {memory_limit_mb} MB, "
+              "using the low-memory encoding")
+    clauses = DiskClauseSink(spill_dir) if low_memory else set()
+    expected = estimate_clauses(spec)
+
+    def spill_if_needed(var_id, clauses):
+        projected = tracker.current_bytes() + max(expected - len(clauses), 0) * CLAUSE_BYTES
+        if projected <= limit:
+            return var_id, clauses, False
+        print(f"[Encoder] Projected {projected / MB:.0f} MB > {memory_limit_mb} MB, "
+              "spilling clauses to disk")
+        sink = DiskClauseSink(spill_dir)
+        sink |= clauses
+        clauses.clear()
+        return VarMap.from_dict(spec, var_id), sink, True
+
+    def count():
+        return len(clauses)
+
+    try:
+        with tracker.phase('variables', count):
+            if low_memory:
+                var_id = VarMap(spec)
+                var_id_counter = spec.K * spec.N * spec.M * 4 + 1
+            else:
+                var_id, var_id_counter = direction_variables(spec)
+        with tracker.phase('turns', count):
+            var_id_counter = turn_clauses(spec, var_id, var_id_counter, clauses)
+        for name, section in CLAUSE_SECTIONS:
+            if not low_memory:
+                var_id, clauses, low_memory = spill_if_needed(var_id, clauses)
+            with tracker.phase(name, count):
+                section(spec, var_id, clauses)
+        if not low_memory:
+            var_id, clauses, low_memory = spill_if_needed(var_id, clauses)
+        with tracker.phase('popular', count):
+            var_id_counter = popular_clauses(spec, var_id, var_id_counter, clauses)
+    except BaseException:
+        # Interrupted (e.g. by a timeout alarm): nobody else will delete the spill file
+        if isinstance(clauses, DiskClauseSink):
+            clauses.close()
+        raise
+    finally:
+        tracker.stop()
+
+    num_vars = var_id_counter - 1
+    if return_var_id:
+        return num_vars, clauses, tracker, var_id
+    return num_vars, clauses, tracker
+
+
 def write_cnf(filename, num_vars, clauses):
     """
     Write CNF in DIMACS format.
@@ -455,6 +488,9 @@ def write_cnf(filename, num_vars, clauses):
     """
     with open(filename, "w") as f:
         f.write(f"p cnf {num_vars} {len(clauses)}\n")
+        if isinstance(clauses, DiskClauseSink):
+            clauses.copy_to(f)
+            return
         for clause in clauses:
             # Normalize to an iterable of ints
             if isinstance(clause, int):
@@ -467,8 +503,15 @@ def write_cnf(filename, num_vars, clauses):
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 encoder.py <basename>", file=sys.stderr)
+    # Accept: python3 encoder.py <basename> [--memory-limit MB]
+    memory_limit = None
+    if len(sys.argv) == 4 and sys.argv[2] == "--memory-limit":
+        try:
+            memory_limit = float(sys.argv[3])
+        except ValueError:
+            pass
+    if len(sys.argv) != 2 and memory_limit is None:
+        print("Usage: python3 encoder.py <basename> [--memory-limit MB]", file=sys.stderr)
         sys.exit(1)
 
     base = sys.argv[1]
@@ -484,8 +527,25 @@ def main():
         print("City parse error:", e, file=sys.stderr)
         sys.exit(1)
 
-    num_vars, clauses = encode_to_sat(spec)
-    write_cnf(sat_file, num_vars, clauses)
+    # Cheap necessary conditions first: a city that fails them is written as a
+    # trivially UNSAT CNF instead of being encoded.
+    reason = find_infeasibility(spec)
+    if reason is not None:
+        write_cnf(sat_file, 1, [(1,), (-1,)])
+        print(f"[Encoder] Precheck proved UNSAT: {reason}")
+        print(f"[Encoder] Successfully wrote {sat_file}")
+        return
+
+    if memory_limit is None:
+        num_vars, clauses = encode_to_sat(spec)
+        write_cnf(sat_file, num_vars, clauses)
+    else:
+        num_vars, clauses, tracker = encode_with_memory_guard(spec, memory_limit)
+        with tracker.phase('write_cnf'):
+            write_cnf(sat_file, num_vars, clauses)
+        if isinstance(clauses, DiskClauseSink):
+            clauses.close()
+        tracker.print_report()
 
     print(f"[Encoder] Successfully wrote {sat_file}")
     print(f"Variables: {num_vars}, Clauses: {len(clauses)}")
@@ -0,0 +1,110 @@
+"""
+Multiple-solution enumeration for Assignment 3: Metro Map Planning
+
+Finds up to N distinct metro maps for one city inside a single incremental
+solver session. After each model the metromap is decoded with
+decoder.decode_solution and a blocking clause over the decoded path cells
+(the direction literal of every cell each line passes through) is added, so
+the next model must change at least one route. Blocking the whole model
+instead would mostly enumerate permutations of the turn-counter auxiliaries.
+
+Every map is written as soon as it is found:
+    <basename>_sol1.metromap, <basename>_sol2.metromap, ...
+
+Requires python-sat (pip install python-sat) for the incremental solver.
+
+Usage:
+    python3 enumerate_solutions.py <basename> [--count 5] [--solver minisat22]
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+from decoder import DIR_STEP, DIRECTIONS, decode_solution, write_metromap
+from encoder import encode_to_sat
+from format_checker import analyze_constraints, parse_city
+from precheck import find_infeasibility
+
+
+def blocking_clause(spec, moves):
+    """Clause forbidding every line from repeating exactly the routes in `moves`."""
+    N, M = spec.N, spec.M
+    clause = []
+    for k, line in enumerate(moves):
+        x, y = spec.starts[k]
+        for mv in line:
+            d = DIRECTIONS.index(mv)
+            clause.append(-(k * N * M * 4 + (x * M + y) * 4 + d + 1))
+            x += DIR_STEP[d][0]
+            y += DIR_STEP[d][1]
+    return clause
+
+
+def enumerate_solutions(spec, limit, solver_name='minisat22'):
+    """Yields up to `limit` distinct metromaps (lists of move lists) for `spec`."""
+    try:
+        from pysat.solvers import Solver
+    except ImportError:
+        raise RuntimeError("enumeration needs python-sat: pip install python-sat")
+
+    if limit <= 0 or find_infeasibility(spec) is not None:
+        return
+    # The encoder reports progress on stdout; keep the enumeration output readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        num_vars, clauses = encode_to_sat(spec)
+    direction_vars = spec.K * spec.N * spec.M * 4
+
+    with Solver(name=solver_name) as solver:
+        for clause in clauses:
+            solver.add_clause([clause] if isinstance(clause, int) else list(clause))
+        found = 0
+        while found < limit and solver.solve():
+            model = solver.get_model()
+            moves = decode_solution(spec, [v for v in model if 0 < v <= direction_vars])
+            found += 1
+            yield moves
+            block = blocking_clause(spec, moves)
+            if not block:
+                break
+            solver.add_clause(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Enumerate distinct metro maps for one city with blocking clauses.")
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--count", type=int, default=5, help="Maximum number of maps.")
+    parser.add_argument("--solver", default="minisat22", help="python-sat solver name.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+
+    try:
+        spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    found = 0
+    try:
+        for moves in enumerate_solutions(spec, args.count, args.solver):
+            found += 1
+            map_file = f"{base}_sol{found}.metromap"
+            write_metromap(map_file, moves)
+            verdict = "VALID" if analyze_constraints(spec, moves)['final_valid'] else "INVALID"
+            print(f"[Enumerate] Solution {found}: wrote {map_file} ({verdict})")
+    except (RuntimeError, ValueError) as e:
+        print("Enumeration error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    if found == 0:
+        print("[Enumerate] UNSAT: no metromap exists")
+    else:
+        print(f"[Enumerate] {found} distinct metromap(s) found")
+
+
+if __name__ == "__main__":
+    main()
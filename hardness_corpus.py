@@ -0,0 +1,187 @@
+"""
+Hardness-calibrated benchmark corpus generator for Assignment 3: Metro Map Planning
+
+Sweeps density parameters around the SAT/UNSAT phase transition, where
+testcase_gen's random mode produces the interesting instances:
+    K as a fraction of the N*M cells  (--densities)
+    J                                  (--J)
+    P as a fraction of the N*M cells  (--popular)
+For every parameter point it draws --samples random candidates, encodes them,
+solves them with pysat's Minisat22 and keeps the ones whose conflict count
+falls into one of the hardness bands (--bands, in conflicts) until each band
+holds --per-band instances. Candidates that precheck.py already proves UNSAT
+are skipped: the pipeline never solves those. Each kept city is labeled
+SAT/UNSAT with its conflict count in a JSON manifest.
+
+Hardness is measured in conflicts rather than seconds so that the selection
+does not depend on the machine or its load: candidates are seeded from
+(--seed, parameter point, sample), the encoding and the solver are
+deterministic, and the search stops at the top of the last band, so the same
+command regenerates the same corpus anywhere. Runtimes and the machine are
+recorded in the manifest for information only.
+
+Usage:
+    python3 hardness_corpus.py --N 10 --M 10 --densities 0.04,0.06,0.08 --J 1,2,3 \
+        --popular 0,0.03 --samples 10 --bands 100-1000,1000-10000,10000-100000 --per-band 20 \
+        --seed 1 --outdir ./Benchmarks/
+"""
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from encoder import encode_to_sat
+from format_checker import MetroSpec
+from precheck import find_infeasibility
+from sat_solver import count_conflicts
+from testcase_gen import generate_random_instance, instance_seed, write_city_file
+
+
+def parse_floats(text):
+    return [float(v) for v in text.split(',') if v]
+
+
+def parse_ints(text):
+    return [int(v) for v in text.split(',') if v]
+
+
+def parse_bands(text):
+    """'100-1000,1000-10000' -> [(100, 1000), (1000, 10000)]"""
+    bands = []
+    for part in text.split(','):
+        low, high = part.split('-')
+        bands.append((int(low), int(high)))
+    return bands
+
+
+def spec_from_instance(N, M, K, J, P, instance):
+    lines = instance['metro_lines']
+    return MetroSpec(scenario=2 if P > 0 else 1, N=N, M=M, K=K, J=J, P=P,
+                     starts=[line['start'] for line in lines],
+                     ends=[line['end'] for line in lines],
+                     popular=list(instance['popular_cells']))
+
+
+def measure(spec, budget):
+    """
+    Encodes and solves `spec`; returns (status, conflicts, seconds, num_vars,
+    num_clauses). status is 'TIMEOUT' once `budget` conflicts are spent.
+    """
+    # The encoder reports progress on stdout; keep the sweep output readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        num_vars, clauses = encode_to_sat(spec)
+    status, conflicts, seconds = count_conflicts(num_vars, clauses, budget)
+    return status, conflicts, seconds, num_vars, len(clauses)
+
+
+def band_of(conflicts, bands):
+    for i, (low, high) in enumerate(bands):
+        if low <= conflicts < high:
+            return i
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a hardness-calibrated benchmark corpus with a manifest.",
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--N", type=parse_ints, required=True, help="Grid widths, e.g. 10,15.")
+    parser.add_argument("--M", type=parse_ints, required=True, help="Grid heights, e.g. 10,15.")
+    parser.add_argument("--densities", type=parse_floats, required=True,
+                        help="K as a fraction of N*M, e.g. 0.04,0.06.")
+    parser.add_argument("--J", type=parse_ints, required=True, help="Turn limits, e.g. 1,2,3.")
+    parser.add_argument("--popular", type=parse_floats, default=[0.0],
+                        help="P as a fraction of N*M (0 = scenario 1).")
+    parser.add_argument("--samples", type=int, default=10, help="Candidates per parameter point.")
+    parser.add_argument("--bands", type=parse_bands,
+                        default=parse_bands("100-1000,1000-10000,10000-100000"),
+                        help="Hardness bands in solver conflicts, e.g. 100-1000,1000-10000.")
+    parser.add_argument("--per-band", type=int, default=20, help="Instances to keep per band.")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed.")
+    parser.add_argument("--outdir", default="./Benchmarks/", help="Output directory.")
+    parser.add_argument("--manifest", help="Manifest path (default: <outdir>/manifest.json).")
+    args = parser.parse_args()
+
+    bands = args.bands
+    budget = max(high for _, high in bands)
+    manifest_path = args.manifest or os.path.join(args.outdir, "manifest.json")
+    os.makedirs(args.outdir, exist_ok=True)
+
+    kept = [[] for _ in bands]
+    points = list(itertools.product(args.N, args.M, args.densities, args.J, args.popular))
+    for point_index, (N, M, density, J, popular) in enumerate(points):
+        if all(len(band) >= args.per_band for band in kept):
+            break
+        K = max(1, round(density * N * M))
+        P = round(popular * N * M)
+        if 2 * K + P > N * M:
+            continue
+        for sample in range(args.samples):
+            seed = instance_seed(args.seed, f"{point_index}:{sample}")
+            instance = generate_random_instance(N, M, K, J, P, random.Random(seed))
+            spec = spec_from_instance(N, M, K, J, P, instance)
+            if find_infeasibility(spec) is not None:
+                continue
+            try:
+                status, conflicts, seconds, num_vars, num_clauses = measure(spec, budget)
+            except RuntimeError as e:
+                print("Error:", e, file=sys.stderr)
+                sys.exit(1)
+            band = None if status == 'TIMEOUT' else band_of(conflicts, bands)
+            print(f"[Corpus] N={N} M={M} K={K} J={J} P={P} #{sample}: {status} after "
+                  f"{conflicts} conflicts ({seconds:.3f}s)" + ("" if band is None else f" -> band {band}"))
+            if band is None or len(kept[band]) >= args.per_band:
+                continue
+            name = f"{N}_{M}_{K}_{J}_{P}_s{seed % 10**8:08d}.city"
+            path = os.path.join(args.outdir, f"band{band}", name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                write_city_file(path, N, M, K, J, P, instance['metro_lines'], instance['popular_cells'])
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            except OSError as e:
+                print(f"Error writing to file '{path}': {e}", file=sys.stderr)
+                sys.exit(1)
+            kept[band].append({
+                'file': os.path.relpath(path, os.path.dirname(manifest_path) or '.'),
+                'sha256': digest, 'N': N, 'M': M, 'K': K, 'J': J, 'P': P, 'seed': seed,
+                'band': band, 'label': status, 'conflicts': conflicts, 'runtime': round(seconds, 6),
+                'variables': num_vars, 'clauses': num_clauses,
+            })
+
+    manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'solver': 'pysat Minisat22',
+        # Runtimes are only comparable on this machine; the selection used conflicts
+        'machine': {'platform': platform.platform(), 'processor': platform.processor(),
+                    'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'settings': {
+            'N': args.N, 'M': args.M, 'densities': args.densities, 'J': args.J,
+            'popular': args.popular, 'samples': args.samples, 'bands': bands,
+            'per_band': args.per_band, 'budget': budget, 'seed': args.seed,
+        },
+        'instances': [entry for band in kept for entry in band],
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+    for i, (low, high) in enumerate(bands):
+        labels = [entry['label'] for entry in kept[i]]
+        print(f"[Corpus] band {i} [{low}, {high}) conflicts: {len(labels)} instances "
+              f"({labels.count('SAT')} SAT, {labels.count('UNSAT')} UNSAT)")
+    print(f"[Corpus] Wrote manifest {manifest_path}")
+    if any(len(band) < args.per_band for band in kept):
+        print("[Corpus] Warning: some bands are not full; widen the sweep or add samples",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Lazy constraint generation for Assignment 3: Metro Map Planning
+
+Most overlap and popular-cell clauses are never violated by the solver's
+first answer, yet they are the bulk of a full encoding (the overlap section
+alone has N*M*(4K choose 2) clauses). The lazy mode
+
+ 1) encodes everything except the overlap and popular-cell sections (every
+    per-line constraint, plus the cheap foreign-end clauses),
+ 2) solves it with an incremental pysat solver, decodes the model and checks
+    it with format_checker.analyze_constraints,
+ 3) adds the overlap clauses of every cell two lines share and the coverage
+    clauses (encoder.popular_clauses) of every popular cell nobody visits,
+ 4) re-solves on the same solver (learnt clauses are kept) until the map is
+    valid or the formula is UNSAT.
+
+A popular cell whose coverage clauses are already in can still be "covered"
+by directions that are not connected to their line (the encoding has no
+reachability constraint). Following them from the cell ends in a cycle,
+possibly after a chain that comes through another line's start (the one
+place where nothing limits how many neighbours point into a cell). The cycle
+is blocked with a clause saying not all of its directions are taken, and the
+overlap clauses of every foreign start on the way are added. A walk that
+ends without a cycle has run into its line's own path at a cell next to the
+line's start or end, where continuity_clauses skips the in-degree limit; that
+limit is added for the cell. A model whose own path runs from the line's
+start into a loop (it rejoins itself where the in-degree limit is skipped)
+cannot even be decoded; the loop is blocked the same way, with the in-degree
+limit at the cell where it rejoins, and the formula is solved again. A
+simple path never takes all of a cycle's directions and never enters a cell
+twice, so no solution is lost.
+
+Usage:
+    python3 lazy_solver.py <basename> [--timeout SECONDS] [--max-rounds 1000]
+                           [--write metromap|none]
+
+Exit codes:
+ - 0 : a valid metromap was found, or the city is UNSAT.
+ - 1 : parse error, decode error or the refinement stalled.
+ - 2 : the solver timed out or --max-rounds was reached.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from city_parser import parse_city
+from decoder import DIR_STEP, DIRECTIONS, decode_solution, write_metromap
+from encoder import (CLAUSE_SECTIONS, at_most_one, direction_variables, metro_rail_direction,
+                     overlap_clauses, popular_clauses, turn_clauses)
+from format_checker import analyze_constraints
+from pipeline import PipelineResult, timed
+from precheck import find_infeasibility
+from sat_solver import clause_lists
+
+# Sections left out of the first encoding and added per cell on demand
+LAZY_SECTIONS = ('overlap',)
+
+
+@contextlib.contextmanager
+def quietly():
+    """Silences the encoder sections' progress output."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def encode_eager(spec):
+    """The encoding without the lazy sections; returns (var_id, next free id, clauses)."""
+    clauses = set()
+    with quietly():
+        var_id, var_id_counter = direction_variables(spec)
+        var_id_counter = turn_clauses(spec, var_id, var_id_counter, clauses)
+        for name, section in CLAUSE_SECTIONS:
+            if name not in LAZY_SECTIONS:
+                section(spec, var_id, clauses)
+    return var_id, var_id_counter, clauses
+
+
+def model_directions(spec, model):
+    """{(k, x, y): direction index} for every true direction variable."""
+    cells = spec.N * spec.M
+    directions = {}
+    for v in model:
+        if 0 < v <= spec.K * cells * 4:
+            k, rest = divmod(v - 1, cells * 4)
+            cell, d = divmod(rest, 4)
+            directions[(k, *divmod(cell, spec.M))] = d
+    return directions
+
+
+def path_cells(spec, moves, k):
+    """The cells of line k's decoded path."""
+    x, y = spec.starts[k]
+    cells = {(x, y)}
+    for move in moves[k]:
+        dx, dy = DIR_STEP[DIRECTIONS.index(move)]
+        x, y = x + dx, y + dy
+        cells.add((x, y))
+    return cells
+
+
+def detached_walk(directions, k, cell):
+    """
+    The cells visited by following line k's directions from `cell`, and the
+    index of the first cell the walk reaches twice (None if it stops first).
+    """
+    walk = []
+    seen = {}
+    x, y = cell
+    while (k, x, y) in directions:
+        if (x, y) in seen:
+            return walk, seen[(x, y)]
+        seen[(x, y)] = len(walk)
+        walk.append((x, y))
+        dx, dy = DIR_STEP[directions[(k, x, y)]]
+        x, y = x + dx, y + dy
+    return walk, None
+
+
+def merge_clauses(spec, var_id, k, cell):
+    """At most one of line k's neighbours of `cell` points into it."""
+    x, y = cell
+    into = []
+    for d, (dx, dy) in enumerate(DIR_STEP):
+        nx, ny = x - dx, y - dy
+        if 0 <= nx < spec.N and 0 <= ny < spec.M:
+            into.append(var_id[(k, nx, ny, metro_rail_direction[d])])
+    return at_most_one(into)
+
+
+def cycle_clause(var_id, directions, k, cycle):
+    """Clause saying not every one of line k's directions around `cycle` is taken."""
+    return tuple(-var_id[(k, x, y, metro_rail_direction[directions[(k, x, y)]])]
+                 for (x, y) in cycle)
+
+
+class Refinement:
+    """
+    Clauses ruling out the directions the encoding lets through for lack of a
+    reachability constraint, and the cells already handled. Used by solve_lazy
+    and by the eager path of pipeline.run_pipeline, which encodes every
+    overlap clause up front (overlaps_encoded).
+    """
+
+    def __init__(self, spec, var_id, overlaps_encoded=False):
+        self.spec = spec
+        self.var_id = var_id
+        self.overlaps_encoded = overlaps_encoded
+        self.starts = {cell: k for k, cell in enumerate(spec.starts)}
+        self.overlap_cells = set()
+        self.merge_cells = set()
+        self.cycles = 0
+
+    def _merge(self, k, cell, new):
+        if (k, cell) not in self.merge_cells:
+            new |= merge_clauses(self.spec, self.var_id, k, cell)
+            self.merge_cells.add((k, cell))
+
+    def loops(self, directions):
+        """Blocks every line whose path from its start runs into a loop (the map cannot be decoded)."""
+        new = set()
+        for k in range(self.spec.K):
+            walk, loop = detached_walk(directions, k, self.spec.starts[k])
+            if loop is None:
+                continue
+            new.add(cycle_clause(self.var_id, directions, k, walk[loop:]))
+            self.cycles += 1
+            self._merge(k, walk[loop], new)
+        return new
+
+    def detached(self, directions, moves, cells):
+        """Rules out the directions at `cells` that are not connected to their line."""
+        new = set()
+        for cell in cells:
+            for k in range(self.spec.K):
+                walk, loop = detached_walk(directions, k, cell)
+                if not self.overlaps_encoded:
+                    # The in-degree limit is not encoded at start cells, so a
+                    # detached walk can come through another line's start;
+                    # the overlap clauses there rule that out
+                    touched = [c for c in walk if c in self.starts and self.starts[c] != k
+                               and c not in self.overlap_cells]
+                    with quietly():
+                        overlap_clauses(self.spec, self.var_id, new, touched)
+                    self.overlap_cells.update(touched)
+                if loop is not None:
+                    new.add(cycle_clause(self.var_id, directions, k, walk[loop:]))
+                    self.cycles += 1
+                elif walk:
+                    # The walk ran into line k's own path, at a cell whose
+                    # in-degree limit was skipped (next to its start or end)
+                    on_path = path_cells(self.spec, moves, k)
+                    merge = next((c for c in walk if c in on_path), None)
+                    if merge is not None:
+                        self._merge(k, merge, new)
+        return new
+
+
+def solve_lazy(spec, timeout=None, max_rounds=1000, timings=None):
+    """
+    Solves `spec` with lazily added overlap and coverage clauses and returns
+    a PipelineResult; num_clauses counts the clauses the solver ended up with.
+    """
+    try:
+        from pysat.solvers import Minisat22
+    except ImportError:
+        raise RuntimeError("the lazy mode needs python-sat: pip install python-sat")
+
+    timings = {} if timings is None else timings
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    with timed(timings, 'precheck'):
+        reason = find_infeasibility(spec)
+    if reason is not None:
+        return PipelineResult('UNSAT', None, None, None, timings, "precheck: " + reason)
+    with timed(timings, 'encode'):
+        var_id, var_id_counter, clauses = encode_eager(spec)
+    num_clauses = len(clauses)
+
+    refinement = Refinement(spec, var_id)
+    overlap_cells = refinement.overlap_cells
+    popular_cells = set()
+
+    def summary(rounds):
+        return "lazy: %d round(s), %d overlap cell(s), %d popular cell(s), %d cycle(s), %d merge(s)" % (
+            rounds, len(overlap_cells), len(popular_cells), refinement.cycles,
+            len(refinement.merge_cells))
+
+    with Minisat22(bootstrap_with=clause_lists(clauses)) as solver:
+        del clauses
+        for rounds in range(1, max_rounds + 1):
+            with timed(timings, 'solve'):
+                if deadline is None:
+                    sat = solver.solve()
+                else:
+                    timer = threading.Timer(max(deadline - time.perf_counter(), 0), solver.interrupt)
+                    timer.start()
+                    try:
+                        sat = solver.solve_limited(expect_interrupt=True)
+                    finally:
+                        timer.cancel()
+            num_vars = max(var_id_counter - 1, solver.nof_vars())
+            if sat is None:
+                return PipelineResult('TIMEOUT', None, num_vars, num_clauses, timings,
+                                      "solver timed out after %gs, %s" % (timeout, summary(rounds)))
+            if not sat:
+                return PipelineResult('UNSAT', None, num_vars, num_clauses, timings, summary(rounds))
+
+            model = solver.get_model()
+            with timed(timings, 'decode'):
+                try:
+                    moves = decode_solution(spec, [v for v in model if v > 0])
+                except ValueError as e:
+                    moves, error = None, e
+            if moves is None:
+                with timed(timings, 'refine'):
+                    new = refinement.loops(model_directions(spec, model))
+                if not new:
+                    return PipelineResult('ERROR', None, num_vars, num_clauses, timings,
+                                          "decode: %s" % error)
+                for clause in new:
+                    solver.add_clause(list(clause))
+                num_clauses += len(new)
+                continue
+            with timed(timings, 'check'):
+                report = analyze_constraints(spec, moves)
+            if report['final_valid']:
+                return PipelineResult('VALID', moves, num_vars, num_clauses, timings, summary(rounds))
+
+            with timed(timings, 'refine'), quietly():
+                new = set()
+                conflicts = [cell for cell in report['c1']['details'] or {} if cell not in overlap_cells]
+                overlap_clauses(spec, var_id, new, conflicts)
+                overlap_cells.update(conflicts)
+                missed = [cell for cell, visited, _ in report['c4']['per_popular'] if not visited]
+                fresh = [cell for cell in missed if cell not in popular_cells]
+                var_id_counter = popular_clauses(spec, var_id, var_id_counter, new, fresh)
+                popular_cells.update(fresh)
+                new |= refinement.detached(model_directions(spec, model), moves,
+                                           [cell for cell in missed if cell not in fresh])
+                if not new:
+                    return PipelineResult('ERROR', moves, num_vars, num_clauses, timings,
+                                          "refinement stalled, " + summary(rounds))
+                for clause in new:
+                    solver.add_clause(list(clause))
+                num_clauses += len(new)
+
+    return PipelineResult('TIMEOUT', None, num_vars, num_clauses, timings,
+                          "no valid map after %d rounds, %s" % (max_rounds, summary(max_rounds)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a city with lazily added overlap and coverage clauses.")
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--timeout", type=float, help="Total solver time in seconds.")
+    parser.add_argument("--max-rounds", type=int, default=1000, help="Solve/refine rounds before giving up.")
+    parser.add_argument("--write", choices=["metromap", "none"], default="metromap",
+                        help="Write <basename>.metromap (default) or nothing.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+
+    timings = {}
+    try:
+        with timed(timings, 'parse'):
+            spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        result = solve_lazy(spec, args.timeout, args.max_rounds, timings)
+    except (RuntimeError, ValueError) as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(1)
+    if args.write == "metromap" and result.status in ('VALID', 'UNSAT'):
+        with timed(timings, 'write'):
+            write_metromap(base + ".metromap", "UNSAT" if result.status == 'UNSAT' else result.moves)
+
+    size = ""
+    if result.num_vars is not None:
+        size = f" (variables: {result.num_vars}, clauses: {result.num_clauses})"
+    print(f"[Lazy] {base}: {result.status} - {result.detail}{size}")
+    for stage, seconds in result.timings.items():
+        print(f"[Lazy]   {stage:<9} {seconds:8.3f}s")
+    print(f"[Lazy]   {'total':<9} {sum(result.timings.values()):8.3f}s")
+    sys.exit({'VALID': 0, 'UNSAT': 0, 'TIMEOUT': 2}.get(result.status, 1))
+
+
+if __name__ == "__main__":
+    main()
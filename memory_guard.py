@@ -0,0 +1,217 @@
+"""
+Memory guard for the encoder (Assignment 3: Metro Map Planning)
+
+encode_to_sat keeps every clause in a Python set and every variable id in a
+dict keyed by (k, x, y, d) tuples; both cost well over 100 bytes per entry, so
+big cities used to get the process OOM-killed. encoder.encode_with_memory_guard
+uses the helpers here to
+ - project the footprint of a city before and during encoding
+   (estimate_bytes up front, then the memory traced so far plus
+   CLAUSE_BYTES for every clause estimate_clauses says is still to come),
+ - switch to a low-memory representation when the projection exceeds the
+   ceiling: VarMap computes variable ids arithmetically instead of storing
+   them, and DiskClauseSink streams clauses to a temporary DIMACS body,
+ - report the time, peak traced memory (tracemalloc) and RSS of every phase.
+
+The disk sink does not deduplicate clauses, so a spilled encoding can count
+a few more (duplicate) clauses than the in-memory one; the formula is the same.
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DIRECTION_INDEX = {"L": 0, "R": 1, "U": 2, "D": 3}
+
+# Measured on CPython 3.11 with tracemalloc: a clause tuple with its literals
+# and set slot, and a var_id entry with its key tuple
+CLAUSE_BYTES = 170
+VAR_ID_BYTES = 135
+
+MB = 1024 * 1024
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is missing)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB, None without `resource`."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / MB if sys.platform == 'darwin' else rss / 1024
+
+
+def estimate_clauses(spec):
+    """Upper estimate of the number of clauses encode_to_sat produces."""
+    K, J, P = spec.K, spec.J, spec.P
+    cells = spec.N * spec.M
+    lits = 4 * K
+    total = K * cells * (2 * J + 3)          # turns (sequential counter)
+    total += 6 * K * cells                   # one direction per cell
+    total += 20 * K * cells                  # continuity
+    total += cells * lits * (lits - 1) // 2  # overlap
+    total += 4 * K * K + 10 * K              # endpoints, start/end neighbours
+    if spec.scenario == 2:
+        total += P * (lits + 2)              # popular cells (occupancy variable + coverage)
+    return total
+
+
+def estimate_bytes(spec):
+    """Projected in-memory footprint of encode_to_sat in bytes."""
+    variables = spec.K * spec.N * spec.M * 5 + spec.P  # direction + turn + occupancy variables
+    return estimate_clauses(spec) * CLAUSE_BYTES + variables * VAR_ID_BYTES
+
+
+class VarMap:
+    """
+    Drop-in replacement for the encoder's var_id dict that stores nothing per
+    variable: direction ids are k*N*M*4 + (x*M + y)*4 + d + 1 and turn ids are
+    the first turn id of line k plus x*M + y (turn_clauses assigns them in that
+    order, which is checked when they are set).
+    """
+
+    def __init__(self, spec):
+        self.M = spec.M
+        self.cells = spec.N * spec.M
+        self.turn_base = {}
+
+    def __getitem__(self, key):
+        if len(key) == 4:
+            k, x, y, d = key
+            return k * self.cells * 4 + (x * self.M + y) * 4 + DIRECTION_INDEX[d] + 1
+        k, x, y = key
+        return self.turn_base[k] + x * self.M + y
+
+    def __setitem__(self, key, value):
+        if len(key) == 4:
+            if self[key] != value:
+                raise ValueError("direction variable %r out of order" % (key,))
+            return
+        k, x, y = key
+        base = self.turn_base.setdefault(k, value - (x * self.M + y))
+        if base + x * self.M + y != value:
+            raise ValueError("turn variable %r out of order" % (key,))
+
+    @classmethod
+    def from_dict(cls, spec, var_id):
+        var_map = cls(spec)
+        for k in range(spec.K):
+            if (k, 0, 0) in var_id:
+                var_map.turn_base[k] = var_id[(k, 0, 0)]
+        return var_map
+
+
+class DiskClauseSink:
+    """
+    Set-like clause store backed by a temporary file of DIMACS clause lines.
+    Supports what the encoder sections and write_cnf use: add, |=, len and
+    iteration (which re-reads the file). Call close() to delete the file.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix='clauses_', suffix='.cnf', dir=directory)
+        self._file = os.fdopen(fd, 'w')
+        self._count = 0
+
+    def add(self, clause):
+        if isinstance(clause, int):
+            self._file.write("%d 0\n" % clause)
+        else:
+            self._file.write(" ".join(map(str, clause)) + " 0\n")
+        self._count += 1
+
+    def update(self, clauses):
+        for clause in clauses:
+            self.add(clause)
+
+    def __ior__(self, clauses):
+        self.update(clauses)
+        return self
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.flush()
+        with open(self.path) as f:
+            for line in f:
+                yield tuple(map(int, line.split()[:-1]))
+
+    def copy_to(self, out):
+        """Appends the clause lines to an open text file."""
+        self._file.flush()
+        with open(self.path) as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    def __del__(self):
+        self.close()
+
+
+class PhaseTracker:
+    """
+    Records seconds, peak traced MB and RSS MB for each named phase, and the
+    clause count after it when the phase is given a `clauses` callable.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name, clauses=None):
+        # Phases after stop() (e.g. writing the CNF) trace only themselves
+        restart = not tracemalloc.is_tracing()
+        if restart:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            if restart:
+                tracemalloc.stop()
+            self.phases.append({'phase': name, 'seconds': time.perf_counter() - start,
+                                'current_mb': current / MB, 'peak_mb': peak / MB,
+                                'rss_mb': rss_mb(), 'clauses': clauses() if clauses else None})
+
+    def current_bytes(self):
+        return tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        if self._started and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def print_report(self, out=sys.stdout):
+        print_phases(self.phases, out)
+
+
+def print_phases(phases, out=sys.stdout):
+    for p in phases:
+        rss = "-" if p['rss_mb'] is None else "%.1f" % p['rss_mb']
+        out.write("[Memory] %-16s %8.3fs  peak %8.1f MB  now %8.1f MB  rss %s MB\n"
+                  % (p['phase'], p['seconds'], p['peak_mb'], p['current_mb'], rss))
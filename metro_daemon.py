@@ -0,0 +1,273 @@
+"""
+Local solving daemon for Assignment 3: Metro Map Planning
+
+Serves the pipeline (pipeline.run_pipeline) over localhost HTTP so a request
+does not pay for interpreter start-up and imports. A pool of worker processes
+is started once, with the encoder, decoder, checker, router and SAT backend
+already imported, and every request is handed to a warm worker.
+
+    POST /solve[?timeout=S&backend=auto|minisat|pysat&route=0|1]
+        body: the contents of a .city file
+        200: {"status", "detail", "variables", "clauses", "metromap", "timings"}
+             status is VALID, INVALID, UNSAT, TIMEOUT or ERROR; metromap is the
+             .metromap text (null for TIMEOUT/ERROR); timings has one entry per
+             stage plus 'queue' (waiting for a worker) and 'total'
+        400: the city does not parse, timeout is not a positive number, the
+             backend is unknown or Content-Length is malformed
+        413: body over --max-bytes
+        503: the queue is full (retry after Retry-After seconds) or the
+             daemon is shutting down
+    GET /health
+        200: {"workers", "pending", "capacity", "served", "uptime"}
+
+At most --workers + --queue-size requests are accepted at a time; further
+requests get 503 right away instead of piling up. On SIGTERM or SIGINT the
+daemon stops accepting connections, finishes the requests it already has and
+then stops the workers. Requests may lower the per-instance timeout but not
+raise it above --timeout.
+
+Usage:
+    python3 metro_daemon.py [--host 127.0.0.1] [--port 8765] [--workers 4]
+                            [--queue-size 16] [--timeout 60] [--backend auto]
+                            [--no-route] [--max-bytes 16777216]
+    curl --data-binary @Assets/1_1/3_3_1.city 'http://127.0.0.1:8765/solve?timeout=10'
+
+Exit codes:
+ - 0 : clean shutdown.
+ - 1 : the address could not be bound.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from batch_runner import InstanceTimeout, instance_alarm
+from city_parser import parse_city_text
+from decoder import format_metromap
+from pipeline import run_pipeline, timed
+from sat_solver import resolve_backend
+
+DEFAULT_PORT = 8765
+
+
+def warm_up(backend):
+    """Pool initializer: imports the lazily loaded stages so the first request is not slower."""
+    # Ctrl-C (and a service manager's SIGTERM) may reach the whole process group;
+    # only the daemon decides when workers stop, after the pending requests
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    import router  # noqa: F401
+    if resolve_backend(backend) == 'pysat':
+        import pysat.solvers  # noqa: F401
+
+
+def solve_spec(task):
+    """Worker side of /solve: runs the pipeline on a parsed spec; never raises."""
+    spec, backend, timeout, route = task
+    start = time.perf_counter()
+    timings = {}
+    response = {'status': None, 'detail': None, 'variables': None, 'clauses': None,
+                'metromap': None}
+    try:
+        with instance_alarm(timeout):
+            result = run_pipeline(spec, backend=backend, timeout=timeout, route=route,
+                                  timings=timings)
+        response.update(status=result.status, detail=result.detail,
+                        variables=result.num_vars, clauses=result.num_clauses)
+        if result.status == 'UNSAT':
+            response['metromap'] = format_metromap("UNSAT")
+        elif result.moves is not None:
+            response['metromap'] = format_metromap(result.moves)
+    except InstanceTimeout:
+        response.update(status='TIMEOUT', detail="instance timed out after %gs" % timeout)
+    except Exception as e:
+        response.update(status='ERROR', detail=str(e))
+    response['timings'] = timings
+    return response, time.perf_counter() - start
+
+
+class SolveServer(ThreadingHTTPServer):
+    """HTTP server owning the worker pool and the admission limit."""
+
+    # server_close() waits for the request threads, which is what drains the queue
+    block_on_close = True
+
+    def __init__(self, address, workers, queue_size, timeout, backend, route, max_bytes):
+        super().__init__(address, SolveHandler)
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.backend = backend
+        self.route = route
+        self.max_bytes = max_bytes
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_up,
+                                        initargs=(backend,))
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.served = 0
+        self.started = time.time()
+        self.stopping = False
+
+    def admit(self):
+        if self.stopping or not self.slots.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.pending += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+            self.served += 1
+        self.slots.release()
+
+    def stop(self):
+        """Stops accepting requests; callable from a signal handler."""
+        if not self.stopping:
+            self.stopping = True
+            # shutdown() waits for serve_forever(), so it cannot run on its thread
+            threading.Thread(target=self.shutdown).start()
+
+
+class SolveHandler(BaseHTTPRequestHandler):
+    server_version = "MetroDaemon/1.0"
+
+    def send_json(self, code, body, headers=()):
+        data = (json.dumps(body) + '\n').encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        print("[Daemon] %s %s" % (self.address_string(), fmt % args), file=sys.stderr)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/health':
+            self.send_json(404, {'error': "unknown path %r" % self.path})
+            return
+        server = self.server
+        self.send_json(200, {'workers': server.workers, 'pending': server.pending,
+                             'capacity': server.capacity, 'served': server.served,
+                             'uptime': round(time.time() - server.started, 3)})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/solve':
+            self.send_json(404, {'error': "unknown path %r" % self.path})
+            return
+        server = self.server
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            # The body cannot be told apart from the next request
+            self.send_json(400, {'error': "bad Content-Length %r" % self.headers.get('Content-Length')})
+            self.close_connection = True
+            return
+        if length > server.max_bytes:
+            self.send_json(413, {'error': "city payload over %d bytes" % server.max_bytes})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+        if not server.admit():
+            reason = "shutting down" if server.stopping else "queue full"
+            self.send_json(503, {'error': reason}, [('Retry-After', '1')])
+            return
+        try:
+            self.solve(url, body)
+        finally:
+            server.release()
+
+    def solve(self, url, body):
+        server = self.server
+        start = time.perf_counter()
+        try:
+            query = parse_qs(url.query)
+            timeout = server.timeout
+            if 'timeout' in query:
+                asked = float(query['timeout'][0])
+                if not asked > 0 or asked == float('inf'):
+                    raise ValueError("timeout must be a positive number of seconds, got %r"
+                                     % query['timeout'][0])
+                timeout = asked if timeout is None else min(asked, timeout)
+            backend = resolve_backend(query.get('backend', [server.backend])[0])
+            route = query.get('route', ['1' if server.route else '0'])[0] not in ('0', 'false', 'no')
+            timings = {}
+            with timed(timings, 'parse'):
+                spec = parse_city_text(body.decode())
+        except (ValueError, UnicodeDecodeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+
+        try:
+            response, worker_seconds = server.pool.submit(
+                solve_spec, (spec, backend, timeout, route)).result()
+        except BrokenProcessPool as e:
+            self.send_json(500, {'error': "worker died: %s" % e})
+            return
+        total = time.perf_counter() - start
+        timings['queue'] = max(0.0, total - timings['parse'] - worker_seconds)
+        timings.update(response['timings'])
+        timings['total'] = total
+        response['timings'] = {stage: round(seconds, 6) for stage, seconds in timings.items()}
+        self.send_json(200, response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the pipeline over localhost HTTP with warm workers.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to bind.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--queue-size", type=int, default=16,
+                        help="Requests that may wait for a worker before new ones get 503.")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Wall-clock seconds per instance, also the cap for ?timeout= (0 = no limit).")
+    parser.add_argument("--backend", default="auto", help="minisat, pysat or auto.")
+    parser.add_argument("--no-route", dest="route", action="store_false",
+                        help="Skip the heuristic router unless a request asks for it.")
+    parser.add_argument("--max-bytes", type=int, default=16 * 1024 * 1024,
+                        help="Largest accepted city payload.")
+    args = parser.parse_args()
+
+    try:
+        server = SolveServer((args.host, args.port), args.workers, args.queue_size,
+                             args.timeout or None, args.backend, args.route, args.max_bytes)
+    except OSError as e:
+        print("Cannot listen on %s:%d: %s" % (args.host, args.port, e), file=sys.stderr)
+        sys.exit(1)
+
+    def on_signal(signum, frame):
+        print("[Daemon] %s: finishing %d pending request(s)" % (
+            signal.Signals(signum).name, server.pending), file=sys.stderr)
+        server.stop()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    # Start the workers now rather than on the first request
+    for future in [server.pool.submit(time.sleep, 0) for _ in range(args.workers)]:
+        future.result()
+    print("[Daemon] Listening on http://%s:%d with %d worker(s), capacity %d" % (
+        args.host, server.server_address[1], args.workers, server.capacity), file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.pool.shutdown(wait=True)
+    print("[Daemon] Stopped after %d request(s)" % server.served, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
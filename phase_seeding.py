@@ -0,0 +1,85 @@
+"""
+Heuristic phase seeding for Assignment 3: Metro Map Planning
+
+A CDCL solver branches on the saved phase of a variable, which starts out
+false for every variable, so its first assignments describe an empty map and
+the early search is spent far from anything routable. Seeding gives it a
+sensible starting point instead:
+
+ - every line gets a shortest path within its turn limit (routing.find_path)
+   that avoids the other lines' endpoints and, when it can, the cells of the
+   lines seeded before it,
+ - the direction variable of every move on those paths, the turn variable
+   of every cell where one of them changes direction and the at_most_J_turns
+   counter bits those turns set get a true phase. Seeding directions alone
+   is not enough: the solver then decides a turn or counter variable false
+   at a seeded corner and is in conflict straight away.
+
+Phases are only hints: the solver is free to flip them, so a bad seed costs
+some search but never changes the answer. Only in-process solvers take phase
+hints (the pysat backend); the minisat binary has no way to receive them.
+"""
+from encoder import counter_literals, metro_rail_direction
+from routing import HEADINGS, find_path
+
+
+def seed_paths(spec, attempts=None):
+    """
+    One path ((x, y) cells) per line, or None where a line has no path within
+    its turns. Lines are routed one after the other around the earlier ones;
+    a line that finds no way around them is moved to the front and the seeding
+    is retried, up to `attempts` (default K) times. After that the lines still
+    blocked get paths that cross the others.
+    """
+    N, M, J = spec.N, spec.M, spec.J
+    endpoints = bytearray(N * M)
+    for (x, y) in spec.starts + spec.ends:
+        endpoints[x * M + y] = 1
+    attempts = spec.K if attempts is None else attempts
+    order = list(range(spec.K))
+    for _ in range(max(attempts, 1)):
+        taken = bytearray(endpoints)
+        paths = [None] * spec.K
+        blocked = []
+        for k in order:
+            path = find_path(N, M, J, taken, spec.starts[k], spec.ends[k])
+            if path is None:
+                blocked.append(k)
+                continue
+            for (x, y) in path:
+                taken[x * M + y] = 1
+            paths[k] = path
+        if not blocked:
+            return paths
+        order = blocked + [k for k in order if k not in blocked]
+    for k in blocked:
+        # Crossing the other seeds is better than no hint at all
+        paths[k] = find_path(N, M, J, endpoints, spec.starts[k], spec.ends[k])
+    return paths
+
+
+def seed_phases(spec, var_id):
+    """
+    Literals to pass to the solver as preferred phases (all positive): the
+    direction of every move on the seed paths, a turn wherever the direction
+    changes and the at_most_J_turns counter bits those turns set. `var_id`
+    is the variable map the encoder returned (encode_to_sat(...,
+    return_var_id=True)). Everything else keeps the solver's default (false).
+    """
+    phases = []
+    for k, path in enumerate(seed_paths(spec)):
+        if path is None:
+            continue
+        turns = set()
+        previous = None
+        for (x1, y1), (x2, y2) in zip(path, path[1:]):
+            d = HEADINGS.index((x2 - x1, y2 - y1))
+            phases.append(var_id[(k, x1, y1, metro_rail_direction[d])])
+            if previous is not None and d != previous:
+                turns.add(var_id[(k, x1, y1)])
+            previous = d
+        # in the order encoder.turn_clauses hands them to at_most_J_turns
+        turn_vars = [var_id[(k, x, y)] for x in range(spec.N) for y in range(spec.M)]
+        phases.extend(turns)
+        phases.extend(counter_literals(turn_vars, spec.J, turns))
+    return phases
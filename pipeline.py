@@ -0,0 +1,301 @@
+"""
+Single-process pipeline driver for Assignment 3: Metro Map Planning
+
+Does what run.sh does (encoder.py, minisat, decoder.py, format_checker.py,
+visualize3.py) in one interpreter: the city is parsed once and the spec, CNF
+and model stay in memory between the stages
+
+    parse -> precheck -> route -> encode -> solve -> decode -> check
+
+As in run.sh the heuristic router goes first and only cities it cannot route
+are encoded (--no-route always takes the SAT path). A model the encoding
+accepts but whose map cannot be decoded or misses a popular cell (a detached
+cycle, see encoder.popular_clauses) is blocked and the CNF re-solved.
+
+Only the artifacts listed in --write go to disk (default: the metromap);
+per-stage timings are printed at the end. --seed-phases starts the pysat
+solver from quick turn-limited paths (phase_seeding.py).
+
+Usage:
+    python3 pipeline.py <basename> [--write satinput,satoutput,metromap,png]
+                        [--backend auto|minisat|pysat] [--timeout SECONDS]
+                        [--no-route] [--memory-limit MB] [--fast|--classic]
+                        [--seed-phases]
+
+Exit codes:
+ - 0 : a valid metromap was found, or the city is UNSAT.
+ - 1 : parse error, decode error or an invalid metromap.
+ - 2 : the solver timed out.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+from collections import namedtuple
+
+from decoder import decode_solution, write_metromap
+from encoder import encode_to_sat, encode_with_memory_guard, write_cnf
+from format_checker import analyze_constraints, parse_city
+from memory_guard import DiskClauseSink, VarMap, print_phases
+from precheck import find_infeasibility
+from sat_solver import resolve_backend, solve_cnf, write_minisat_output
+
+ARTIFACTS = ('satinput', 'satoutput', 'metromap', 'png')
+
+# Re-solves after a model the encoding accepts but format_checker does not
+REFINE_ROUNDS = 100
+
+# status is 'VALID', 'INVALID', 'UNSAT', 'TIMEOUT' or 'ERROR'; timings maps stage -> seconds
+# memory holds encode_with_memory_guard's per-phase report when a ceiling was set
+PipelineResult = namedtuple(
+    'PipelineResult', ['status', 'moves', 'num_vars', 'num_clauses', 'timings', 'detail', 'memory'],
+    defaults=(None,))
+
+
+@contextlib.contextmanager
+def timed(timings, stage):
+    """Adds the wall-clock time of the block to timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def encode_quietly(spec, memory_limit_mb=None, return_var_id=False):
+    """
+    encode_to_sat with its progress output on stdout suppressed. With a memory
+    ceiling encode_with_memory_guard is used instead. Returns (num_vars,
+    clauses, per-phase memory report or None), plus the variable map when
+    return_var_id is set.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if memory_limit_mb is None:
+            encoded = encode_to_sat(spec, return_var_id)
+            return encoded[:2] + (None,) + encoded[2:]
+        encoded = encode_with_memory_guard(spec, memory_limit_mb, return_var_id=return_var_id)
+        return encoded[:2] + (encoded[2].phases,) + encoded[3:]
+
+
+def render_png(base_name, spec, assignments, moves, fast=None):
+    """Writes <base_name>_metromap.png from in-memory data, without a window."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from visualize3 import draw_to_axes
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    try:
+        draw_to_axes(base_name, ax1, ax2, spec, assignments, moves, fast)
+        fig.tight_layout()
+        fig.savefig(f"{base_name}_metromap.png")
+    finally:
+        plt.close(fig)
+
+
+def refine(refinement, model, moves, report):
+    """
+    Clauses (from a lazy_solver.Refinement) ruling out what made `model` fail:
+    a line whose path loops (no `moves`), or popular cells covered only by
+    directions detached from their line (see encoder.popular_clauses).
+    """
+    from lazy_solver import model_directions
+    directions = model_directions(refinement.spec, model)
+    if moves is None:
+        return refinement.loops(directions)
+    missed = [cell for cell, visited, _ in report['c4']['per_popular'] if not visited]
+    return refinement.detached(directions, moves, missed)
+
+
+def run_pipeline(spec, base_name=None, write=(), backend='auto', timeout=None,
+                 route=True, fast=None, timings=None, memory_limit_mb=None, seed_phases=False):
+    """
+    Runs every stage after parsing on an in-memory spec and returns a
+    PipelineResult. Artifacts named in `write` are written next to base_name.
+    Pass a dict as `timings` to have earlier stages (e.g. parse) included.
+    memory_limit_mb puts the encoder under encode_with_memory_guard.
+    seed_phases gives the pysat backend preferred phases from quick paths.
+    route tries the heuristic router first, as the command line does.
+    """
+    timings = {} if timings is None else timings
+    write = set(write)
+    if write and base_name is None:
+        raise ValueError("writing artifacts needs a base name")
+    num_vars = num_clauses = None
+    status = detail = report = None
+    moves = None
+    memory = None
+    assignments = []
+
+    with timed(timings, 'precheck'):
+        reason = find_infeasibility(spec)
+    if reason is not None:
+        status, detail = 'UNSAT', "precheck: " + reason
+        with timed(timings, 'write'):
+            if 'satinput' in write:
+                write_cnf(base_name + ".satinput", 1, [(1,), (-1,)])
+            if 'satoutput' in write:
+                write_minisat_output(base_name + ".satoutput", 'UNSAT', [])
+    else:
+        if route:
+            from router import route_all
+            with timed(timings, 'route'):
+                moves = route_all(spec)
+        if moves is not None:
+            detail = "routed without SAT"
+        else:
+            backend = resolve_backend(backend)
+            seed = seed_phases and backend == 'pysat'
+            with timed(timings, 'encode'):
+                encoded = encode_quietly(spec, memory_limit_mb, return_var_id=seed)
+            num_vars, clauses, memory = encoded[:3]
+            num_clauses = len(clauses)
+            rounds = 0
+            error = report = refinement = None
+            try:
+                cnf_path = out_path = None
+                if backend == 'minisat':
+                    # minisat needs the files anyway; keep them if they were asked for
+                    if 'satinput' in write:
+                        cnf_path = base_name + ".satinput"
+                    if 'satoutput' in write:
+                        out_path = base_name + ".satoutput"
+                phases = None
+                if seed:
+                    from phase_seeding import seed_phases as phases_for
+                    with timed(timings, 'seed'):
+                        phases = phases_for(spec, encoded[3])
+                del encoded
+                deadline = None if timeout is None else time.perf_counter() + timeout
+                while True:
+                    budget = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                    with timed(timings, 'solve'):
+                        result = solve_cnf(num_vars, clauses, backend, budget, cnf_path, out_path, phases)
+                    if result.status != 'SAT':
+                        break
+                    with timed(timings, 'decode'):
+                        assignments = [v for v in result.model if v > 0]
+                        try:
+                            moves, error = decode_solution(spec, assignments), None
+                        except ValueError as e:
+                            moves, error = None, e
+                    if moves is not None:
+                        with timed(timings, 'check'):
+                            report = analyze_constraints(spec, moves)
+                        if report['final_valid']:
+                            break
+                    if rounds == REFINE_ROUNDS:
+                        break
+                    with timed(timings, 'refine'):
+                        if refinement is None:
+                            from lazy_solver import Refinement
+                            # Only direction variables are needed, and VarMap computes those
+                            refinement = Refinement(spec, VarMap(spec), overlaps_encoded=True)
+                        new = refine(refinement, result.model, moves, report)
+                    if not new:
+                        break
+                    rounds += 1
+                    clauses |= new
+                    num_clauses = len(clauses)
+                if backend != 'minisat' and 'satinput' in write:
+                    with timed(timings, 'write'):
+                        write_cnf(base_name + ".satinput", num_vars, clauses)
+            finally:
+                # Also when a timeout alarm interrupts the run: the spilled body can be GBs
+                if isinstance(clauses, DiskClauseSink):
+                    clauses.close()
+            del clauses
+            if backend == 'pysat' and 'satoutput' in write and result.status != 'TIMEOUT':
+                with timed(timings, 'write'):
+                    write_minisat_output(base_name + ".satoutput", result.status, result.model)
+
+            if result.status == 'TIMEOUT':
+                return PipelineResult('TIMEOUT', None, num_vars, num_clauses, timings,
+                                      "solver timed out after %.1fs" % result.seconds, memory)
+            if result.status == 'UNSAT':
+                status, detail = 'UNSAT', "solver"
+            elif moves is None:
+                return PipelineResult('ERROR', None, num_vars, num_clauses, timings,
+                                      "decode: %s" % error, memory)
+            if rounds:
+                detail = "solver, %d refinement round(s)" % rounds
+        if moves is not None:
+            if report is None:
+                with timed(timings, 'check'):
+                    report = analyze_constraints(spec, moves)
+            if report['final_valid']:
+                status, detail = 'VALID', detail or "solver"
+            else:
+                status, detail = 'INVALID', "format_checker rejected the map"
+
+    if 'metromap' in write:
+        with timed(timings, 'write'):
+            write_metromap(base_name + ".metromap", "UNSAT" if status == 'UNSAT' else moves)
+    if 'png' in write:
+        with timed(timings, 'render'):
+            render_png(base_name, spec, assignments, moves, fast)
+    return PipelineResult(status, moves, num_vars, num_clauses, timings, detail, memory)
+
+
+def parse_artifacts(text):
+    names = [name for name in text.split(',') if name and name != 'none']
+    unknown = set(names) - set(ARTIFACTS)
+    if unknown:
+        raise argparse.ArgumentTypeError("unknown artifact(s): " + ", ".join(sorted(unknown)))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole pipeline in one process.")
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--write", type=parse_artifacts, default=['metromap'],
+                        help="Comma separated artifacts to write: %s, or none." % ",".join(ARTIFACTS))
+    parser.add_argument("--backend", default="auto", help="minisat, pysat or auto.")
+    parser.add_argument("--timeout", type=float, help="Solver timeout in seconds.")
+    parser.add_argument("--no-route", dest="route", action="store_false",
+                        help="Skip the heuristic router and always encode and solve.")
+    parser.add_argument("--memory-limit", type=float,
+                        help="Encoder memory ceiling in MB; above it clauses are spilled to disk.")
+    parser.add_argument("--seed-phases", action="store_true",
+                        help="Seed the solver's phases from quick paths (pysat backend only).")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--fast", dest="fast", action="store_true", default=None,
+                       help="Always use the raster renderer for the png.")
+    group.add_argument("--classic", dest="fast", action="store_false",
+                       help="Always use the per-cell renderer for the png.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+
+    timings = {}
+    try:
+        with timed(timings, 'parse'):
+            spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        result = run_pipeline(spec, base, args.write, args.backend, args.timeout,
+                              args.route, args.fast, timings, args.memory_limit, args.seed_phases)
+    except (RuntimeError, ValueError) as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    size = ""
+    if result.num_vars is not None:
+        size = f" (variables: {result.num_vars}, clauses: {result.num_clauses})"
+    print(f"[Pipeline] {base}: {result.status} - {result.detail}{size}")
+    for stage, seconds in result.timings.items():
+        print(f"[Pipeline]   {stage:<9} {seconds:8.3f}s")
+    print(f"[Pipeline]   {'total':<9} {sum(result.timings.values()):8.3f}s")
+    if result.memory:
+        print_phases(result.memory)
+    sys.exit({'VALID': 0, 'UNSAT': 0, 'TIMEOUT': 2}.get(result.status, 1))
+
+
+if __name__ == "__main__":
+    main()
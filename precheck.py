@@ -0,0 +1,198 @@
+"""
+Infeasibility pre-checks for Assignment 3: Metro Map Planning
+
+Runs cheap, polynomial-time necessary conditions straight off a MetroSpec.
+If any of them fails the city is UNSAT and there is no need to encode it or
+call the solver. Passing every check does NOT mean the city is SAT.
+
+Checks (cheapest first, the first failing one is reported):
+ 1) A line with J=0 must have its start and end in the same row or column.
+ 2) No start or end may be walled in by the border and other lines' endpoints.
+ 3) The lines' shortest possible paths must fit on the grid together
+    (sum over lines of Manhattan distance + 1 <= N*M).
+ 4) Every line must reach its end within J turns, avoiding other endpoints.
+ 5) (Scenario 2) Every popular cell must be coverable by at least one line
+    within J turns.
+
+Usage:
+    python3 precheck.py <basename>
+
+Exit codes:
+ - 0 : no infeasibility found (the city may still be UNSAT).
+ - 1 : parse error.
+ - 2 : city is UNSAT; <basename>.metromap is written as '0' and the reason printed.
+"""
+import sys
+from collections import deque
+
+from decoder import write_metromap
+from format_checker import parse_city
+
+# Heading order matches the encoder's direction order.
+DIRS = ['L', 'R', 'U', 'D']
+DX = (-1, 1, 0, 0)
+DY = (0, 0, -1, 1)
+OPPOSITE = (1, 0, 3, 2)
+INF = float('inf')
+
+
+def endpoint_cells(spec):
+    """Returns {cell: line} for every start and end cell."""
+    owner = {}
+    for k in range(spec.K):
+        owner[spec.starts[k]] = k
+        owner[spec.ends[k]] = k
+    return owner
+
+
+def turn_distances(N, M, J, owner, k, source, stop):
+    """
+    0-1 BFS over (cell, heading) states for line k, starting at `source`.
+    Returns a flat list dist[(x * M + y) * 4 + h]: the minimum number of turns
+    of a walk from `source` that arrives at (x, y) moving in heading h.
+    Walks never enter other lines' endpoints, never re-enter `source` and are
+    not extended past `stop`. States needing more than J turns are dropped.
+    """
+    dist = [INF] * (N * M * 4)
+    queue = deque()
+    sx, sy = source
+    for h in range(4):
+        nx, ny = sx + DX[h], sy + DY[h]
+        if not (0 <= nx < N and 0 <= ny < M):
+            continue
+        if owner.get((nx, ny), k) != k:
+            continue
+        dist[(nx * M + ny) * 4 + h] = 0
+        queue.append((0, nx, ny, h))
+
+    while queue:
+        t, x, y, h = queue.popleft()
+        if t > dist[(x * M + y) * 4 + h] or (x, y) == stop:
+            continue
+        for h2 in range(4):
+            nt = t if h2 == h else t + 1
+            if nt > J:
+                continue
+            nx, ny = x + DX[h2], y + DY[h2]
+            if not (0 <= nx < N and 0 <= ny < M) or (nx, ny) == source:
+                continue
+            if owner.get((nx, ny), k) != k:
+                continue
+            s = (nx * M + ny) * 4 + h2
+            if nt < dist[s]:
+                dist[s] = nt
+                if nt == t:
+                    queue.appendleft((nt, nx, ny, h2))
+                else:
+                    queue.append((nt, nx, ny, h2))
+    return dist
+
+
+def coverable_cells(spec, k, fwd, bwd):
+    """
+    Returns the set of cells line k could pass through with at most J turns,
+    given turn_distances() from its start (fwd) and from its end (bwd).
+    """
+    M, J = spec.M, spec.J
+    cells = {spec.starts[k], spec.ends[k]}
+    for c in range(spec.N * M):
+        base = c * 4
+        # Leaving c with heading h2 is arriving at c with OPPOSITE[h2] in the
+        # walk that started from the end.
+        if any(fwd[base + h] + bwd[base + OPPOSITE[h2]] + (h != h2) <= J
+               for h in range(4) if fwd[base + h] <= J
+               for h2 in range(4) if h2 != OPPOSITE[h]):
+            cells.add(divmod(c, M))
+    return cells
+
+
+def find_infeasibility(spec):
+    """
+    Runs the necessary-condition checks on `spec`.
+    Returns a human readable reason if the city is certainly UNSAT, else None.
+    """
+    N, M, K, J = spec.N, spec.M, spec.K, spec.J
+    owner = endpoint_cells(spec)
+
+    # 1) J=0 lines must be straight
+    if J == 0:
+        for k in range(K):
+            (sx, sy), (ex, ey) = spec.starts[k], spec.ends[k]
+            if sx != ex and sy != ey:
+                return "Line %d: J=0 but start %r and end %r are not aligned" % (
+                    k, spec.starts[k], spec.ends[k])
+
+    # 2) Walled-in endpoints
+    for k in range(K):
+        for label, (x, y) in (('start', spec.starts[k]), ('end', spec.ends[k])):
+            free = False
+            for h in range(4):
+                nx, ny = x + DX[h], y + DY[h]
+                if 0 <= nx < N and 0 <= ny < M and owner.get((nx, ny), k) == k:
+                    free = True
+                    break
+            if not free:
+                return "Line %d: %s %r is walled in by other lines' endpoints" % (
+                    k, label, (x, y))
+
+    # 3) Capacity: lines are cell-disjoint and each needs at least |s-e|_1 + 1 cells
+    needed = 0
+    for k in range(K):
+        (sx, sy), (ex, ey) = spec.starts[k], spec.ends[k]
+        needed += abs(sx - ex) + abs(sy - ey) + 1
+    if needed > N * M:
+        return "Lines need at least %d cells but the grid only has %d" % (
+            needed, N * M)
+
+    # 4) Per-line reachability within J turns
+    fwd = []
+    for k in range(K):
+        dist = turn_distances(N, M, J, owner, k, spec.starts[k], spec.ends[k])
+        ex, ey = spec.ends[k]
+        if min(dist[(ex * M + ey) * 4:(ex * M + ey) * 4 + 4]) > J:
+            return "Line %d: end %r is unreachable from start %r within %d turns" % (
+                k, spec.ends[k], spec.starts[k], J)
+        fwd.append(dist)
+
+    # 5) Popular cell coverage
+    if spec.scenario == 2 and spec.popular:
+        remaining = set(spec.popular) - set(owner)
+        for k in range(K):
+            if not remaining:
+                break
+            bwd = turn_distances(N, M, J, owner, k, spec.ends[k], spec.starts[k])
+            remaining -= coverable_cells(spec, k, fwd[k], bwd)
+        if remaining:
+            return "%d popular cell(s) cannot be reached by any line within %d turns, e.g. %r" % (
+                len(remaining), J, sorted(remaining)[0])
+
+    return None
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python3 precheck.py <basename>", file=sys.stderr)
+        sys.exit(1)
+
+    base = sys.argv[1]
+    if base.endswith(".city"):
+        base = base[:-5]
+
+    try:
+        spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    reason = find_infeasibility(spec)
+    if reason is None:
+        print("[Precheck] No infeasibility found")
+        sys.exit(0)
+
+    write_metromap(base + ".metromap", "UNSAT")
+    print(f"[Precheck] UNSAT: {reason}")
+    sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Headless batch renderer for Assignment 3: Metro Map Planning
+
+Renders <basename>_metromap.png for many cities without ever opening a window.
+Each worker process forces matplotlib's Agg backend, imports matplotlib only
+when it starts rendering, and reuses one figure for all of its cities (the
+axes are cleared between cities instead of building a new figure).
+Rendering uses visualize3.render_to_axes, so the images match visualize3.py.
+
+Arguments may be basenames (with or without .city) or directories; a directory
+contributes every .city under it that has a matching .metromap.
+
+Usage:
+    python3 render_batch.py <basename|directory> [...] [--workers 4] [--fast|--classic]
+
+Exit codes:
+ - 0 : every image was written.
+ - 1 : at least one city failed to render.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+_figure = None  # Per-process figure, created on first use
+
+
+def _get_figure():
+    global _figure
+    if _figure is None:
+        import matplotlib
+        matplotlib.use('Agg', force=True)
+        import matplotlib.pyplot as plt
+        _figure = plt.figure(figsize=(14, 6))
+        _figure.subplots(1, 2)
+    return _figure
+
+
+def render_one(task):
+    """Renders one basename; returns (basename, seconds, error or None)."""
+    base_name, fast = task
+    from visualize3 import render_to_axes
+
+    start = time.perf_counter()
+    fig = _get_figure()
+    ax1, ax2 = fig.axes
+    ax1.clear()
+    ax2.clear()
+    try:
+        render_to_axes(base_name, ax1, ax2, fast)
+        fig.tight_layout()
+        fig.savefig(f"{base_name}_metromap.png")
+    except Exception as e:
+        return base_name, time.perf_counter() - start, str(e)
+    return base_name, time.perf_counter() - start, None
+
+
+def find_basenames(paths):
+    """Expands directories into the basenames of cities that have a .metromap."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                names = set(filenames)
+                for name in sorted(names):
+                    if name.endswith('.city') and name[:-5] + '.metromap' in names:
+                        found.append(os.path.join(dirpath, name[:-5]))
+        else:
+            found.append(path[:-5] if path.endswith('.city') else path)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render metromap images headlessly in parallel.")
+    parser.add_argument("paths", nargs='+', help="Basenames or directories.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--fast", dest="fast", action="store_true", default=None,
+                       help="Always use the raster renderer.")
+    group.add_argument("--classic", dest="fast", action="store_false",
+                       help="Always use the per-cell renderer.")
+    args = parser.parse_args()
+
+    tasks = [(base, args.fast) for base in find_basenames(args.paths)]
+    start = time.perf_counter()
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks))) as pool:
+            results = list(pool.map(render_one, tasks))
+    else:
+        results = [render_one(task) for task in tasks]
+
+    failed = 0
+    for base_name, seconds, error in results:
+        if error is None:
+            print(f"[Render] {base_name}_metromap.png ({seconds:.2f}s)")
+        else:
+            failed += 1
+            print(f"[Render] {base_name}: {error}", file=sys.stderr)
+    print(f"[Render] {len(results) - failed}/{len(results)} images in "
+          f"{time.perf_counter() - start:.2f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
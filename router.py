@@ -0,0 +1,227 @@
+"""
+Heuristic multi-line router for Assignment 3: Metro Map Planning
+
+A fast first pass that tries to solve a city without SAT. Every line is routed
+with a turn-limited shortest path search (Dijkstra over (cell, heading, turns)
+states, grown out of testcase_gen.find_path_bfs). Lines that fight over cells
+are ripped up and rerouted with negotiated congestion costs (PathFinder style:
+a present-sharing penalty that grows every iteration plus a history cost on
+cells that stayed overused). In scenario 2 popular cells are cheaper to enter,
+and a popular cell that is still uncovered is handed to the closest line as a
+waypoint it must pass through.
+
+The router is incomplete: failing to route a city says nothing about SAT/UNSAT.
+A returned map is always re-checked with format_checker.analyze_constraints.
+
+Usage:
+    python3 router.py <basename> [--max-iters 30]
+
+Exit codes:
+ - 0 : routed; <basename>.metromap was written.
+ - 1 : parse error.
+ - 2 : router gave up; fall through to the SAT path.
+"""
+import argparse
+import heapq
+import sys
+
+from decoder import write_metromap
+from format_checker import analyze_constraints, parse_city
+
+DIRS = ['L', 'R', 'U', 'D']
+DX = (-1, 1, 0, 0)
+DY = (0, 0, -1, 1)
+
+POPULAR_COST = 0.25  # Base cost of entering a popular cell (normal cells cost 1)
+HISTORY_STEP = 1.0  # History cost added to a cell each iteration it is overused
+PRESENT_START = 0.5  # Initial penalty per other line sharing a cell
+PRESENT_GROWTH = 1.6  # Growth of the sharing penalty per iteration
+
+
+def route_line(spec, k, base_cost, hist, occ, pres_fac, waypoints=()):
+    """
+    Cheapest path for line k with at most J turns that visits `waypoints` in
+    order. Entering cell c costs base_cost[c] * (1 + hist[c]) * (1 + pres_fac * occ[c]).
+    Other lines' endpoints are never entered. Returns a list of (x, y) cells
+    from start to end, or None if no such path exists.
+    """
+    N, M, J = spec.N, spec.M, spec.J
+    start, end = spec.starts[k], spec.ends[k]
+    W = len(waypoints)
+    wp_index = {c: i for i, c in enumerate(waypoints)}
+    blocked = set(spec.starts) | set(spec.ends)
+    blocked.discard(end)
+
+    # State: (x, y, heading, turns, waypoints visited)
+    dist = {}
+    parent = {}
+    heap = []
+    sx, sy = start
+    for h in range(4):
+        nx, ny = sx + DX[h], sy + DY[h]
+        if not (0 <= nx < N and 0 <= ny < M) or (nx, ny) in blocked:
+            continue
+        w = 1 if W and wp_index.get((nx, ny)) == 0 else 0
+        if (nx, ny) == end and w != W:
+            continue
+        c = nx * M + ny
+        state = (nx, ny, h, 0, w)
+        d = base_cost[c] * (1 + hist[c]) * (1 + pres_fac * occ[c])
+        dist[state] = d
+        parent[state] = None
+        heapq.heappush(heap, (d, 0, state))
+
+    goal = None
+    while heap:
+        d, _, state = heapq.heappop(heap)
+        if d > dist[state]:
+            continue
+        x, y, h, t, w = state
+        if (x, y) == end:
+            goal = state
+            break
+        for h2 in range(4):
+            nt = t if h2 == h else t + 1
+            if nt > J:
+                continue
+            nx, ny = x + DX[h2], y + DY[h2]
+            if not (0 <= nx < N and 0 <= ny < M) or (nx, ny) in blocked:
+                continue
+            nw = w + 1 if w < W and wp_index.get((nx, ny)) == w else w
+            if (nx, ny) == end and nw != W:
+                continue
+            c = nx * M + ny
+            nd = d + base_cost[c] * (1 + hist[c]) * (1 + pres_fac * occ[c])
+            nstate = (nx, ny, h2, nt, nw)
+            if nd < dist.get(nstate, float('inf')):
+                dist[nstate] = nd
+                parent[nstate] = state
+                # Prefer fewer turns among equal-cost states
+                heapq.heappush(heap, (nd, nt, nstate))
+
+    if goal is None:
+        return None
+    path = []
+    state = goal
+    while state is not None:
+        path.append((state[0], state[1]))
+        state = parent[state]
+    path.append(start)
+    path.reverse()
+    return path
+
+
+def path_to_moves(path):
+    """Converts a list of adjacent cells into direction letters."""
+    letter = {(DX[h], DY[h]): DIRS[h] for h in range(4)}
+    return [letter[(x2 - x1, y2 - y1)] for (x1, y1), (x2, y2) in zip(path, path[1:])]
+
+
+def _order_waypoints(path, waypoints):
+    """Sorts waypoints by the position of the nearest cell on `path`."""
+    def key(p):
+        return min(range(len(path)),
+                   key=lambda i: abs(path[i][0] - p[0]) + abs(path[i][1] - p[1]))
+    return sorted(waypoints, key=key)
+
+
+def route_all(spec, max_iters=30):
+    """
+    Negotiated-congestion routing of every line of `spec`.
+    Returns a list of move lists (one per line) that passes every constraint,
+    or None if the router gave up.
+    """
+    N, M, K = spec.N, spec.M, spec.K
+    NM = N * M
+    base_cost = [1.0] * NM
+    for (px, py) in spec.popular:
+        base_cost[px * M + py] = POPULAR_COST
+    hist = [0.0] * NM
+    occ = [0] * NM
+    paths = [None] * K
+    waypoints = [[] for _ in range(K)]
+    tried = set()  # (popular cell, line) pairs that failed as a waypoint
+    endpoints = set(spec.starts) | set(spec.ends)
+    pres_fac = PRESENT_START
+
+    for _ in range(max_iters):
+        for k in range(K):
+            if paths[k] is not None:
+                for (x, y) in paths[k]:
+                    occ[x * M + y] -= 1
+            path = route_line(spec, k, base_cost, hist, occ, pres_fac, waypoints[k])
+            if path is not None and len(set(path)) != len(path):
+                path = None  # Waypoints forced the path to cross itself
+            if path is None and waypoints[k]:
+                for p in waypoints[k]:
+                    tried.add((p, k))
+                waypoints[k] = []
+                path = route_line(spec, k, base_cost, hist, occ, pres_fac)
+            if path is None or len(set(path)) != len(path):
+                return None
+            paths[k] = path
+            for (x, y) in path:
+                occ[x * M + y] += 1
+
+        overused = [c for c in range(NM) if occ[c] > 1]
+        if overused:
+            for c in overused:
+                hist[c] += HISTORY_STEP
+            pres_fac *= PRESENT_GROWTH
+            continue
+
+        covered = set()
+        for path in paths:
+            covered.update(path)
+        uncovered = [p for p in spec.popular if p not in covered and p not in endpoints]
+        if not uncovered:
+            moves = [path_to_moves(path) for path in paths]
+            report = analyze_constraints(spec, moves)
+            return moves if report['final_valid'] else None
+
+        # Hand every uncovered popular cell to the closest line not yet tried
+        for p in uncovered:
+            best = None
+            for k in range(K):
+                if (p, k) in tried:
+                    continue
+                d = min(abs(x - p[0]) + abs(y - p[1]) for (x, y) in paths[k])
+                if best is None or d < best[0]:
+                    best = (d, k)
+            if best is None:
+                return None
+            k = best[1]
+            waypoints[k] = _order_waypoints(paths[k], waypoints[k] + [p])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Heuristic negotiated-congestion router (fast first pass before SAT).")
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--max-iters", type=int, default=30,
+                        help="Rip-up-and-reroute iterations before giving up.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+
+    try:
+        spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    moves = route_all(spec, args.max_iters)
+    if moves is None:
+        print("[Router] No routing found, fall back to SAT")
+        sys.exit(2)
+
+    map_file = base + ".metromap"
+    write_metromap(map_file, moves)
+    print(f"[Router] Wrote metromap to {map_file}")
+
+
+if __name__ == "__main__":
+    main()
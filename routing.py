@@ -0,0 +1,103 @@
+"""
+Turn-constrained path search for Assignment 3: Metro Map Planning
+
+Shortest paths on an N x M grid with at most J turns, shared by the test case
+generator and the other tools. Cells are flat indices c = x * M + y and a
+blocked map is any sequence of N*M truthy/falsy values (a bytearray is the
+cheapest).
+
+The search is a breadth-first search over (cell, heading, turns) states. The
+queue itself is the node store: four flat arrays (cell, heading, turns,
+parent index) that are appended to and scanned in order, so every state costs
+four ints and the path is rebuilt once from parent pointers at the end. A state
+is only kept if it reaches its (cell, heading) with fewer turns than every
+earlier (hence shorter or equally long) state, which bounds the work by
+4 * N * M * (J + 1) and in practice keeps it close to 4 * N * M.
+"""
+from array import array
+
+# Headings in the encoder's order, as (dx, dy)
+HEADINGS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+NO_HEADING = 4
+
+
+def find_path(N, M, J, blocked, start, end, max_states=None):
+    """
+    Shortest path from `start` to `end` (both (x, y)) with at most J turns that
+    never enters a blocked cell other than `end`. Returns the path as a list of
+    (x, y) cells, or None if there is none (or max_states states were used).
+    """
+    if start == end:
+        return [start]
+    cells, parents, goal = search(N, M, J, blocked, start, end[0] * M + end[1], max_states)
+    if goal < 0:
+        return None
+    return path_to(cells, parents, goal, M)
+
+
+def explore(N, M, J, blocked, start, max_states):
+    """
+    Breadth-first exploration from `start` that stops after about max_states
+    states. Returns the (cells, parents) node arrays; node 0 is the start and
+    path_to(cells, parents, i, M) is a shortest path to node i within J turns.
+    """
+    cells, parents, _ = search(N, M, J, blocked, start, -1, max_states)
+    return cells, parents
+
+
+def search(N, M, J, blocked, start, target, max_states=None):
+    """
+    The (cell, heading, turns) BFS behind find_path/explore. `target` is a flat
+    cell index (or -1 for none); it may be entered even if blocked and the
+    search stops as soon as it is reached. Returns (cells, parents, goal node
+    index or -1).
+    """
+    NM = N * M
+    step = (-M, M, -1, 1)
+
+    cells = array('i', [start[0] * M + start[1]])
+    heads = array('b', [NO_HEADING])
+    turns = array('i', [0])
+    parents = array('i', [-1])
+    # Fewest turns seen so far per (cell, heading); J + 1 means "never reached"
+    best = bytearray([J + 1]) * (NM * 4) if J < 255 else array('i', [J + 1]) * (NM * 4)
+
+    push_cell, push_head, push_turns, push_parent = (
+        cells.append, heads.append, turns.append, parents.append)
+    low, high = M, NM - M
+    i = 0
+    while i < len(cells):
+        c = cells[i]
+        h = heads[i]
+        t = turns[i]
+        y = c % M
+        for h2, ok in ((0, c >= low), (1, c < high), (2, y != 0), (3, y != M - 1)):
+            if not ok:
+                continue
+            nc = c + step[h2]
+            if blocked[nc] and nc != target:
+                continue
+            nt = t + 1 if h != h2 and h != NO_HEADING else t
+            if nt > J or nt >= best[nc * 4 + h2]:
+                continue
+            best[nc * 4 + h2] = nt
+            push_cell(nc)
+            push_head(h2)
+            push_turns(nt)
+            push_parent(i)
+            if nc == target:
+                return cells, parents, len(cells) - 1
+        if max_states is not None and len(cells) > max_states:
+            break
+        i += 1
+    return cells, parents, -1
+
+
+def path_to(cells, parents, node, M):
+    """Rebuilds the (x, y) path from node 0 to `node` by following parent pointers."""
+    path = []
+    while node != -1:
+        path.append(divmod(cells[node], M))
+        node = parents[node]
+    path.reverse()
+    return path
@@ -11,16 +11,26 @@ BASENAME="$1"
 CNF_FILE="${BASENAME}.satinput"   # Encoder should create this
 OUT_FILE="${BASENAME}.satoutput"   # Minisat will write here
 
-# 1. Run encoder
-./run1.sh "$BASENAME"
+# 0. Reuse a cached solution of a symmetric city, else try the heuristic
+#    router; only cities it cannot route go through SAT
+CACHED=0
+if python3 solution_cache.py lookup "$BASENAME"; then
+  CACHED=1
+elif ! python3 router.py "$BASENAME"; then
+  # 1. Run encoder
+  ./run1.sh "$BASENAME"
 
-# 2. Run minisat
-minisat "$CNF_FILE" "$OUT_FILE"
-# > /dev/null 2>&1
+  # 2. Run minisat
+  minisat "$CNF_FILE" "$OUT_FILE"
+  # > /dev/null 2>&1
 
-# 3. Run decoder
-./run2.sh "$BASENAME"
+  # 3. Run decoder
+  ./run2.sh "$BASENAME"
+fi
 
-python3 format_checker.py "$BASENAME"
+# A hit is already stored; storing it again would only reset its age
+if python3 format_checker.py "$BASENAME" && [ "$CACHED" = 0 ]; then
+  python3 solution_cache.py store "$BASENAME"
+fi
 
-python3 visualize3.py "$BASENAME"
\ No newline at end of file
+python3 visualize3.py "$BASENAME"
@@ -0,0 +1,145 @@
+"""
+SAT solver backends for Assignment 3: Metro Map Planning
+
+Runs a CNF produced by encoder.encode_to_sat and returns a SolveResult:
+    status  : 'SAT', 'UNSAT' or 'TIMEOUT'
+    model   : list of signed literals (empty unless SAT)
+    seconds : wall-clock solve time
+
+Backends:
+    minisat : the minisat binary, as in run.sh (the CNF goes through a file).
+    pysat   : python-sat's in-process Minisat22 (pip install python-sat).
+    auto    : minisat if it is on PATH, else pysat.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from encoder import write_cnf
+
+SolveResult = namedtuple('SolveResult', ['status', 'model', 'seconds'])
+
+
+def resolve_backend(backend='auto'):
+    if backend == 'auto':
+        return 'minisat' if shutil.which('minisat') else 'pysat'
+    if backend not in ('minisat', 'pysat'):
+        raise ValueError("Unknown solver backend %r" % backend)
+    return backend
+
+
+def read_minisat_output(path):
+    """Parses a minisat result file into (status, model)."""
+    with open(path, 'r') as f:
+        lines = [ln.strip() for ln in f if ln.strip()]
+    if not lines:
+        raise ValueError("Empty SAT output file")
+    if lines[0].startswith("UNSAT"):
+        return 'UNSAT', []
+    if lines[0].startswith("SAT"):
+        model = [int(x) for x in lines[1].split()[:-1]] if len(lines) > 1 else []
+        return 'SAT', model
+    raise ValueError("Invalid SAT output format")
+
+
+def write_minisat_output(path, status, model):
+    """Writes a result in minisat's output format, so decoder.py can read it."""
+    with open(path, 'w') as f:
+        if status == 'SAT':
+            f.write("SAT\n" + " ".join(map(str, model)) + " 0\n")
+        else:
+            f.write("UNSAT\n")
+
+
+def solve_with_minisat(cnf_path, out_path, timeout=None):
+    """Runs the minisat binary on a DIMACS file; the result is left in out_path."""
+    start = time.perf_counter()
+    try:
+        subprocess.run(['minisat', cnf_path, out_path], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return SolveResult('TIMEOUT', [], time.perf_counter() - start)
+    seconds = time.perf_counter() - start
+    status, model = read_minisat_output(out_path)
+    return SolveResult(status, model, seconds)
+
+
+def clause_lists(clauses):
+    """Normalizes encoder clauses (tuples or bare ints) to lists of ints."""
+    for clause in clauses:
+        yield [clause] if isinstance(clause, int) else list(clause)
+
+
+def solve_with_pysat(num_vars, clauses, timeout=None, phases=None):
+    """
+    Solves in-process with python-sat's Minisat22. `phases` is an optional
+    list of literals the solver should try first (see phase_seeding.py).
+    """
+    try:
+        from pysat.solvers import Minisat22
+    except ImportError:
+        raise RuntimeError("the pysat backend needs python-sat: pip install python-sat")
+
+    with Minisat22(bootstrap_with=clause_lists(clauses)) as solver:
+        if phases:
+            solver.set_phases(phases)
+        start = time.perf_counter()
+        if timeout is None:
+            sat = solver.solve()
+        else:
+            timer = threading.Timer(timeout, solver.interrupt)
+            timer.start()
+            try:
+                sat = solver.solve_limited(expect_interrupt=True)
+            finally:
+                timer.cancel()
+        seconds = time.perf_counter() - start
+        if sat is None:
+            return SolveResult('TIMEOUT', [], seconds)
+        if not sat:
+            return SolveResult('UNSAT', [], seconds)
+        return SolveResult('SAT', solver.get_model(), seconds)
+
+
+def count_conflicts(num_vars, clauses, budget=None):
+    """
+    Solves with pysat's Minisat22 and returns (status, conflicts, seconds).
+    Unlike the runtime, the conflict count does not depend on the machine.
+    With a budget the search stops after that many conflicts, status 'TIMEOUT'.
+    """
+    try:
+        from pysat.solvers import Minisat22
+    except ImportError:
+        raise RuntimeError("counting conflicts needs python-sat: pip install python-sat")
+
+    with Minisat22(bootstrap_with=clause_lists(clauses)) as solver:
+        start = time.perf_counter()
+        if budget is None:
+            sat = solver.solve()
+        else:
+            solver.conf_budget(int(budget))
+            sat = solver.solve_limited()
+        seconds = time.perf_counter() - start
+        status = 'TIMEOUT' if sat is None else 'SAT' if sat else 'UNSAT'
+        return status, solver.accum_stats()['conflicts'], seconds
+
+
+def solve_cnf(num_vars, clauses, backend='auto', timeout=None, cnf_path=None, out_path=None,
+              phases=None):
+    """
+    Solves an in-memory CNF. With the minisat backend the DIMACS and result
+    files go to cnf_path/out_path when given, else to a temporary directory.
+    Phase hints are only used by the pysat backend.
+    """
+    backend = resolve_backend(backend)
+    if backend == 'pysat':
+        return solve_with_pysat(num_vars, clauses, timeout, phases)
+    with tempfile.TemporaryDirectory() as tmp:
+        cnf_path = cnf_path or os.path.join(tmp, 'instance.satinput')
+        out_path = out_path or os.path.join(tmp, 'instance.satoutput')
+        write_cnf(cnf_path, num_vars, clauses)
+        return solve_with_minisat(cnf_path, out_path, timeout)
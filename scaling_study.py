@@ -0,0 +1,265 @@
+"""
+Scaling study for Assignment 3: Metro Map Planning
+
+Measures how the encoder and solver grow with N, M, K, J and P. Every point of
+the parameter grid (the product of the comma separated lists) gets --samples
+cities from testcase_gen, and each city is run through the pipeline
+
+    pipeline.run_pipeline (encode -> solve -> decode -> check, no router)
+
+for the time of every stage, plus a separate encoding pass under
+encoder.encode_with_memory_guard (tracemalloc would slow the timed run down)
+for the variables, the clauses and time of every constraint family (encoder
+section; traced, so compare family times with each other, not with the
+stages) and the peak memory of encoding. Every city runs in a fresh worker
+process, so the max RSS recorded is that city's alone.
+
+Growth exponents are fitted by least squares on log(metric) against the log of
+every parameter that takes more than one value, i.e. metric ~ N^a * M^b * ...
+Points where a parameter or the metric is 0 are left out of that fit (so a
+P sweep should not include P=0). Solve times of timed-out runs are left out.
+
+Usage:
+    python3 scaling_study.py --N 5,10,20,40 --M 10 --K 2,4 --J 2 [--P 0] [--samples 3]
+                             [--mode constructive] [--timeout 60] [--backend auto]
+                             [--seed 0] [--workers 4] [--output scaling.json]
+                             [--csv scaling.csv] [--plot scaling.png]
+"""
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from encoder import CLAUSE_SECTIONS, encode_with_memory_guard
+from hardness_corpus import parse_ints, spec_from_instance
+from memory_guard import peak_rss_mb
+from pipeline import run_pipeline
+from testcase_gen import GENERATORS, instance_seed
+
+PARAMS = ['N', 'M', 'K', 'J', 'P']
+STAGE_METRICS = ['variables', 'clauses', 'encode', 'solve', 'decode', 'check',
+                 'encode_peak_mb', 'max_rss_mb']
+FAMILIES = ['turns'] + [name for name, _ in CLAUSE_SECTIONS] + ['popular']
+
+
+def encode_by_family(spec):
+    """
+    Encodes `spec` once under encode_with_memory_guard without a ceiling.
+    Returns (num_vars, num_clauses, counts, times, peak_mb): the new clauses
+    and seconds of every family and the peak traced memory in MB.
+    """
+    num_vars, clauses, tracker = encode_with_memory_guard(spec, float('inf'))
+    counts = {}
+    times = {}
+    before = 0
+    for phase in tracker.phases:
+        if phase['phase'] in FAMILIES:
+            counts[phase['phase']] = phase['clauses'] - before
+            times[phase['phase']] = phase['seconds']
+        before = phase['clauses']
+    return num_vars, len(clauses), counts, times, max(p['peak_mb'] for p in tracker.phases)
+
+
+def run_point(task):
+    """Generates and measures one city; runs in a worker process. Never raises."""
+    mode, N, M, K, J, P, sample, seed, backend, timeout = task
+    row = {'N': N, 'M': M, 'K': K, 'J': J, 'P': P, 'sample': sample, 'seed': seed,
+           'status': None, 'error': None}
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            instance = GENERATORS[mode](N, M, K, J, P, random.Random(seed))
+            row['P'] = P = instance.get('P', P)
+            spec = spec_from_instance(N, M, K, J, P, instance)
+
+            result = run_pipeline(spec, backend=backend, timeout=timeout, route=False)
+            row['status'] = result.status
+            if result.status == 'ERROR':
+                row['error'] = result.detail
+            for stage in ('encode', 'solve', 'decode', 'check'):
+                row[stage] = result.timings.get(stage)
+
+            # Separate pass: tracemalloc slows allocation-heavy code down a lot
+            num_vars, num_clauses, counts, family_times, peak_mb = encode_by_family(spec)
+            row['variables'] = num_vars
+            row['clauses'] = num_clauses
+            row['family_clauses'] = counts
+            row['family_seconds'] = family_times
+            row['encode_peak_mb'] = peak_mb
+    except SystemExit:
+        row['status'] = 'ERROR'
+        row['error'] = "generation failed"
+    except Exception as e:
+        row['status'] = 'ERROR'
+        row['error'] = "%s: %s" % (type(e).__name__, e)
+    row['max_rss_mb'] = peak_rss_mb()
+    return row
+
+
+def metric_values(rows):
+    """Yields (metric name, [(row, value)]) for every metric that can be fitted."""
+    for metric in STAGE_METRICS:
+        values = []
+        for row in rows:
+            value = row.get(metric)
+            if value is None or (metric == 'solve' and row['status'] == 'TIMEOUT'):
+                continue
+            values.append((row, value))
+        yield metric, values
+    for family in FAMILIES:
+        for key, prefix in (('family_clauses', 'clauses/'), ('family_seconds', 'seconds/')):
+            yield prefix + family, [(row, row[key][family]) for row in rows if key in row]
+
+
+def fit_exponents(rows, swept):
+    """
+    Least-squares fit of log(metric) = c + sum(e_p * log(p)) over the swept
+    parameters. Returns {metric: {'exponents': {p: e_p}, 'r2': ..., 'points': n}}.
+    """
+    import numpy as np
+
+    fits = {}
+    for metric, values in metric_values(rows):
+        X, y = [], []
+        for row, value in values:
+            if value <= 0 or any(row[p] <= 0 for p in swept):
+                continue
+            X.append([1.0] + [math.log(row[p]) for p in swept])
+            y.append(math.log(value))
+        if len(y) <= len(swept):
+            continue
+        X = np.array(X)
+        y = np.array(y)
+        coef, _, rank, _ = np.linalg.lstsq(X, y, rcond=None)
+        if rank < X.shape[1]:
+            continue
+        residual = y - X @ coef
+        total = ((y - y.mean()) ** 2).sum()
+        r2 = 1.0 - (residual ** 2).sum() / total if total > 0 else 1.0
+        fits[metric] = {'exponents': {p: round(float(e), 3) for p, e in zip(swept, coef[1:])},
+                        'r2': round(float(r2), 4), 'points': len(y)}
+    return fits
+
+
+def plot_study(rows, swept, fits, path):
+    """One row of log-log panels per swept parameter: size, time, memory, families."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    panels = [('Size', ['variables', 'clauses']),
+              ('Stage time (s)', ['encode', 'solve', 'decode', 'check']),
+              ('Peak memory (MB)', ['encode_peak_mb', 'max_rss_mb']),
+              ('Clauses per family', ['clauses/' + f for f in FAMILIES])]
+    all_values = dict(metric_values(rows))
+    fig, axes = plt.subplots(len(swept), len(panels), figsize=(5 * len(panels), 4 * len(swept)),
+                             squeeze=False)
+    for i, param in enumerate(swept):
+        for j, (title, metrics) in enumerate(panels):
+            ax = axes[i][j]
+            for metric in metrics:
+                # Mean over the rows sharing each value of `param`
+                groups = {}
+                for row, value in all_values.get(metric, []):
+                    if value > 0 and row[param] > 0:
+                        groups.setdefault(row[param], []).append(value)
+                if len(groups) < 2:
+                    continue
+                xs = sorted(groups)
+                ys = [sum(groups[x]) / len(groups[x]) for x in xs]
+                exponent = fits.get(metric, {}).get('exponents', {}).get(param)
+                label = metric if exponent is None else f"{metric} (~{param}^{exponent:g})"
+                ax.loglog(xs, ys, marker='o', label=label)
+            ax.set_xlabel(param)
+            ax.set_title(title)
+            if ax.lines:
+                ax.legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def write_csv(rows, path):
+    fields = (['N', 'M', 'K', 'J', 'P', 'sample', 'seed', 'status'] + STAGE_METRICS
+              + ['clauses_' + f for f in FAMILIES] + ['seconds_' + f for f in FAMILIES] + ['error'])
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            flat = dict(row)
+            for f_name in FAMILIES:
+                flat['clauses_' + f_name] = row.get('family_clauses', {}).get(f_name)
+                flat['seconds_' + f_name] = row.get('family_seconds', {}).get(f_name)
+            writer.writerow(flat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep N, M, K, J, P and fit growth exponents.")
+    parser.add_argument("--N", type=parse_ints, required=True, help="Grid widths, e.g. 5,10,20.")
+    parser.add_argument("--M", type=parse_ints, required=True, help="Grid heights, e.g. 5,10,20.")
+    parser.add_argument("--K", type=parse_ints, required=True, help="Line counts, e.g. 2,4,8.")
+    parser.add_argument("--J", type=parse_ints, required=True, help="Turn limits, e.g. 1,2,3.")
+    parser.add_argument("--P", type=parse_ints, default=[0], help="Popular cell counts (0 = scenario 1).")
+    parser.add_argument("--samples", type=int, default=3, help="Cities per parameter point.")
+    parser.add_argument("--mode", choices=sorted(GENERATORS), default="constructive",
+                        help="testcase_gen generator.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Solver timeout per city.")
+    parser.add_argument("--backend", default="auto", help="minisat, pysat or auto.")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--output", default="scaling.json", help="Rows and fitted exponents (JSON).")
+    parser.add_argument("--csv", help="Also write the rows as CSV.")
+    parser.add_argument("--plot", help="Write log-log plots to this image.")
+    args = parser.parse_args()
+
+    grid = list(itertools.product(args.N, args.M, args.K, args.J, args.P))
+    tasks = []
+    for point_index, (N, M, K, J, P) in enumerate(grid):
+        for sample in range(args.samples):
+            seed = instance_seed(args.seed, f"{point_index}:{sample}")
+            tasks.append((args.mode, N, M, K, J, P, sample, seed, args.backend, args.timeout))
+
+    start = time.perf_counter()
+    # A fresh process per city, also with one worker, keeps max RSS a per-city number
+    with multiprocessing.Pool(max(1, min(args.workers, len(tasks))), maxtasksperchild=1) as pool:
+        rows = pool.map(run_point, tasks, chunksize=1)
+    for row in rows:
+        if row['status'] == 'ERROR':
+            print(f"[Scaling] N={row['N']} M={row['M']} K={row['K']} J={row['J']} P={row['P']} "
+                  f"#{row['sample']}: {row['error']}", file=sys.stderr)
+
+    swept = [p for p, values in zip(PARAMS, (args.N, args.M, args.K, args.J, args.P))
+             if len(set(values)) > 1]
+    fits = fit_exponents([row for row in rows if row['status'] != 'ERROR'], swept) if swept else {}
+
+    study = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {'N': args.N, 'M': args.M, 'K': args.K, 'J': args.J, 'P': args.P,
+                     'samples': args.samples, 'mode': args.mode, 'timeout': args.timeout,
+                     'backend': args.backend, 'seed': args.seed},
+        'swept': swept,
+        'exponents': fits,
+        'rows': rows,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(study, f, indent=1)
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.plot and swept:
+        plot_study(rows, swept, fits, args.plot)
+
+    print(f"[Scaling] {len(rows)} runs in {time.perf_counter() - start:.1f}s, swept: {', '.join(swept) or 'nothing'}")
+    for metric, fit in fits.items():
+        terms = " * ".join(f"{p}^{e:g}" for p, e in fit['exponents'].items())
+        print(f"[Scaling]   {metric:<24} ~ {terms}  (r2={fit['r2']:.3f}, n={fit['points']})")
+    print(f"[Scaling] Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Symmetry-canonical solution cache for Assignment 3: Metro Map Planning
+
+The problem is invariant under the symmetries of the grid (the dihedral group
+of the square when N == M, its 4-element subgroup of flips otherwise) and under
+relabeling of the lines. A city is canonicalized by applying every symmetry,
+sorting its lines and popular cells, and keeping the smallest result. Its hash
+is the cache key, so a rotated/reflected/relabeled copy of a solved city hits
+the same entry. Entries store the metromap in the canonical frame (or UNSAT);
+on a hit the moves are mapped back through the inverse transform, with the
+direction letters rotated to match, and the lines put back in their order.
+The key also hashes encoder.ENCODING_VERSION, so a verdict (UNSAT in
+particular) reached by an older encoding is never served again.
+
+Entries are JSON files in a cache directory, bounded by count and age.
+
+Usage:
+    python3 solution_cache.py lookup <basename>   # writes <basename>.metromap on a hit
+    python3 solution_cache.py store <basename>    # caches <basename>.metromap
+    options: [--cache-dir .metro_cache] [--max-entries 10000] [--max-age 2592000]
+
+Exit codes:
+ - 0 : hit (lookup) or stored (store).
+ - 1 : parse error, or (store) the metromap violates a constraint.
+ - 2 : cache miss.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from decoder import write_metromap
+from encoder import ENCODING_VERSION
+from format_checker import analyze_constraints, parse_city, parse_metromap
+
+DIR_VECTORS = {'L': (-1, 0), 'R': (1, 0), 'U': (0, -1), 'D': (0, 1)}
+VECTOR_DIRS = {v: d for d, v in DIR_VECTORS.items()}
+
+
+def symmetries(N, M):
+    """
+    Symmetries of an N x M grid as (swap, flip_x, flip_y) triples: flip the
+    requested axes, then transpose if swap. Transposes only apply when N == M.
+    """
+    swaps = (False, True) if N == M else (False,)
+    return [(s, fx, fy) for s in swaps for fx in (False, True) for fy in (False, True)]
+
+
+def transform_cell(g, N, M, cell):
+    swap, fx, fy = g
+    x, y = cell
+    if fx:
+        x = N - 1 - x
+    if fy:
+        y = M - 1 - y
+    return (y, x) if swap else (x, y)
+
+
+def transform_direction(g, d):
+    swap, fx, fy = g
+    dx, dy = DIR_VECTORS[d]
+    if fx:
+        dx = -dx
+    if fy:
+        dy = -dy
+    return VECTOR_DIRS[(dy, dx) if swap else (dx, dy)]
+
+
+def canonicalize(spec):
+    """
+    Returns (key, g, perm): the cache key of `spec`, the symmetry taking
+    `spec` to its canonical form, and perm[i] = original index of canonical line i.
+    """
+    best = None
+    for g in symmetries(spec.N, spec.M):
+        lines = [(transform_cell(g, spec.N, spec.M, spec.starts[k]),
+                  transform_cell(g, spec.N, spec.M, spec.ends[k]), k) for k in range(spec.K)]
+        lines.sort()
+        popular = sorted(transform_cell(g, spec.N, spec.M, p) for p in spec.popular)
+        dims = (spec.M, spec.N) if g[0] else (spec.N, spec.M)
+        form = (spec.scenario, dims, spec.J,
+                tuple((s, e) for s, e, _ in lines), tuple(popular))
+        if best is None or form < best[0]:
+            best = (form, g, [k for _, _, k in lines])
+    form, g, perm = best
+    key = hashlib.sha256(repr((ENCODING_VERSION, form)).encode()).hexdigest()
+    return key, g, perm
+
+
+def to_canonical(spec, moves):
+    """Maps a metromap of `spec` into the canonical frame."""
+    _, g, perm = canonicalize(spec)
+    return [[transform_direction(g, d) for d in moves[k]] for k in perm]
+
+
+def from_canonical(spec, canon_moves):
+    """Maps a canonical-frame metromap back onto `spec`."""
+    _, g, perm = canonicalize(spec)
+    inverse = {transform_direction(g, d): d for d in DIR_VECTORS}
+    moves = [None] * spec.K
+    for i, k in enumerate(perm):
+        moves[k] = [inverse[d] for d in canon_moves[i]]
+    return moves
+
+
+class SolutionCache:
+    """On-disk cache of metromaps keyed by canonical city, bounded by size and age."""
+
+    def __init__(self, directory='.metro_cache', max_entries=10000, max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, spec):
+        """Returns 'UNSAT', a list of move lists for `spec`, or None on a miss."""
+        key, _, _ = canonicalize(spec)
+        path = self._path(key)
+        entry = self._load(path)
+        if entry is None or time.time() - entry['created'] > self.max_age:
+            self._remove(path)
+            return None
+        os.utime(path)  # mtime doubles as last-use time for eviction
+        if entry['verdict'] == 'UNSAT':
+            return 'UNSAT'
+        return from_canonical(spec, entry['moves'])
+
+    def put(self, spec, moves):
+        """
+        Stores 'UNSAT' or a list of move lists for `spec`. Re-storing the same
+        answer keeps the entry's creation time, so max_age still applies to it.
+        """
+        key, _, _ = canonicalize(spec)
+        if moves == 'UNSAT':
+            entry = {'verdict': 'UNSAT', 'moves': None}
+        else:
+            entry = {'verdict': 'SAT', 'moves': to_canonical(spec, moves)}
+        path = self._path(key)
+        old = self._load(path)
+        same = old is not None and (old['verdict'], old['moves']) == (entry['verdict'], entry['moves'])
+        entry['created'] = old['created'] if same else time.time()
+        tmp = path + '.tmp%d' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Drops entries older than max_age, then least recently used ones above max_entries."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if now - mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((mtime, path))
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            self._remove(path)
+
+    @staticmethod
+    def _load(path):
+        """The entry at `path`, or None if it is missing, unreadable or malformed."""
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(entry, dict) or entry.get('verdict') not in ('SAT', 'UNSAT')
+                or not isinstance(entry.get('created'), (int, float))
+                or (entry['verdict'] == 'SAT' and not isinstance(entry.get('moves'), list))):
+            return None
+        return entry
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Symmetry-canonical metromap cache.")
+    parser.add_argument("command", choices=["lookup", "store"])
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--cache-dir", default=".metro_cache", help="Cache directory.")
+    parser.add_argument("--max-entries", type=int, default=10000, help="Maximum cached cities.")
+    parser.add_argument("--max-age", type=float, default=30 * 24 * 3600,
+                        help="Maximum entry age in seconds.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+    map_file = base + ".metromap"
+    cache = SolutionCache(args.cache_dir, args.max_entries, args.max_age)
+
+    try:
+        spec = parse_city(base + ".city")
+    except Exception as e:
+        print("City parse error:", e, file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "lookup":
+        moves = cache.get(spec)
+        if moves is None:
+            print("[Cache] Miss")
+            sys.exit(2)
+        write_metromap(map_file, moves)
+        print(f"[Cache] Hit, wrote {map_file}")
+        return
+
+    try:
+        state, moves = parse_metromap(map_file)
+    except Exception as e:
+        print("Metromap parse error:", e, file=sys.stderr)
+        sys.exit(1)
+    if state == 'UNSAT':
+        cache.put(spec, 'UNSAT')
+    else:
+        if not analyze_constraints(spec, moves)['final_valid']:
+            print("[Cache] Not storing an invalid metromap", file=sys.stderr)
+            sys.exit(1)
+        cache.put(spec, moves)
+    print(f"[Cache] Stored {map_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,74 +8,51 @@ Features:
     constructive: Guaranteed SAT. Picks start/end points, then finds a valid path.
     random:       Random start/end points (may be SAT or UNSAT).
     unsat:        Deliberately UNSAT (e.g., J=0 with non-aligned endpoints).
+    huge:         Guaranteed SAT for very large cities (e.g. 1000x1000, K=300):
+                  bytearray occupancy, O(1) free-cell sampling, bounded search.
 - Supports any arbitrary value for J in constructive mode via a BFS pathfinder.
-- Batch generation with seeding for reproducible test suites.
+- Batch generation with seeding for reproducible test suites. Each instance is
+  seeded from (--seed, index), so --workers N generates in parallel processes
+  and the files are identical for any number of workers.
 - Output organization with prefixes and directories.
 
 Usage:
     # Generate 5 guaranteed SATISFIABLE cases for J=4
     python3 test_case_generator.py --N 20 --M 20 --K 5 --J 4 --mode constructive --count 5
 
+    # Generate 200 instances on 8 processes (same files as with --workers 1)
+    python3 test_case_generator.py --N 30 --M 30 --K 8 --J 3 --count 200 --seed 7 --workers 8
+
+    # Generate a 1000x1000 city with 300 lines in a few seconds
+    python3 test_case_generator.py --N 1000 --M 1000 --K 300 --J 3 --mode huge
+
     # Generate a deliberately UNSATISFIABLE case for J=0
     python3 test_case_generator.py --N 10 --M 10 --K 4 --J 0 --mode unsat --output impossible.city
 """
 
 import argparse
+import contextlib
+import hashlib
 import os
 import random
 import sys
-from collections import deque
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from routing import explore, find_path, path_to
 
 
 def find_path_bfs(N, M, J, grid, start, end):
     """
     Finds a path from start to end using BFS, respecting the turn limit J.
     Returns the path as a list of coordinates, or None if no path is found.
+    Occupied cells (grid[x][y] True) are never entered, except the end.
     """
-    if start == end:
-        return [start]
-
-    # State: (position, path_list, turns, last_direction)
-    queue = deque([(start, [start], 0, None)])
-    # Visited: key=(position, turns, last_direction), value=path_length
-    visited = {(start, 0, None): 0}
-
-    while queue:
-        (pos, path, turns, last_dir) = queue.popleft()
-
-        if pos == end:
-            return path
-
-        for direction, (dx, dy) in {'R': (1, 0), 'L': (-1, 0), 'D': (0, 1), 'U': (0, -1)}.items():
-            nx, ny = pos[0] + dx, pos[1] + dy
-
-            if not (0 <= nx < N and 0 <= ny < M):
-                continue
-
-            # Path can't cross itself or other existing paths
-            # The destination 'end' is the only previously occupied cell we can enter.
-            if grid[nx][ny] and (nx, ny) != end:
-                continue
-
-            new_turns = turns + (1 if last_dir is not None and direction != last_dir else 0)
-
-            if new_turns > J:
-                continue
-
-            new_path = path + [(nx, ny)]
-
-            # Pruning: if we've reached this cell before with fewer or equal turns and a shorter path, skip.
-            visited_key = ((nx, ny), new_turns, direction)
-            if visited_key in visited and visited[visited_key] <= len(new_path):
-                continue
+    blocked = bytearray(cell for column in grid for cell in column)
+    return find_path(N, M, J, blocked, start, end)
 
-            visited[visited_key] = len(new_path)
-            queue.append(((nx, ny), new_path, new_turns, direction))
 
-    return None
-
-
-def generate_satisfiable_instance(N, M, K, J, P):
+def generate_satisfiable_instance(N, M, K, J, P, rng=random):
     """
     Generates a guaranteed satisfiable instance by picking S/E pairs and finding paths.
     """
@@ -92,7 +69,7 @@ def generate_satisfiable_instance(N, M, K, J, P):
             if len(available_points) < 2:
                 break  # Not enough space
 
-            start, end = random.sample(available_points, 2)
+            start, end = rng.sample(available_points, 2)
 
             # Temporarily mark end as available for pathfinding
             grid[end[0]][end[1]] = False
@@ -120,12 +97,70 @@ def generate_satisfiable_instance(N, M, K, J, P):
         print(f"Warning: Could only find {len(possible_popular)} valid spots for {P} popular cells. Reducing P.",
               file=sys.stderr)
         P = len(possible_popular)
-    popular_cells = random.sample(possible_popular, P)
+    popular_cells = rng.sample(possible_popular, P)
 
     return {'metro_lines': metro_lines, 'popular_cells': popular_cells, 'P': P}
 
 
-def generate_random_instance(N, M, K, J, P):
+def generate_huge_instance(N, M, K, J, P, rng=random, max_states=4000, attempts=50):
+    """
+    Scalable guaranteed-SAT generator for very large grids.
+    Occupancy is a flat bytearray (cell = x * M + y) and the free cells are
+    kept in an array with a position index, so sampling a free cell and
+    removing an occupied one are O(1) (swap-remove). Each line explores at
+    most max_states search states from a random free start and takes a random
+    reached cell as its end, so its path exists by construction.
+    """
+    NM = N * M
+    occupied = bytearray(NM)
+    free = array('i', range(NM))
+    position = array('i', range(NM))
+
+    def take(c):
+        i = position[c]
+        last = free[-1]
+        free[i] = last
+        position[last] = i
+        free.pop()
+        occupied[c] = 1
+
+    metro_lines = []
+    interior = []
+    for _ in range(K):
+        found_path = None
+        for _ in range(attempts):
+            if len(free) < 2:
+                break
+            sc = free[rng.randrange(len(free))]
+            start = divmod(sc, M)
+            cells, parents = explore(N, M, J, occupied, start, max_states)
+            if len(cells) < 2:
+                continue
+            path = path_to(cells, parents, rng.randrange(1, len(cells)), M)
+            if len(set(path)) == len(path):
+                found_path = path
+                break
+
+        if not found_path:
+            print(f"Error: Failed to construct a satisfiable instance. Try a larger grid or fewer lines.",
+                  file=sys.stderr)
+            sys.exit(1)
+
+        metro_lines.append({'start': found_path[0], 'end': found_path[-1]})
+        for x, y in found_path:
+            take(x * M + y)
+        interior.extend(found_path[1:-1])
+
+    if len(interior) < P:
+        print(f"Warning: Could only find {len(interior)} valid spots for {P} popular cells. Reducing P.",
+              file=sys.stderr)
+        P = len(interior)
+    popular_cells = rng.sample(interior, P)
+
+    return {'metro_lines': metro_lines, 'popular_cells': popular_cells, 'P': P}
+
+
+def generate_random_instance(N, M, K, J, P, rng=random):
     """Generates a purely random instance (may be SAT or UNSAT)."""
     num_points = 2 * K + P
     if num_points > N * M:
@@ -133,7 +168,7 @@ def generate_random_instance(N, M, K, J, P):
         sys.exit(1)
 
     all_coords = [(x, y) for x in range(N) for y in range(M)]
-    chosen_points = random.sample(all_coords, num_points)
+    chosen_points = rng.sample(all_coords, num_points)
 
     endpoints = chosen_points[:2 * K]
     popular_cells = chosen_points[2 * K:]
@@ -145,16 +180,13 @@ def generate_random_instance(N, M, K, J, P):
     return {'metro_lines': metro_lines, 'popular_cells': popular_cells, 'P': P}
 
 
-def generate_unsat_instance(N, M, K, J, P):
+def generate_unsat_instance(N, M, K, J, P, rng=random):
     """
     General-purpose UNSAT generator for Metro Map Planning.
     - For J=0: Misalign endpoints for at least one line.
     - For J=1: Crossing gadget.
     - For J>=2: Overpack or place impossible-to-cover popular cells.
     """
-    import random, sys
-    from math import ceil
-
     all_cells = [(x, y) for x in range(N) for y in range(M)]
     metro_lines = []
     popular_cells = []
@@ -174,7 +206,7 @@ def generate_unsat_instance(N, M, K, J, P):
         metro_lines = [{'start': s, 'end': e}] + metro_lines
         # Popular cells: pick unused cells if possible
         pool = [p for p in all_cells if p not in used]
-        popular_cells = random.sample(pool, min(len(pool), P)) if P else []
+        popular_cells = rng.sample(pool, min(len(pool), P)) if P else []
         return {'metro_lines': metro_lines, 'popular_cells': popular_cells}
 
     # 2. Overpack for any J
@@ -184,18 +216,18 @@ def generate_unsat_instance(N, M, K, J, P):
     max_possible_lines = (N * M) // min_cells_per_line
     if K > max_possible_lines:
         # Can't fit: place random unique endpoints.
-        points = random.sample(all_cells, 2 * K)
+        points = rng.sample(all_cells, 2 * K)
         for i in range(K):
             metro_lines.append({'start': points[2 * i], 'end': points[2 * i + 1]})
         # Popular cells: all other unused cells
         used = set(points)
         pool = [p for p in all_cells if p not in used]
-        popular_cells = random.sample(pool, min(len(pool), P)) if P else []
+        popular_cells = rng.sample(pool, min(len(pool), P)) if P else []
         return {'metro_lines': metro_lines, 'popular_cells': popular_cells}
 
     # 3. Scenario 2: Impossible coverage
     # Pick popular cells outside all possible paths.
-    points = random.sample(all_cells, 2 * K)
+    points = rng.sample(all_cells, 2 * K)
     metro_lines = [{'start': points[2 * i], 'end': points[2 * i + 1]} for i in range(K)]
     # Let's pick the top-left K cells as the only line start/ends; put all popular cells in the bottom right block
     coverable = set()
@@ -209,14 +241,20 @@ def generate_unsat_instance(N, M, K, J, P):
     if len(pool) < P:
         # If not enough, repeat some or fill with arbitrary
         pool = all_cells[:]
-    popular_cells = random.sample(pool, min(len(pool), P)) if P else []
+    popular_cells = rng.sample(pool, min(len(pool), P)) if P else []
     return {'metro_lines': metro_lines, 'popular_cells': popular_cells}
 
 
 def write_city_file(filepath, N, M, K, J, P, metro_lines, popular_cells):
-    """Writes the generated instance to a .city file."""
+    """
+    Writes the generated instance to a .city file. The file is written under a
+    temporary name and renamed, so readers never see a partial city. Raises
+    OSError if it cannot be written (this may run in a worker process, so it
+    does not exit).
+    """
+    tmp_path = f"{filepath}.tmp{os.getpid()}"
     try:
-        with open(filepath, 'w') as f:
+        with open(tmp_path, 'w') as f:
             scenario = 2 if P > 0 else 1
             f.write(f"{scenario}\n")
 
@@ -230,9 +268,45 @@ def write_city_file(filepath, N, M, K, J, P, metro_lines, popular_cells):
 
             if scenario == 2:
                 f.write(" ".join(f"{x} {y}" for x, y in popular_cells) + "\n")
-    except IOError as e:
-        print(f"Error writing to file '{filepath}': {e}", file=sys.stderr)
-        sys.exit(1)
+        os.replace(tmp_path, filepath)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+GENERATORS = {
+    'constructive': generate_satisfiable_instance,
+    'random': generate_random_instance,
+    'unsat': generate_unsat_instance,
+    'huge': generate_huge_instance,
+}
+
+
+def instance_seed(base_seed, index):
+    """Independent 64-bit seed for instance `index`, derived only from (base_seed, index)."""
+    digest = hashlib.sha256(f"{base_seed}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def generate_to_file(task):
+    """
+    Generates and writes one instance. `task` is (filepath, mode, N, M, K, J, P, seed).
+    Returns (filepath, error message or None); runs in worker processes.
+    """
+    filepath, mode, N, M, K, J, P, seed = task
+    try:
+        instance = GENERATORS[mode](N, M, K, J, P, random.Random(seed))
+    except SystemExit:
+        return filepath, "generation failed (see messages above)"
+    # P might be adjusted in constructive mode if space is tight
+    P_final = instance.get('P', P)
+    try:
+        write_city_file(filepath, N, M, K, J, P_final,
+                        instance['metro_lines'], instance['popular_cells'])
+    except OSError as e:
+        return filepath, f"cannot write the file: {e}"
+    return filepath, None
 
 
 def main():
@@ -247,9 +321,12 @@ def main():
     parser.add_argument("--J", type=int, required=True, help="Maximum turns per line.")
     parser.add_argument("--P", type=int, default=0, help="Number of popular cells (for Scenario 2).")
     parser.add_argument("--count", type=int, default=1, help="Number of instances to generate.")
-    parser.add_argument("--mode", choices=["constructive", "random", "unsat"], default="constructive",
-                        help="constructive=SAT, random=mixed, unsat=deliberate UNSAT.")
+    parser.add_argument("--mode", choices=["constructive", "random", "unsat", "huge"], default="constructive",
+                        help="constructive=SAT, random=mixed, unsat=deliberate UNSAT,\n"
+                             "huge=SAT with compact grid state for very large cities.")
     parser.add_argument("--seed", type=int, help="Random seed for reproducibility.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes. Output does not depend on this value.")
     parser.add_argument("--outdir", default="./Assets/", help="Output directory.")
     # parser.add_argument("--prefix", default="case", help="Filename prefix.")
 
@@ -261,35 +338,41 @@ def main():
         file_name=f"{args.N}_{args.M}_{args.J}_{args.P}"
         args.outdir+=f"2_{args.K}"
 
-    
-    if args.seed is not None:
-        random.seed(args.seed)
+    # Every instance gets its own RNG seeded from (seed, index), so the files do
+    # not depend on generation order or on the number of workers.
+    base_seed = args.seed
+    if base_seed is None:
+        base_seed = random.SystemRandom().getrandbits(32)
+        print(f"Using seed {base_seed}")
 
     os.makedirs(args.outdir, exist_ok=True)
 
+    tasks = []
     for i in range(args.count):
         if(args.count==1):
-            file_name+=".city"
+            name = file_name + ".city"
         else:
-            file_name+=f"_{i+1}.city"
-        filepath = os.path.join(args.outdir,file_name)
-        instance = None
-
-        if args.mode == 'constructive':
-            instance = generate_satisfiable_instance(args.N, args.M, args.K, args.J, args.P)
-        elif args.mode == 'unsat':
-            instance = generate_unsat_instance(args.N, args.M, args.K, args.J, args.P)
-        else:  # random
-            instance = generate_random_instance(args.N, args.M, args.K, args.J, args.P)
-
-        # P might be adjusted in constructive mode if space is tight
-        P_final = instance.get('P', args.P)
-
-        write_city_file(filepath, args.N, args.M, args.K, args.J, P_final,
-                        instance['metro_lines'], instance['popular_cells'])
+            name = file_name + f"_{i+1}.city"
+        filepath = os.path.join(args.outdir, name)
+        tasks.append((filepath, args.mode, args.N, args.M, args.K, args.J, args.P,
+                      instance_seed(base_seed, i)))
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(generate_to_file, tasks, chunksize=max(1, len(tasks) // (4 * args.workers))))
+    else:
+        results = map(generate_to_file, tasks)
 
-        print(f"Successfully generated '{args.mode}' test case: {filepath}")
+    failed = False
+    for filepath, error in results:
+        if error is None:
+            print(f"Successfully generated '{args.mode}' test case: {filepath}")
+        else:
+            print(f"Error: {filepath}: {error}", file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
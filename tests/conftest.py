@@ -0,0 +1,12 @@
+import glob
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ASSET_CITIES = sorted(glob.glob(os.path.join(ROOT, "Assets", "*", "*.city")))
+
+
+def city_id(path):
+    return os.path.relpath(path, os.path.join(ROOT, "Assets"))[:-len(".city")]
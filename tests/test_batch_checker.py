@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from conftest import ASSET_CITIES, city_id
+from batch_checker import check_metromap
+from city_parser import parse_city
+from format_checker import analyze_constraints, parse_metromap
+from pipeline import run_pipeline
+
+
+def variants(moves):
+    """The map itself and a few broken copies of it."""
+    yield moves
+    yield [m[:-1] for m in moves]                    # every line stops one cell short
+    yield [['R' if d == 'L' else d for d in m] for m in moves]
+    yield [m + ['L', 'R'] for m in moves]            # walks back over itself
+    yield moves[::-1]
+    yield [m * 2 for m in moves]                     # leaves the grid or revisits cells
+
+
+def maps_for(path):
+    spec = parse_city(path)
+    result = run_pipeline(spec, route=False)
+    if result.moves is not None:
+        yield from variants(result.moves)
+    committed = path[:-len(".city")] + ".metromap"
+    if os.path.exists(committed):
+        state, moves = parse_metromap(committed)
+        if state != 'UNSAT':
+            yield from variants(moves)
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_batch_checker_matches_analyze_constraints(path):
+    spec = parse_city(path)
+    for moves in maps_for(path):
+        report = analyze_constraints(spec, moves)
+        row = check_metromap(spec, moves)
+        assert [row['c1'], row['c2'], row['c3'], row['c4']] == [
+            report[c]['valid'] for c in ('c1', 'c2', 'c3', 'c4')], moves
+        assert (row['status'] == 'VALID') == report['final_valid']
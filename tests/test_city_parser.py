@@ -0,0 +1,40 @@
+import json
+import os
+
+import pytest
+
+from conftest import ASSET_CITIES, city_id
+from city_parser import SpecCache, parse_city, parse_city_text
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_spec_cache_round_trip(path, tmp_path):
+    spec = parse_city(path)
+    cache = SpecCache(str(tmp_path))
+    assert parse_city(path, cache=cache) == spec  # miss: parsed and stored
+    assert parse_city(path, cache=cache) == spec  # hit by (path, mtime, size)
+    assert parse_city(path, cache=SpecCache(str(tmp_path))) == spec
+
+
+def test_spec_cache_ignores_malformed_entries(tmp_path):
+    path = ASSET_CITIES[0]
+    spec = parse_city(path)
+    cache = SpecCache(str(tmp_path))
+    parse_city(path, cache=cache)
+    for name in os.listdir(tmp_path):
+        with open(tmp_path / name) as f:
+            entry = json.load(f)
+        if isinstance(entry, list):
+            entry[6] = [[-1, 0]] * len(entry[6])
+        else:
+            entry = {"not": "a digest"}
+        with open(tmp_path / name, 'w') as f:
+            json.dump(entry, f)
+    assert parse_city(path, cache=cache) == spec
+
+
+def test_truncated_file_reports_the_first_missing_record():
+    with pytest.raises(ValueError, match="expected 4 integers"):
+        parse_city_text("1\n4 4 2 1\n0 0\n")
+    with pytest.raises(ValueError, match="file ended early"):
+        parse_city_text("1\n4 4 2 1\n0 0 1 1\n")
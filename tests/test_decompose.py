@@ -0,0 +1,28 @@
+import pytest
+
+from city_parser import MetroSpec, parse_city
+from conftest import ASSET_CITIES, city_id
+from decompose import interaction_components, line_regions, solve_decomposed
+from format_checker import analyze_constraints
+from pipeline import run_pipeline
+
+pytest.importorskip("pysat.solvers")
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_decomposed_matches_eager_verdict(path):
+    spec = parse_city(path)
+    result = solve_decomposed(spec, backend='pysat', timeout=60)
+    assert result.status == run_pipeline(spec, backend='pysat', route=False).status
+    if result.status == 'VALID':
+        assert analyze_constraints(spec, result.moves)['final_valid']
+
+
+def test_components_are_merged_into_one_valid_map():
+    # Two lines side by side on the left, one far away on the right
+    spec = MetroSpec(2, 30, 10, 3, 2, 2, [(0, 0), (2, 0), (25, 0)], [(1, 9), (3, 9), (25, 9)],
+                     [(1, 5), (24, 4)])
+    assert len(interaction_components(line_regions(spec))) == 2
+    result = solve_decomposed(spec, backend='pysat', workers=2)
+    assert result.status == 'VALID', result.detail
+    assert analyze_constraints(spec, result.moves)['final_valid']
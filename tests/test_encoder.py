@@ -0,0 +1,88 @@
+import itertools
+import os
+
+import pytest
+
+from conftest import ROOT
+from city_parser import MetroSpec, parse_city
+from decoder import DIR_STEP, DIRECTIONS
+from encoder import at_most_J_turns, encode_to_sat, metro_rail_direction, popular_clauses
+from memory_guard import VarMap
+from pipeline import run_pipeline
+from sat_solver import clause_lists
+
+pysat = pytest.importorskip("pysat.solvers")
+
+
+def satisfiable(clauses, assumptions):
+    with pysat.Minisat22(bootstrap_with=clause_lists(clauses)) as solver:
+        return solver.solve(assumptions=assumptions)
+
+
+@pytest.mark.parametrize("J", [0, 1, 2, 3])
+def test_at_most_J_turns_allows_exactly_J(J):
+    turns = list(range(1, 6))
+    clauses, largest = at_most_J_turns(turns, J)
+    assert largest >= max(turns)
+    for true in itertools.product((False, True), repeat=len(turns)):
+        assumptions = [v if t else -v for v, t in zip(turns, true)]
+        assert satisfiable(clauses, assumptions) == (sum(true) <= J)
+
+
+@pytest.mark.parametrize("n, J", [(3, 3), (2, 5), (4, 0)])
+def test_at_most_J_turns_short_cases_return_a_pair(n, J):
+    turns = list(range(1, n + 1))
+    clauses, largest = at_most_J_turns(turns, J)
+    assert largest == n
+    assert clauses == ({(-v,) for v in turns} if J == 0 else set())
+
+
+def line_assumptions(spec, var_id, moves):
+    """Directions of line 0 fixed to `moves` from its start, every other one false."""
+    x, y = spec.starts[0]
+    taken = {}
+    for move in moves:
+        taken[(x, y)] = move
+        dx, dy = DIR_STEP[DIRECTIONS.index(move)]
+        x, y = x + dx, y + dy
+    assert (x, y) == spec.ends[0]
+    return [var_id[(0, cx, cy, d)] if taken.get((cx, cy)) == d else -var_id[(0, cx, cy, d)]
+            for cx in range(spec.N) for cy in range(spec.M) for d in DIRECTIONS]
+
+
+@pytest.mark.parametrize("moves, turns", [
+    ("RRDDDDDRRR", 2),
+    ("RRDDRRRDDD", 3),
+])
+def test_encoding_allows_J_turns_and_no_more(moves, turns):
+    spec = MetroSpec(1, 6, 6, 1, 2, 0, [(0, 0)], [(5, 5)], [])
+    num_vars, clauses, var_id = encode_to_sat(spec, return_var_id=True)
+    assert satisfiable(clauses, line_assumptions(spec, var_id, moves)) == (turns <= spec.J)
+
+
+POPULAR_CITY = MetroSpec(2, 6, 6, 2, 2, 3, [(0, 0), (0, 5)], [(5, 0), (5, 5)], [(2, 2), (3, 4), (5, 0)])
+
+
+def test_popular_clauses_cover_each_cell_not_an_endpoint():
+    clauses = set()
+    next_id = popular_clauses(POPULAR_CITY, VarMap(POPULAR_CITY), 1000, clauses)
+    # (5, 0) is an end and gets nothing
+    P, K = 2, POPULAR_CITY.K
+    assert next_id == 1000 + P
+    assert len(clauses) == P * (4 * K + 2)
+    assert {(1000,), (1001,)} <= clauses
+    covered = {v for clause in clauses for v in map(abs, clause) if v < 1000}
+    assert covered == {VarMap(POPULAR_CITY)[(k, x, y, d)] for k in range(K) for (x, y) in [(2, 2), (3, 4)]
+                       for d in metro_rail_direction}
+
+
+def test_popular_clauses_only_in_scenario_2():
+    clauses = set()
+    assert popular_clauses(POPULAR_CITY._replace(scenario=1), VarMap(POPULAR_CITY), 7, clauses) == 7
+    assert not clauses
+
+
+def test_popular_city_is_valid():
+    spec = parse_city(os.path.join(ROOT, "Assets", "2_4", "10_10_2_3.city"))
+    result = run_pipeline(spec, route=False)
+    assert result.status == 'VALID', result.detail
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+
+import pipeline
+from city_parser import parse_city
+from conftest import ROOT
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_spill_file_removed_when_solve_is_interrupted(tmp_path, monkeypatch):
+    spec = parse_city(os.path.join(ROOT, "Assets", "1_8", "10_10_3.city"))
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    def interrupted(*args, **kwargs):
+        raise Interrupted
+
+    monkeypatch.setattr(pipeline, "solve_cnf", interrupted)
+    with pytest.raises(Interrupted) as caught:
+        # A 0 MB ceiling forces the DiskClauseSink
+        pipeline.run_pipeline(spec, route=False, memory_limit_mb=0)
+    # The traceback keeps the sink alive, so its __del__ cannot be what removed the file
+    assert caught.traceback
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import ASSET_CITIES, city_id
+from city_parser import parse_city
+from phase_seeding import seed_paths, seed_phases
+from pipeline import encode_quietly, run_pipeline
+from sat_solver import clause_lists
+
+pysat = pytest.importorskip("pysat.solvers")
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_seeding_keeps_the_verdict(path):
+    spec = parse_city(path)
+    plain = run_pipeline(spec, backend='pysat', route=False)
+    seeded = run_pipeline(spec, backend='pysat', route=False, seed_phases=True)
+    assert seeded.status == plain.status
+    assert seeded.status in ('VALID', 'UNSAT')
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_disjoint_seed_solves_without_conflicts(path):
+    spec = parse_city(path)
+    paths = seed_paths(spec)
+    cells = [cell for p in paths if p is not None for cell in p]
+    if None in paths or len(cells) != len(set(cells)) or spec.scenario == 2:
+        pytest.skip("seed paths do not form a map")
+    num_vars, clauses, _, var_id = encode_quietly(spec, return_var_id=True)
+    with pysat.Minisat22(bootstrap_with=clause_lists(clauses)) as solver:
+        solver.set_phases(seed_phases(spec, var_id))
+        assert solver.solve()
+        assert solver.accum_stats()['conflicts'] == 0
+
+
+def test_memory_guard_variable_map_gives_the_same_phases():
+    spec = parse_city(ASSET_CITIES[-1])
+    *_, var_id = encode_quietly(spec, return_var_id=True)
+    *_, var_map = encode_quietly(spec, 0.0001, return_var_id=True)
+    assert seed_phases(spec, var_map) == seed_phases(spec, var_id)
@@ -0,0 +1,19 @@
+import pytest
+
+from conftest import ASSET_CITIES, city_id
+from city_parser import parse_city
+from format_checker import analyze_constraints
+from pipeline import run_pipeline
+from router import route_all
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_router_and_sat_agree(path):
+    spec = parse_city(path)
+    routed = route_all(spec)
+    solved = run_pipeline(spec, route=False)
+    if routed is not None:
+        assert analyze_constraints(spec, routed)['final_valid']
+        assert solved.status == 'VALID'
+    assert solved.status in ('VALID', 'UNSAT')
+    assert run_pipeline(spec, route=True).status == solved.status
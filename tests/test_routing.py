@@ -0,0 +1,74 @@
+import random
+from collections import deque
+
+import pytest
+
+from conftest import ASSET_CITIES, city_id
+from city_parser import parse_city
+from routing import HEADINGS, find_path
+
+
+def reference_path(N, M, J, grid, start, end):
+    """The search testcase_gen.find_path_bfs did before routing.py (paths copied per entry)."""
+    if start == end:
+        return [start]
+    queue = deque([(start, [start], 0, None)])
+    visited = {(start, 0, None): 0}
+    while queue:
+        pos, path, turns, last_dir = queue.popleft()
+        if pos == end:
+            return path
+        for direction, (dx, dy) in {'R': (1, 0), 'L': (-1, 0), 'D': (0, 1), 'U': (0, -1)}.items():
+            nx, ny = pos[0] + dx, pos[1] + dy
+            if not (0 <= nx < N and 0 <= ny < M):
+                continue
+            if grid[nx][ny] and (nx, ny) != end:
+                continue
+            new_turns = turns + (1 if last_dir is not None and direction != last_dir else 0)
+            if new_turns > J:
+                continue
+            new_path = path + [(nx, ny)]
+            key = ((nx, ny), new_turns, direction)
+            if key in visited and visited[key] <= len(new_path):
+                continue
+            visited[key] = len(new_path)
+            queue.append(((nx, ny), new_path, new_turns, direction))
+    return None
+
+
+def assert_same_search(N, M, J, grid, start, end):
+    blocked = bytearray(cell for column in grid for cell in column)
+    path = find_path(N, M, J, blocked, start, end)
+    expected = reference_path(N, M, J, grid, start, end)
+    if expected is None:
+        assert path is None
+        return
+    assert path is not None and len(path) == len(expected)
+    assert path[0] == start and path[-1] == end
+    steps = [(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(path, path[1:])]
+    assert all(step in HEADINGS for step in steps)
+    assert sum(a != b for a, b in zip(steps, steps[1:])) <= J
+    assert not any(grid[x][y] for (x, y) in path[1:-1])
+
+
+@pytest.mark.parametrize("path", ASSET_CITIES, ids=city_id)
+def test_find_path_matches_reference_on_assets(path):
+    spec = parse_city(path)
+    for k in range(spec.K):
+        grid = [[False] * spec.M for _ in range(spec.N)]
+        for j in range(spec.K):
+            if j != k:
+                for (x, y) in (spec.starts[j], spec.ends[j]):
+                    grid[x][y] = True
+        assert_same_search(spec.N, spec.M, spec.J, grid, spec.starts[k], spec.ends[k])
+
+
+def test_find_path_matches_reference_on_random_grids():
+    rng = random.Random(32)
+    for _ in range(300):
+        N, M, J = rng.randint(1, 9), rng.randint(1, 9), rng.randint(0, 4)
+        grid = [[rng.random() < 0.3 for _ in range(M)] for _ in range(N)]
+        start = (rng.randrange(N), rng.randrange(M))
+        end = (rng.randrange(N), rng.randrange(M))
+        grid[start[0]][start[1]] = False
+        assert_same_search(N, M, J, grid, start, end)
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from city_parser import MetroSpec, parse_city
+from conftest import ROOT
+from format_checker import analyze_constraints
+from pipeline import run_pipeline
+from solution_cache import (SolutionCache, from_canonical, symmetries, to_canonical, transform_cell,
+                            transform_direction)
+
+SQUARE = parse_city(os.path.join(ROOT, "Assets", "1_8", "10_10_3.city"))
+NON_SQUARE = MetroSpec(2, 7, 5, 3, 2, 2, [(0, 0), (0, 2), (0, 4)], [(6, 1), (6, 2), (6, 3)],
+                       [(3, 1), (2, 3)])  # no symmetry of its own, so the maps must match exactly
+
+
+def transformed(spec, g):
+    """`spec` under symmetry g, with its lines in reverse order."""
+    def cells(points):
+        return [transform_cell(g, spec.N, spec.M, p) for p in points]
+    N, M = (spec.M, spec.N) if g[0] else (spec.N, spec.M)
+    return spec._replace(N=N, M=M, starts=cells(spec.starts)[::-1], ends=cells(spec.ends)[::-1],
+                         popular=cells(spec.popular))
+
+
+@pytest.mark.parametrize("spec, count", [(SQUARE, 8), (NON_SQUARE, 4)], ids=["square", "non-square"])
+def test_canonical_round_trip_over_every_symmetry(spec, count):
+    moves = run_pipeline(spec, route=False).moves
+    assert moves is not None
+    canonical = to_canonical(spec, moves)
+    assert from_canonical(spec, canonical) == moves
+    assert len(symmetries(spec.N, spec.M)) == count
+    for g in symmetries(spec.N, spec.M):
+        image = transformed(spec, g)
+        image_moves = [[transform_direction(g, d) for d in line] for line in moves][::-1]
+        assert analyze_constraints(image, image_moves)['final_valid']
+        assert to_canonical(image, image_moves) == canonical
+        served = from_canonical(image, canonical)
+        assert analyze_constraints(image, served)['final_valid']
+        assert served == image_moves
+
+
+def test_malformed_entry_is_a_miss_and_removed(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    cache.put(SQUARE, 'UNSAT')
+    (path,) = tmp_path.iterdir()
+    path.write_text(json.dumps({'verdict': 'UNSAT'}))
+    assert cache.get(SQUARE) is None
+    assert not path.exists()
+
+
+def test_restoring_an_entry_keeps_its_age(tmp_path):
+    cache = SolutionCache(str(tmp_path), max_age=60)
+    cache.put(SQUARE, 'UNSAT')
+    (path,) = tmp_path.iterdir()
+    entry = json.loads(path.read_text())
+    entry['created'] -= 3600
+    path.write_text(json.dumps(entry))
+    cache.put(SQUARE, 'UNSAT')
+    assert cache.get(SQUARE) is None
@@ -0,0 +1,49 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from city_parser import MetroSpec
+from format_checker import parse_metromap
+from visualize_tiles import downsample, iter_metromap, write_svg
+
+METROMAPS = sorted(glob.glob(os.path.join(ROOT, "Assets", "*", "*.metromap")))
+
+
+def test_downsample_keeps_a_whole_pixel():
+    red, green = (228, 26, 28), (77, 175, 74)
+    child = np.full((2, 2, 3), 255, dtype=np.uint8)
+    child[0, 0] = red
+    child[1, 1] = green
+    parent = downsample({(0, 0): child}, 2)
+    # The per-channel minimum would be (77, 26, 28), a colour of neither line
+    assert tuple(parent[0, 0]) == red
+    assert tuple(parent[1, 1]) == (255, 255, 255)
+
+
+@pytest.mark.parametrize("path", METROMAPS, ids=lambda path: os.path.relpath(path, ROOT))
+def test_iter_metromap_matches_parse_metromap(path):
+    state, moves = parse_metromap(path)
+    assert list(iter_metromap(path)) == ([] if state == 'UNSAT' else moves)
+
+
+SVG_CITY = MetroSpec(1, 3, 3, 1, 0, 0, [(0, 0)], [(2, 0)], [])
+
+
+def test_write_svg_reports_the_open_error(tmp_path):
+    with pytest.raises(FileNotFoundError) as caught:
+        write_svg(str(tmp_path / "missing" / "city"), SVG_CITY, [["R", "R"]])
+    # Not an error from removing the temporary file that was never created
+    assert caught.value.__context__ is None
+
+
+def test_write_svg_leaves_nothing_on_failure(tmp_path):
+    def moves():
+        yield ["R", "R"]
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        write_svg(str(tmp_path / "city"), SVG_CITY, moves())
+    assert os.listdir(tmp_path) == []
@@ -1,6 +1,8 @@
+import os
 import sys
-import matplotlib.pyplot as plt
-from collections import namedtuple
+import numpy as np
+
+from city_parser import MetroSpec, parse_city
 
 # Direction vectors for each move character
 MOVE = {
@@ -10,102 +12,12 @@ MOVE = {
     'R': (1, 0)
 }
 
-MetroSpec = namedtuple(
-    'MetroSpec', ['scenario', 'N', 'M', 'K', 'J', 'P', 'starts', 'ends', 'popular']
-)
-
-def parse_city(path):
-    """
-    Parses the .city file and returns a MetroSpec.
-    """
-    try:
-        with open(path, 'r') as f:
-            raw = [ln.rstrip('\n') for ln in f.readlines()]
-    except Exception as e:
-        raise ValueError("Failed reading city file %r: %s" % (path, e))
-    if not raw:
-        raise ValueError("Empty city file: %s" % path)
-    i = 0
-    while i < len(raw) and raw[i].strip() == '':
-        i += 1
-    if i >= len(raw):
-        raise ValueError("City file contains only whitespace")
-    first = raw[i].strip()
-    if first not in ('1', '2'):
-        raise ValueError(
-            "First non-empty line must be '1' or '2' (scenario); got: %r" % first)
-    scenario = int(first)
-    i += 1
-    while i < len(raw) and raw[i].strip() == '':
-        i += 1
-    if i >= len(raw):
-        raise ValueError("Missing second line with grid params (N M K J [P])")
-    params = raw[i].split()
-    i += 1
-    if scenario == 1:
-        if len(params) != 4:
-            raise ValueError(
-                "Scenario 1 expects 4 ints on second line: N M K J")
-        N, M, K, J = map(int, params)
-        P = 0
-    else:
-        if len(params) != 5:
-            raise ValueError(
-                "Scenario 2 expects 5 ints on second line: N M K J P")
-        N, M, K, J, P = map(int, params)
-    if N <= 0 or M <= 0 or K < 0 or J < 0 or P < 0:
-        raise ValueError("Invalid numeric values in header")
-    starts = []
-    ends = []
-    for lineno in range(K):
-        while i < len(raw) and raw[i].strip() == '':
-            i += 1
-        if i >= len(raw):
-            raise ValueError(
-                "Expected %d metro lines but file ended early" % K)
-        toks = raw[i].split()
-        i += 1
-        if len(toks) != 4:
-            raise ValueError(
-                "Metro line %d: expected 4 integers (sx sy ex ey)" % lineno)
-        sx, sy, ex, ey = map(int, toks)
-        if not (0 <= sx < N and 0 <= ex < N and 0 <= sy < M and 0 <= ey < M):
-            raise ValueError("Metro %d coordinates out of bounds: %r" %
-                             (lineno, (sx, sy, ex, ey)))
-        starts.append((sx, sy))
-        ends.append((ex, ey))
-    popular = []
-    if scenario == 2:
-        while i < len(raw) and raw[i].strip() == '':
-            i += 1
-        if i >= len(raw):
-            raise ValueError("Scenario 2: missing line with popular cells")
-        toks = raw[i].split()
-        i += 1
-        if len(toks) != 2 * P:
-            raise ValueError(
-                "Scenario 2: expected %d tokens for %d popular cells, got %d" % (2 * P, P, len(toks)))
-        coords = list(map(int, toks))
-        for pidx in range(P):
-            x = coords[2 * pidx]
-            y = coords[2 * pidx + 1]
-            if not (0 <= x < N and 0 <= y < M):
-                raise ValueError(
-                    "Popular cell %d out of bounds: (%d,%d)" % (pidx, x, y))
-            popular.append((x, y))
-    if len(set(starts)) != len(starts):
-        raise ValueError("Duplicate start locations in city file")
-    if len(set(ends)) != len(ends):
-        raise ValueError("Duplicate end locations in city file")
-    if set(starts).intersection(set(ends)):
-        raise ValueError(
-            "Some start equals some end location (all starts & ends must be unique)")
-    return MetroSpec(scenario=scenario, N=N, M=M, K=K, J=J, P=P, starts=starts, ends=ends, popular=popular)
-
 def get_assignments(path):
     """
     Reads the SAT output file and returns positive variable assignments.
     """
+    if not os.path.exists(path):
+        return []  # Routed without SAT (see router.py)
     try:
         with open(path, 'r') as f:
             lines = [ln.strip() for ln in f if ln.strip()]
@@ -175,7 +87,6 @@ def plot_grid(ax, grid):
     for x in range(n_cols + 1):
         ax.axvline(x, color='black', linewidth=1)
     for y in range(n_rows + 1):
-        ax.axvline(y, color='black', linewidth=1)
         ax.hlines(y, 0, n_cols, color='black', linewidth=1)
 
     # Place each value at the center of its cell
@@ -203,7 +114,6 @@ def read_metromap_file(metromap_path):
 
     paths = []
     for line in lines:
-        print(line)
         parts = line.split()
         if parts[-1] == '0':
             parts = parts[:-1]
@@ -284,56 +194,171 @@ def plot_metrolines(ax, base_name, spec, metro_paths):
     # ax.legend()
     ax.set_title(f"Metro Lines for {base_name}")
 
-def visualize_both(base_name):
+# Above FAST_THRESHOLD cells visualize_both switches to the raster renderer;
+# at or below LABEL_THRESHOLD cells the raster renderer still writes text labels.
+FAST_THRESHOLD = 50 * 50
+LABEL_THRESHOLD = 30 * 30
+
+LINE_COLORS = ["red", "blue", "green", "purple", "orange", "brown", "black", "pink"]
+DIR_LETTERS = "LRUD"
+DIR_SHADE = np.array([1.0, 0.8, 0.65, 0.5])  # Brightness of L, R, U, D cells
+
+
+def decode_to_arrays(spec, positive_vars):
+    """
+    Decodes positive SAT variables into two (M, N) arrays: the line index
+    owning each cell (-1 for none) and its direction index into "LRUD".
+    """
+    owner = np.full((spec.M, spec.N), -1, dtype=np.int32)
+    direction = np.zeros((spec.M, spec.N), dtype=np.int8)
+    v = np.asarray(positive_vars, dtype=np.int64)
+    v = v[(v > 0) & (v <= spec.K * spec.N * spec.M * 4)] - 1
+    k, rest = np.divmod(v, spec.N * spec.M * 4)
+    cell, d = np.divmod(rest, 4)
+    x, y = np.divmod(cell, spec.M)
+    owner[y, x] = k
+    direction[y, x] = d
+    return owner, direction
+
+
+def plot_grid_fast(ax, spec, owner, direction):
+    """
+    Raster version of plot_grid: one imshow of the owner/direction arrays,
+    colored by line and shaded by direction.
+    """
+    from matplotlib.colors import to_rgb
+
+    palette = np.array([to_rgb(c) for c in LINE_COLORS])
+    rgb = np.ones(owner.shape + (3,))
+    used = owner >= 0
+    rgb[used] = palette[(owner[used] + 1) % len(LINE_COLORS)] * DIR_SHADE[direction[used], None]
+    ax.imshow(rgb, extent=(0, spec.N, spec.M, 0), interpolation='nearest')
+
+    if spec.N * spec.M <= LABEL_THRESHOLD:
+        for y, x in zip(*np.nonzero(used)):
+            ax.text(x + 0.5, y + 0.5, f"{owner[y, x] + 1}:{DIR_LETTERS[direction[y, x]]}",
+                    va='center', ha='center', fontsize=8)
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_title("SAT Variable Assignment Grid")
+
+
+def plot_metrolines_fast(ax, base_name, spec, metro_paths):
+    """
+    Raster-friendly version of plot_metrolines: every route goes into one
+    LineCollection and every start/end/popular marker into one scatter.
+    """
+    from matplotlib.collections import LineCollection
+
+    N, M = spec.N, spec.M
+    verdict, color = ('UNSAT', 'red') if metro_paths is None else ('SAT', 'green')
+    ax.text(0.95, 0.95, verdict, transform=ax.transAxes, bbox=dict(facecolor=color, alpha=0.6),
+            ha='right', va='top', fontsize=9, weight="bold", color="w")
+    ax.text(0.05, 0.95, f'| N: {spec.N} | M: {spec.M} | K: {spec.K} | J: {spec.J} | P: {spec.P} |',
+            transform=ax.transAxes, bbox=dict(facecolor='blue', alpha=0.5), ha='left', va='top',
+            fontsize=9, weight="bold", color="w")
+    small = N * M <= LABEL_THRESHOLD
+
+    if small:
+        grid = [[(x, 0), (x, M)] for x in range(N + 1)] + [[(0, y), (N, y)] for y in range(M + 1)]
+        ax.add_collection(LineCollection(grid, colors='lightgray', linewidths=0.7))
+
+    routes = []
+    route_colors = []
+    for i, dirs in enumerate(metro_paths or []):
+        steps = np.array([MOVE[d] for d in dirs], dtype=np.int64).reshape(-1, 2)
+        points = np.vstack([[spec.starts[i]], spec.starts[i] + np.cumsum(steps, axis=0)])
+        routes.append(points)
+        route_colors.append(LINE_COLORS[(i + 1) % len(LINE_COLORS)])
+    if routes:
+        ax.add_collection(LineCollection(routes, colors=route_colors, linewidths=1.5 if small else 0.8))
+
+    markers = list(spec.starts) + list(spec.ends) + list(spec.popular)
+    if markers:
+        marker_colors = (["blue"] * len(spec.starts) + ["red"] * len(spec.ends)
+                         + ["cyan"] * len(spec.popular))
+        xy = np.array(markers)
+        ax.scatter(xy[:, 0], xy[:, 1], s=80 if small else 4, c=marker_colors, zorder=3)
+    if small:
+        for prefix, points, color in (("S", spec.starts, "blue"), ("E", spec.ends, "red"),
+                                      ("P", spec.popular, "cyan")):
+            for i, (x, y) in enumerate(points):
+                ax.text(x, y, f"{prefix}{i+1}", color=color, fontsize=9, ha="right", va="bottom",
+                        weight='bold')
+
+    ax.set_xlim(-0.5, N + 0.5)
+    ax.set_ylim(M + 0.5, -0.5)  # Inverted y-axis for visual alignment
+    ax.set_aspect('equal')
+    ax.set_title(f"Metro Lines for {base_name}")
+
+def render_to_axes(base_name, ax1, ax2, fast=None):
     """
-    Creates both visualizations side by side.
+    Draws both visualizations of <base_name> onto the given axes and returns
+    the MetroSpec. fast=True uses the raster renderer, False the per-cell one
+    and None picks the raster renderer for grids above FAST_THRESHOLD cells.
     """
     city_file = base_name + ".city"
     satoutput_file = base_name + ".satoutput"
     metromap_file = base_name + ".metromap"
-    # metromap_file="temp.metromap"
 
-    try:
-        # Parse city file
-        spec = parse_city(city_file)
-        print(spec)
-        # spec=MetroSpec(1,4,4,1,1,0,[(0,0)],[(3,3)],[])
-        
-        # Get SAT assignments and decode to grid
-        assignments = get_assignments(satoutput_file)
-        # assignments=[2,18,34,52,56,60]
+    # Parse city file
+    spec = parse_city(city_file)
+
+    # Get SAT assignments and read metro paths
+    assignments = get_assignments(satoutput_file)
+    metro_paths = read_metromap_file(metromap_file)
+
+    draw_to_axes(base_name, ax1, ax2, spec, assignments, metro_paths, fast)
+    return spec
+
+
+def draw_to_axes(base_name, ax1, ax2, spec, assignments, metro_paths, fast=None):
+    """
+    Draws both visualizations from in-memory data: the positive SAT variables
+    and the metro paths (lists of direction letters, or None for UNSAT).
+    """
+    if fast is None:
+        fast = spec.N * spec.M > FAST_THRESHOLD
+
+    if fast:
+        owner, direction = decode_to_arrays(spec, assignments)
+        plot_grid_fast(ax1, spec, owner, direction)
+        plot_metrolines_fast(ax2, base_name, spec, metro_paths)
+    else:
         grid = decode_to_grid(spec, assignments)
-        
+
         if(spec.scenario==2):
             for i,(px,py) in enumerate(spec.popular):
                 grid[py][px]=f"P:{i+1} | "+grid[py][px] +" |"
-        # print(grid)
-        # Read metro paths
-        metro_paths = read_metromap_file(metromap_file)
-
-        # Create figure with two subplots
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
         # Plot decoded grid on left
         plot_grid(ax1, grid)
 
         # Plot metro lines on right
-        # if metro_paths is None or not assignments:
-        #     ax2.text(0.5, 0.5, "Unsatisfiable problem\nor no metro paths found",
-        #             ha='center', va='center', fontsize=12)
-        #     ax2.set_xlim(0, 1)
-        #     ax2.set_ylim(0, 1)
-        #     ax2.axis('off')
-        # else:
-            # plot_metrolines(ax2, base_name, spec, metro_paths)
         plot_metrolines(ax2, base_name, spec, metro_paths)
+
+
+def visualize_both(base_name, fast=None, show=True):
+    """
+    Creates both visualizations side by side, saves them as
+    <base_name>_metromap.png and (if show) opens a window.
+    """
+    # Imported here so that importing this module never loads pyplot
+    import matplotlib.pyplot as plt
+
+    try:
+        # Create figure with two subplots
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+        spec = render_to_axes(base_name, ax1, ax2, fast)
+        print(spec)
         # plt.legend(loc="best")
         plt.tight_layout()
-        
-        # plt.tight_layout()
+
         output_img = f"{base_name}_metromap.png"
         plt.savefig(output_img)
-        plt.show()
+        if show:
+            plt.show()
+        plt.close(fig)
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -341,11 +366,16 @@ def visualize_both(base_name):
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python visualize.py <base_name>")
+        print("Usage: python visualize.py <base_name> [--fast|--classic]")
         sys.exit(1)
     else:
         base_name = sys.argv[1]
         if(base_name.find(".city")!=-1):
             base_name=base_name[:-5]
-    
-    visualize_both(base_name)
\ No newline at end of file
+    fast = None
+    if "--fast" in sys.argv[2:]:
+        fast = True
+    elif "--classic" in sys.argv[2:]:
+        fast = False
+
+    visualize_both(base_name, fast)
\ No newline at end of file
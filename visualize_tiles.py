@@ -0,0 +1,272 @@
+"""
+Tiled visualization for very large cities (Assignment 3: Metro Map Planning)
+
+A single PNG from visualize3 is unreadable or enormous for 500x500+ cities.
+This tool writes a zoomable pyramid of fixed-size image tiles instead:
+
+    <basename>_tiles/L0/<tx>_<ty>.png   full resolution (--cell-px pixels per cell)
+    <basename>_tiles/L1/<tx>_<ty>.png   2x downsampled (darkest pixel of each 2x2 block)
+    ...
+    <basename>_tiles/overview.png       the top level, the whole city in one tile
+    <basename>_tiles/tiles.json         levels, tile counts and sizes
+
+Routes are kept as straight runs (at most J+1 per line), bucketed by the tiles
+they cross. Each L0 tile rasterizes only its runs into a tile-sized occupancy
+array, and each higher tile is built from its four children, so memory scales
+with the tile size rather than the grid.
+
+--svg instead streams <basename>_metromap.svg, one polyline per line: the
+metromap is read one line at a time, so only one line's moves are in memory.
+
+Usage:
+    python3 visualize_tiles.py <basename> [--tile 256] [--cell-px 4] [--svg]
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from format_checker import parse_city, parse_metromap
+
+MOVE = {'U': (0, -1), 'D': (0, 1), 'L': (-1, 0), 'R': (1, 0)}
+LINE_COLORS = np.array([
+    (228, 26, 28), (55, 126, 184), (77, 175, 74), (152, 78, 163),
+    (255, 127, 0), (166, 86, 40), (40, 40, 40), (247, 129, 191),
+], dtype=np.uint8)
+START_COLOR = np.array((0, 0, 255), dtype=np.uint8)
+END_COLOR = np.array((255, 0, 0), dtype=np.uint8)
+POPULAR_COLOR = np.array((0, 200, 200), dtype=np.uint8)
+BACKGROUND = 255
+# ITU-R BT.601 weights; the darkest pixel is the one least like the background
+LUMA = np.array((299, 587, 114), dtype=np.int32)
+
+
+def line_runs(start, moves):
+    """Compresses a move list into straight runs ((x0, y0), (x1, y1))."""
+    runs = []
+    x, y = start
+    x0, y0 = x, y
+    prev = None
+    for mv in moves:
+        if prev is not None and mv != prev:
+            runs.append(((x0, y0), (x, y)))
+            x0, y0 = x, y
+        dx, dy = MOVE[mv]
+        x += dx
+        y += dy
+        prev = mv
+    runs.append(((x0, y0), (x, y)))
+    return runs
+
+
+def bucket_runs(spec, metro_moves, cells_per_tile):
+    """Maps (tx, ty) -> list of (line, x_lo, x_hi, y_lo, y_hi) runs crossing that tile."""
+    buckets = {}
+    for k, moves in enumerate(metro_moves):
+        for (x0, y0), (x1, y1) in line_runs(spec.starts[k], moves):
+            x_lo, x_hi = max(min(x0, x1), 0), min(max(x0, x1), spec.N - 1)
+            y_lo, y_hi = max(min(y0, y1), 0), min(max(y0, y1), spec.M - 1)
+            for tx in range(x_lo // cells_per_tile, x_hi // cells_per_tile + 1):
+                for ty in range(y_lo // cells_per_tile, y_hi // cells_per_tile + 1):
+                    buckets.setdefault((tx, ty), []).append((k, x_lo, x_hi, y_lo, y_hi))
+    return buckets
+
+
+def bucket_points(points, cells_per_tile):
+    buckets = {}
+    for x, y in points:
+        buckets.setdefault((x // cells_per_tile, y // cells_per_tile), []).append((x, y))
+    return buckets
+
+
+def render_base_tile(tx, ty, cells_per_tile, cell_px, runs, markers):
+    """
+    Rasterizes one L0 tile: an occupancy array of line ids for the tile's
+    cells, expanded to cell_px pixels per cell and colored per line.
+    `markers` is a list of (color, points) drawn on top.
+    """
+    x_base, y_base = tx * cells_per_tile, ty * cells_per_tile
+    occupancy = np.full((cells_per_tile, cells_per_tile), -1, dtype=np.int32)  # [y, x]
+    for k, x_lo, x_hi, y_lo, y_hi in runs:
+        xs = slice(max(x_lo - x_base, 0), min(x_hi - x_base + 1, cells_per_tile))
+        ys = slice(max(y_lo - y_base, 0), min(y_hi - y_base + 1, cells_per_tile))
+        occupancy[ys, xs] = k
+
+    tile = np.full((cells_per_tile, cells_per_tile, 3), BACKGROUND, dtype=np.uint8)
+    used = occupancy >= 0
+    tile[used] = LINE_COLORS[(occupancy[used] + 1) % len(LINE_COLORS)]
+    for color, points in markers:
+        for x, y in points:
+            tile[y - y_base, x - x_base] = color
+    return np.repeat(np.repeat(tile, cell_px, axis=0), cell_px, axis=1)
+
+
+def downsample(children, tile_px):
+    """
+    Builds a parent tile from its (up to) four children, keeping the darkest
+    pixel (by luminance) of every 2x2 block whole: lines stay visible over
+    the white background and no colour is invented by mixing channels.
+    """
+    full = np.full((2 * tile_px, 2 * tile_px, 3), BACKGROUND, dtype=np.uint8)
+    for (dx, dy), child in children.items():
+        if child is not None:
+            full[dy * tile_px:(dy + 1) * tile_px, dx * tile_px:(dx + 1) * tile_px] = child
+    blocks = full.reshape(tile_px, 2, tile_px, 2, 3).transpose(0, 2, 1, 3, 4).reshape(tile_px, tile_px, 4, 3)
+    darkest = (blocks.astype(np.int32) @ LUMA).argmin(axis=2)
+    return np.take_along_axis(blocks, darkest[..., None, None], axis=2)[:, :, 0]
+
+
+def write_tiles(base_name, spec, metro_moves, tile_px=256, cell_px=4):
+    """Writes the tile pyramid for one city; returns the tiles.json description."""
+    import matplotlib.image as mpimg
+
+    if tile_px % cell_px:
+        raise ValueError("--tile must be a multiple of --cell-px")
+    cells_per_tile = tile_px // cell_px
+    out_dir = base_name + "_tiles"
+    run_buckets = bucket_runs(spec, metro_moves or [], cells_per_tile)
+    marker_buckets = [(color, bucket_points(points, cells_per_tile)) for color, points in
+                      ((POPULAR_COLOR, spec.popular), (START_COLOR, spec.starts), (END_COLOR, spec.ends))]
+
+    def tile_path(level, tx, ty):
+        return os.path.join(out_dir, f"L{level}", f"{tx}_{ty}.png")
+
+    nx = math.ceil(spec.N / cells_per_tile)
+    ny = math.ceil(spec.M / cells_per_tile)
+    levels = [(nx, ny)]
+    os.makedirs(os.path.join(out_dir, "L0"), exist_ok=True)
+    for tx in range(nx):
+        for ty in range(ny):
+            markers = [(color, buckets.get((tx, ty), ())) for color, buckets in marker_buckets]
+            tile = render_base_tile(tx, ty, cells_per_tile, cell_px,
+                                    run_buckets.get((tx, ty), ()), markers)
+            mpimg.imsave(tile_path(0, tx, ty), tile)
+
+    level = 0
+    while nx > 1 or ny > 1:
+        level += 1
+        pnx, pny = math.ceil(nx / 2), math.ceil(ny / 2)
+        os.makedirs(os.path.join(out_dir, f"L{level}"), exist_ok=True)
+        for tx in range(pnx):
+            for ty in range(pny):
+                children = {}
+                for dx in (0, 1):
+                    for dy in (0, 1):
+                        cx, cy = 2 * tx + dx, 2 * ty + dy
+                        if cx < nx and cy < ny:
+                            img = mpimg.imread(tile_path(level - 1, cx, cy))
+                            children[(dx, dy)] = (img[..., :3] * 255 + 0.5).astype(np.uint8)
+                mpimg.imsave(tile_path(level, tx, ty), downsample(children, tile_px))
+        nx, ny = pnx, pny
+        levels.append((nx, ny))
+
+    with open(tile_path(level, 0, 0), 'rb') as src, \
+            open(os.path.join(out_dir, "overview.png"), 'wb') as dst:
+        dst.write(src.read())
+    info = {
+        'N': spec.N, 'M': spec.M, 'tile_px': tile_px, 'cell_px': cell_px,
+        'cells_per_tile_L0': cells_per_tile,
+        'levels': [{'level': i, 'tiles_x': lx, 'tiles_y': ly} for i, (lx, ly) in enumerate(levels)],
+    }
+    with open(os.path.join(out_dir, "tiles.json"), 'w') as f:
+        json.dump(info, f, indent=1)
+    return info
+
+
+def iter_metromap(path):
+    """
+    Yields the moves of each line of a .metromap file one line at a time,
+    nothing for UNSAT. Accepts what format_checker.parse_metromap does.
+    """
+    with open(path) as f:
+        rows = (ln.split() for ln in f if ln.strip())
+        head = list(itertools.islice(rows, 2))
+        if not head:
+            raise ValueError("Empty metromap file")
+        if head == [['0']]:
+            return
+        for idx, tokens in enumerate(itertools.chain(head, rows)):
+            if len(tokens) == 1:
+                tokens = list(tokens[0])
+            if tokens[-1] != '0' or any(t.upper() not in MOVE for t in tokens[:-1]):
+                raise ValueError("Line %d: expected moves followed by '0'" % (idx + 1))
+            yield [t.upper() for t in tokens[:-1]]
+
+
+def write_svg(base_name, spec, metro_moves, cell_px=4):
+    """
+    Streams the city as an SVG, one polyline per line. `metro_moves` may be
+    any iterable of move lists, e.g. iter_metromap(...).
+    """
+    path = base_name + "_metromap.svg"
+    r = max(cell_px / 2, 1)
+    tmp = path + '.tmp%d' % os.getpid()
+    try:
+        write_svg_body(tmp, spec, metro_moves, cell_px, r)
+    except BaseException:
+        # open() itself may have failed, leaving no file
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return path
+
+
+def write_svg_body(path, spec, metro_moves, cell_px, r):
+    with open(path, 'w') as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+                'viewBox="-0.5 -0.5 %d %d">\n' % (spec.N * cell_px, spec.M * cell_px, spec.N, spec.M))
+        f.write('<rect x="-0.5" y="-0.5" width="%d" height="%d" fill="white"/>\n' % (spec.N, spec.M))
+        for k, moves in enumerate(metro_moves or []):
+            color = LINE_COLORS[(k + 1) % len(LINE_COLORS)]
+            runs = line_runs(spec.starts[k], moves)
+            points = [runs[0][0]] + [end for _, end in runs]
+            f.write('<polyline fill="none" stroke="rgb(%d,%d,%d)" stroke-width="0.6" points="%s"/>\n'
+                    % (color[0], color[1], color[2], " ".join("%d,%d" % p for p in points)))
+        for color, points in (("cyan", spec.popular), ("blue", spec.starts), ("red", spec.ends)):
+            for x, y in points:
+                f.write('<circle cx="%d" cy="%d" r="%g" fill="%s"/>\n' % (x, y, r / cell_px, color))
+        f.write('</svg>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled / streamed visualization for very large cities.")
+    parser.add_argument("basename", help="City basename (with or without .city).")
+    parser.add_argument("--tile", type=int, default=256, help="Tile size in pixels.")
+    parser.add_argument("--cell-px", type=int, default=4, help="Pixels per cell at full resolution.")
+    parser.add_argument("--svg", action="store_true", help="Stream an SVG instead of tiles.")
+    args = parser.parse_args()
+
+    base = args.basename
+    if base.endswith(".city"):
+        base = base[:-5]
+    try:
+        spec = parse_city(base + ".city")
+        if args.svg:
+            path = write_svg(base, spec, iter_metromap(base + ".metromap"), args.cell_px)
+        else:
+            state, metro_moves = parse_metromap(base + ".metromap")
+    except Exception as e:
+        print("Parse error:", e, file=sys.stderr)
+        sys.exit(1)
+    if args.svg:
+        print(f"[Tiles] Wrote {path}")
+        return
+    if state == 'UNSAT':
+        metro_moves = None
+
+    try:
+        info = write_tiles(base, spec, metro_moves, args.tile, args.cell_px)
+    except ValueError as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(1)
+    print(f"[Tiles] Wrote {len(info['levels'])} levels to {base}_tiles/")
+
+
+if __name__ == "__main__":
+    main()